@@ -14,13 +14,22 @@ class Settings(BaseSettings):
     openai_api_key: str | None = Field(None, alias="OPENAI_API_KEY")
     openai_chat_model: str = Field("gpt-4o", alias="OPENAI_CHAT_MODEL")
     openai_embedding_model: str = Field("text-embedding-3-large", alias="OPENAI_EMBEDDING_MODEL")
+    openai_base_url: str | None = Field(None, alias="OPENAI_BASE_URL")  # e.g. a local stub for load tests
+    openai_timeout: float = Field(60.0, alias="OPENAI_TIMEOUT")
+    openai_max_retries: int = Field(2, alias="OPENAI_MAX_RETRIES")
+    llm_concurrency: int = Field(16, alias="LLM_CONCURRENCY")
 
     # Embeddings backend
-    embedding_backend: Literal["openai", "local"] = Field("local", alias="EMBEDDING_BACKEND")
+    embedding_backend: Literal["openai", "local", "hashing"] = Field("local", alias="EMBEDDING_BACKEND")
     local_embedding_model: str = Field(
         "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
         alias="LOCAL_EMBEDDING_MODEL",
     )
+    hashing_dim: int = Field(512, alias="HASHING_DIM")  # keep it unlike other backends' sizes (384, 1536, 3072)
+    # local backend via app.embed_server: "unix:/path.sock" or "http://host:port"; unset = model in every process
+    embedding_server: str | None = Field(None, alias="EMBEDDING_SERVER")
+    embedding_server_timeout: float = Field(30.0, alias="EMBEDDING_SERVER_TIMEOUT")
+    embed_server_window_ms: float = Field(5.0, alias="EMBED_SERVER_WINDOW_MS")
 
     # RAG / crawling
     user_agent: str = Field("EORA-RAG-Bot/1.0 (+https://example.org)", alias="USER_AGENT")
@@ -29,9 +38,62 @@ class Settings(BaseSettings):
     top_k: int = Field(6, alias="TOP_K")
     max_context_chars: int = Field(12000, alias="MAX_CONTEXT_CHARS")
     timeout_seconds: int = Field(30, alias="TIMEOUT_SECONDS")
+    retrieval_workers: int = Field(4, alias="RETRIEVAL_WORKERS")
+    query_batch_window_ms: float = Field(3.0, alias="QUERY_BATCH_WINDOW_MS")  # 0 = no micro-batching
+    query_batch_max: int = Field(32, alias="QUERY_BATCH_MAX")
+    batch_concurrency: int = Field(8, alias="BATCH_CONCURRENCY")  # parallel LLM calls per /ask/batch
+
+    # Caches (TTL in seconds, 0 = no expiry)
+    query_cache_size: int = Field(2048, alias="QUERY_CACHE_SIZE")
+    query_cache_ttl: float = Field(0, alias="QUERY_CACHE_TTL")
+    answer_cache_size: int = Field(512, alias="ANSWER_CACHE_SIZE")
+    answer_cache_ttl: float = Field(86400, alias="ANSWER_CACHE_TTL")
+    answer_cache_persist: bool = Field(False, alias="ANSWER_CACHE_PERSIST")
+    client_cache_size: int = Field(16, alias="CLIENT_CACHE_SIZE")  # embedders / OpenAI clients kept per (model, API key)
+
+    # Ingest pipeline
+    ingest_fetch_concurrency: int = Field(8, alias="INGEST_FETCH_CONCURRENCY")
+    ingest_parse_workers: int = Field(2, alias="INGEST_PARSE_WORKERS")
+    parse_in_processes: bool = Field(True, alias="PARSE_IN_PROCESSES")
+    html_backend: Literal["bs4", "selectolax"] = Field("bs4", alias="HTML_BACKEND")
+    fetch_per_host: int = Field(4, alias="FETCH_PER_HOST")
+    fetch_max_connections: int = Field(20, alias="FETCH_MAX_CONNECTIONS")
+    fetch_http2: bool = Field(False, alias="FETCH_HTTP2")
+    fetch_retries: int = Field(3, alias="FETCH_RETRIES")
+    fetch_backoff_base: float = Field(0.5, alias="FETCH_BACKOFF_BASE")
+    fetch_backoff_max: float = Field(30.0, alias="FETCH_BACKOFF_MAX")
+    fetch_max_bytes: int = Field(5_000_000, alias="FETCH_MAX_BYTES")
+    ingest_embed_workers: int = Field(1, alias="INGEST_EMBED_WORKERS")
+    ingest_queue_size: int = Field(32, alias="INGEST_QUEUE_SIZE")
+    embed_batch_size: int = Field(64, alias="EMBED_BATCH_SIZE")
+    embed_batch_chars: int = Field(60000, alias="EMBED_BATCH_CHARS")
+    local_embed_processes: int = Field(0, alias="LOCAL_EMBED_PROCESSES")  # 0 = encode in the ingest process
+    local_embed_threads: int = Field(0, alias="LOCAL_EMBED_THREADS")  # cores per encoder process, 0 = spread evenly
+    local_embed_min_shard: int = Field(16, alias="LOCAL_EMBED_MIN_SHARD")
+
+    # Retrieval
+    retriever: Literal["exact", "ivf", "hybrid", "prefilter"] = Field("exact", alias="RETRIEVER")
+    ivf_nlist: int = Field(0, alias="IVF_NLIST")  # 0 = auto (4 * sqrt(n))
+    ivf_nprobe: int = Field(8, alias="IVF_NPROBE")
+    hybrid_candidates: int = Field(50, alias="HYBRID_CANDIDATES")
+    rrf_k: int = Field(60, alias="RRF_K")
+
+    # Observability
+    metrics_enabled: bool = Field(True, alias="METRICS_ENABLED")  # stage histograms for /metrics
+    profiling_enabled: bool = Field(False, alias="PROFILING_ENABLED")  # allow ?profile=1 / X-Profile on /ask, /ingest
+    profiler: Literal["cprofile", "pyinstrument"] = Field("cprofile", alias="PROFILER")
+    profile_dir: str = Field("profiles", alias="PROFILE_DIR")
+    profile_interval_ms: float = Field(1.0, alias="PROFILE_INTERVAL_MS")  # pyinstrument sampling interval
 
     # DB
     sqlite_path: str = Field("rag.db", alias="SQLITE_PATH")
+    sqlite_mmap_size: int = Field(268_435_456, alias="SQLITE_MMAP_SIZE")
+    sqlite_cache_kib: int = Field(65_536, alias="SQLITE_CACHE_KIB")
+    write_batch_docs: int = Field(32, alias="WRITE_BATCH_DOCS")
+    embedding_segment: bool = Field(False, alias="EMBEDDING_SEGMENT")
+    embedding_originals: bool = Field(False, alias="EMBEDDING_ORIGINALS")  # float32 sidecar for exact rescoring
+    embedding_storage: Literal["float32", "float16", "int8"] = Field("float32", alias="EMBEDDING_STORAGE")
+    rescore_factor: int = Field(4, alias="RESCORE_FACTOR")
 
     # Links
     seed_links_file: str | None = Field(None, alias="SEED_LINKS_FILE")
@@ -1,32 +1,114 @@
 import sqlite3
-from typing import List, Tuple, Optional, Iterable
+from typing import Iterator, List, NamedTuple, Tuple, Optional, Iterable, Sequence
 import contextlib
+import hashlib
+import re
+import threading
+import time
 from pathlib import Path
 import numpy as np
 
+from . import metrics
 from .config import settings
+from .index import VectorIndex, group_blobs
+from .quantize import encode_embedding
+from .segment import OriginalsFile, append_segment, open_segments, write_segments
+from .links import normalize_url
 
 DB_PATH = Path(settings.sqlite_path)
 
+# float32 originals of quantized chunks for exact rescoring: an optional sidecar next to the DB (see app/segment.py)
+_keep_originals = settings.embedding_originals and settings.embedding_storage != "float32"
+_originals = OriginalsFile(lambda: DB_PATH)
+_index = VectorIndex(
+    storage=settings.embedding_storage, rescore=settings.rescore_factor,
+    originals=_originals if _keep_originals else None,
+)
+_index_lock = threading.Lock()
 
-def get_conn() -> sqlite3.Connection:
-    conn = sqlite3.connect(DB_PATH)
+
+FTS_AVAILABLE = False
+
+_local = threading.local()
+_writer: Optional[sqlite3.Connection] = None
+_writer_lock = threading.RLock()
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, check_same_thread=False, timeout=30)
     conn.execute("PRAGMA journal_mode=WAL;")
     conn.execute("PRAGMA synchronous=NORMAL;")
+    conn.execute(f"PRAGMA mmap_size={settings.sqlite_mmap_size};")
+    conn.execute(f"PRAGMA cache_size={-(settings.sqlite_cache_kib)};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
     return conn
 
 
+def get_conn() -> sqlite3.Connection:
+    """Per-thread read connection, opened and configured once and then reused."""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.path != DB_PATH:
+        conn = _local.conn = _connect()
+        _local.path = DB_PATH
+        _local.index_synced = _local.index_version = None  # data_version is per connection
+    return conn
+
+
+@contextlib.contextmanager
+def write_tx() -> Iterator[sqlite3.Connection]:
+    """The single writer connection, serialized across threads; the block is one transaction."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _connect()
+        with _writer:
+            yield _writer
+
+
+def close_connections() -> None:
+    """Close the writer and this thread's reader (e.g. before deleting or swapping the DB file)."""
+    global _writer
+    with _writer_lock:
+        if _writer is not None:
+            _writer.close()
+            _writer = None
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+        _local.index_synced = _local.index_version = None
+
+
 def init_db() -> None:
-    with contextlib.closing(get_conn()) as conn, conn:
+    with write_tx() as conn:
         conn.execute("""
         CREATE TABLE IF NOT EXISTS documents (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             url TEXT NOT NULL,
             title TEXT,
             content TEXT NOT NULL,
-            fetched_at TEXT NOT NULL
+            fetched_at TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            content_hash TEXT,
+            embedder TEXT
         );
         """)
+        _add_missing_columns(conn, "documents", {
+            "etag": "TEXT",
+            "last_modified": "TEXT",
+            "content_hash": "TEXT",
+            "embedder": "TEXT",
+        })
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        );
+        """)
+        _dedup_documents(conn)
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_url ON documents(url);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_fetched_at ON documents(fetched_at);")
         conn.execute("""
         CREATE TABLE IF NOT EXISTS chunks (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,55 +116,530 @@ def init_db() -> None:
             chunk_index INTEGER NOT NULL,
             text TEXT NOT NULL,
             embedding BLOB NOT NULL,
+            embedding_dtype TEXT NOT NULL DEFAULT 'float32',
+            embedding_scale REAL,
+            text_hash TEXT,
             FOREIGN KEY(document_id) REFERENCES documents(id)
         );
         """)
+        _add_missing_columns(conn, "chunks", {
+            "embedding_dtype": "TEXT NOT NULL DEFAULT 'float32'",
+            "embedding_scale": "REAL",
+            "text_hash": "TEXT",
+        })
         conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_doc ON chunks(document_id);")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunks_text_hash ON chunks(text_hash);")
+        _init_fts(conn)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            backend TEXT NOT NULL,
+            model TEXT NOT NULL,
+            text_hash TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (backend, model, text_hash)
+        ) WITHOUT ROWID;
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS embedding_models (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            updated_at REAL NOT NULL
+        );
+        """)
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            key TEXT PRIMARY KEY,
+            index_version INTEGER NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL
+        ) WITHOUT ROWID;
+        """)
 
 
-def insert_document(url: str, title: str, content: str, fetched_at: str) -> int:
-    with contextlib.closing(get_conn()) as conn, conn:
-        cur = conn.execute(
-            "INSERT INTO documents(url, title, content, fetched_at) VALUES (?,?,?,?)",
-            (url, title, content, fetched_at)
+def _init_fts(conn: sqlite3.Connection) -> None:
+    """External-content FTS5 index over chunks.text, kept in sync by triggers on chunks."""
+    global FTS_AVAILABLE
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+            text, content='chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        );
+        """)
+    except sqlite3.OperationalError as e:
+        FTS_AVAILABLE = False
+        print(f"[WARN] SQLite FTS5 недоступен ({e}): лексический поиск отключён")
+        return
+    FTS_AVAILABLE = True
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_ai AFTER INSERT ON chunks BEGIN
+        INSERT INTO chunks_fts(rowid, text) VALUES (new.id, new.text);
+    END;
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS chunks_fts_ad AFTER DELETE ON chunks BEGIN
+        INSERT INTO chunks_fts(chunks_fts, rowid, text) VALUES ('delete', old.id, old.text);
+    END;
+    """)
+    if not _meta(conn, "fts_built"):
+        # databases created before the FTS table: index the existing chunks once
+        conn.execute("INSERT INTO chunks_fts(chunks_fts) VALUES ('rebuild')")
+        _bump(conn, "fts_built")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: dict[str, str]) -> None:
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    for name, decl in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+
+
+def _meta(conn: sqlite3.Connection, key: str) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else 0
+
+
+def _bump(conn: sqlite3.Connection, key: str) -> int:
+    conn.execute(
+        "INSERT INTO meta(key, value) VALUES (?, 1) ON CONFLICT(key) DO UPDATE SET value = value + 1",
+        (key,)
+    )
+    return _meta(conn, key)
+
+
+def _dedup_documents(conn: sqlite3.Connection) -> None:
+    """One-off migration for databases created before documents.url was unique: keep the newest row per URL."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_documents_url'").fetchone():
+        return
+    newest: dict[str, int] = {}
+    rows = conn.execute("SELECT id, url FROM documents ORDER BY id").fetchall()
+    for doc_id, url in rows:
+        newest[normalize_url(url)] = doc_id
+    keep = set(newest.values())
+    stale = [(doc_id,) for doc_id, _ in rows if doc_id not in keep]
+    if stale:
+        conn.executemany("DELETE FROM chunks WHERE document_id = ?", stale)
+        conn.executemany("DELETE FROM documents WHERE id = ?", stale)
+        _bump(conn, "deletions")
+        _bump(conn, "index_version")
+        print(f"[INFO] removed {len(stale)} duplicate documents")
+    conn.executemany("UPDATE documents SET url = ? WHERE id = ?", [(u, i) for u, i in newest.items()])
+
+
+def _upsert_document(
+    conn: sqlite3.Connection, url: str, title: str, content: str, fetched_at: str,
+    etag: Optional[str], last_modified: Optional[str], content_hash: Optional[str], embedder: Optional[str],
+) -> int:
+    url = normalize_url(url)
+    conn.execute("""
+        INSERT INTO documents(url, title, content, fetched_at, etag, last_modified, content_hash, embedder)
+        VALUES (?,?,?,?,?,?,?,?)
+        ON CONFLICT(url) DO UPDATE SET
+            title = excluded.title, content = excluded.content, fetched_at = excluded.fetched_at,
+            etag = excluded.etag, last_modified = excluded.last_modified, content_hash = excluded.content_hash,
+            embedder = excluded.embedder
+    """, (url, title, content, fetched_at, etag, last_modified, content_hash, embedder))
+    return conn.execute("SELECT id FROM documents WHERE url = ?", (url,)).fetchone()[0]
+
+
+def get_document_meta(url: str) -> Optional[Tuple[int, Optional[str], Optional[str], Optional[str], Optional[str]]]:
+    """(id, etag, last_modified, content_hash, embedder) of a stored document."""
+    conn = get_conn()
+    return conn.execute(
+        "SELECT id, etag, last_modified, content_hash, embedder FROM documents WHERE url = ?",
+        (normalize_url(url),)
+    ).fetchone()
+
+
+def touch_document(document_id: int, fetched_at: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+    with write_tx() as conn:
+        conn.execute(
+            "UPDATE documents SET fetched_at = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) "
+            "WHERE id = ?",
+            (fetched_at, etag, last_modified, document_id)
         )
-        return cur.lastrowid
 
 
-def insert_chunks(document_id: int, rows: List[Tuple[int, str, bytes]]) -> None:
-    with contextlib.closing(get_conn()) as conn, conn:
-        conn.executemany(
-            "INSERT INTO chunks(document_id, chunk_index, text, embedding) VALUES (?,?,?,?)",
-            [(document_id, idx, text, emb) for idx, text, emb in rows]
+def _insert_chunk_rows(conn: sqlite3.Connection, document_id: int, rows: List[Tuple[int, str, bytes]]):
+    storage = settings.embedding_storage
+    added: List[Tuple[int, int, bytes, str, Optional[float]]] = []
+    for idx, text, emb in rows:
+        blob, scale = encode_embedding(np.frombuffer(emb, dtype="float32"), storage)
+        cur = conn.execute(
+            "INSERT INTO chunks(document_id, chunk_index, text, embedding, embedding_dtype, embedding_scale, text_hash) "
+            "VALUES (?,?,?,?,?,?,?)",
+            (document_id, idx, text, blob, storage, scale, text_hash(text))
         )
+        added.append((cur.lastrowid, document_id, blob, storage, scale))
+    return added
+
+
+def _publish(added: List[tuple], removed: Sequence[int] = (), deletions: int = 0, originals: Sequence[tuple] = ()) -> None:
+    groups = group_blobs(added) if added else {}
+    for dim, group in (group_blobs(originals) if originals else {}).items():
+        append_segment(dim, group, DB_PATH, kind="orig")
+    if settings.embedding_segment:
+        for dim, group in groups.items():
+            append_segment(dim, group, DB_PATH)
+    if not _index.loaded:
+        return
+    with _index_lock:
+        if removed:
+            if _index.deletions != deletions - 1:
+                # another writer deleted chunks in between: rebuild on next use
+                _index.clear()
+                return
+            _index.remove(removed)
+            _index.deletions = deletions
+        if not added:
+            return
+        if added[0][0] == _index.max_chunk_id + 1:
+            _index.add_groups(groups)
+        else:
+            _sync_index()
+
+
+class DocumentWrite(NamedTuple):
+    url: str
+    title: str
+    content: str
+    fetched_at: str
+    rows: List[Tuple[int, str, bytes]]
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: Optional[str] = None
+    embedder: Optional[str] = None  # EmbeddingsBackend.vector_key of the rows' vectors
+
 
+@metrics.timed("db_write")
+def replace_documents(docs: Sequence[DocumentWrite]) -> List[int]:
+    """Upsert many documents and swap their chunks in one transaction; returns their ids in order."""
+    doc_ids: List[int] = []
+    old: List[int] = []
+    added: List[tuple] = []
+    originals: List[tuple] = []
+    deletions = 0
+    # the writer lock spans the publish too, so segment appends and the index follow commit order
+    with _writer_lock:
+        with write_tx() as conn:
+            for d in docs:
+                doc_id = _upsert_document(conn, d.url, d.title, d.content, d.fetched_at,
+                                          d.etag, d.last_modified, d.content_hash, d.embedder)
+                stale = [cid for (cid,) in conn.execute("SELECT id FROM chunks WHERE document_id = ?", (doc_id,))]
+                if stale:
+                    conn.execute("DELETE FROM chunks WHERE document_id = ?", (doc_id,))
+                    old.extend(stale)
+                rows = _insert_chunk_rows(conn, doc_id, d.rows)
+                added.extend(rows)
+                if _keep_originals:
+                    originals.extend((r[0], doc_id, emb) for r, (_, _, emb) in zip(rows, d.rows))
+                doc_ids.append(doc_id)
+            if old:
+                deletions = _bump(conn, "deletions")  # once per transaction, see _publish
+            if docs:
+                _bump(conn, "index_version")
+        _publish(added, old, deletions, originals)
+    return doc_ids
 
+
+def _attach_segments(conn: sqlite3.Connection) -> None:
+    segments = open_segments(DB_PATH)
+    if not segments:
+        return
+    # rows are appended in commit order per process, but several processes may interleave: take the real max
+    max_id = max(int(g[0].max()) for g in segments.values())
+    live = np.fromiter((cid for (cid,) in conn.execute("SELECT id FROM chunks WHERE id <= ?", (max_id,))), dtype="int64")
+    alive = {dim: np.isin(g[0], live) for dim, g in segments.items()}
+    covered = sum(int(a.sum()) for a in alive.values())
+    if covered != len(live):
+        print(f"[WARN] embedding segment is out of sync with {DB_PATH} ({covered} vs {len(live)} rows); "
+              f"run `python cli.py rebuild-segment`")
+        return
+    for dim, group in segments.items():
+        _index.attach_base(dim, group, alive[dim])
+
+
+def _sync_index() -> None:
+    conn = get_conn()
+    # read the counter before any chunks, so the index never claims deletions it hasn't seen
+    deletions = _meta(conn, "deletions")
+    if _index.loaded and deletions != _index.deletions:
+        _index.clear()
+    if not _index.loaded:
+        _index.deletions = deletions
+        if settings.embedding_segment:
+            _attach_segments(conn)
+    (max_id,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM chunks").fetchone()
+    if max_id > _index.max_chunk_id:
+        _index.add_blobs(conn.execute(
+            "SELECT id, document_id, embedding, embedding_dtype, embedding_scale FROM chunks WHERE id > ? ORDER BY id",
+            (_index.max_chunk_id,)
+        ))
+    _index.loaded = True
+
+
+def rebuild_segment(batch_size: int = 10000) -> dict[int, int]:
+    def groups():
+        cur = get_conn().execute("SELECT id, document_id, embedding, embedding_dtype, embedding_scale FROM chunks ORDER BY id")
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                break
+            yield from group_blobs(batch).items()
+
+    written = write_segments(groups(), DB_PATH)
+    _compact_originals()
+    with _index_lock:
+        _index.clear()
+    return written
+
+
+def _compact_originals() -> None:
+    """Drop the rows of deleted chunks from the originals sidecar (it is append-only otherwise)."""
+    sidecar = open_segments(DB_PATH, kind="orig")
+    if not sidecar:
+        return
+    live = np.fromiter((cid for (cid,) in get_conn().execute("SELECT id FROM chunks")), dtype="int64")
+    with _writer_lock:  # no appends while the files are rewritten
+        write_segments(((dim, tuple(np.array(a[np.isin(g[0], live)]) for a in g)) for dim, g in sidecar.items()),
+                       DB_PATH, kind="orig")
+
+
+def _data_version(conn: sqlite3.Connection) -> int:
+    """Changes whenever any other connection (this process's writer or another process) commits; reads no table."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def get_index() -> VectorIndex:
+    # Chunks written by another process (e.g. `cli.py ingest`) are picked up incrementally; the
+    # counters are only re-read after someone committed since this thread last synced.
+    version = _data_version(get_conn())
+    if _index.loaded and getattr(_local, "index_synced", None) == version:
+        return _index
+    with _index_lock:
+        _sync_index()
+    _local.index_synced = version
+    return _index
+
+
+def _fts_query(text: str, max_terms: int = 16) -> str:
+    """OR of prefix terms; trailing letters of longer words are trimmed as a crude stand-in for stemming
+    (so "ритейлеров" also finds "ритейл…", "Магниту" finds "Магнит")."""
+    terms: List[str] = []
+    for word in re.findall(r"\w+", text.casefold()):
+        if len(word) < 2:
+            continue
+        stem = word[:max(4, len(word) - 2)] if len(word) > 5 else word
+        term = f'"{stem}"*'
+        if term not in terms:
+            terms.append(term)
+    return " OR ".join(terms[:max_terms])
+
+
+@metrics.timed("fts")
+def search_fts(text: str, limit: int, doc_ids: Optional[Sequence[int]] = None) -> List[Tuple[int, float]]:
+    """(chunk_id, bm25) best first; bm25 is negative, lower is better. `doc_ids` restricts the match to those documents."""
+    query = _fts_query(text)
+    if not FTS_AVAILABLE or not query:
+        return []
+    if doc_ids is None:
+        return get_conn().execute(
+            "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? ORDER BY bm25(chunks_fts) LIMIT ?",
+            (query, limit)
+        ).fetchall()
+    if not len(doc_ids):
+        return []
+    marks = ",".join("?" * len(doc_ids))
+    return get_conn().execute(f"""
+        SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts
+        JOIN chunks c ON c.id = chunks_fts.rowid
+        WHERE chunks_fts MATCH ? AND c.document_id IN ({marks})
+        ORDER BY bm25(chunks_fts) LIMIT ?
+    """, [query, *(int(d) for d in doc_ids), limit]).fetchall()
+
+
+def filter_document_ids(
+    url_prefix: Optional[str] = None,
+    document_ids: Optional[Sequence[int]] = None,
+    fetched_after: Optional[str] = None,
+    keyword: Optional[str] = None,
+) -> np.ndarray:
+    """Sorted ids of documents matching every given condition.
+
+    A full-URL prefix is normalized like document URLs on ingest (lowercase
+    scheme and host, no default port) and is a range scan on idx_documents_url;
+    `fetched_after` (ISO, compared as text with fetched_at) is one on
+    idx_documents_fetched_at; a path prefix ("/cases/") is matched on the path
+    part of the URL. `keyword` (case-insensitive, in URL or title) is checked
+    in Python, since SQLite's lower() only folds ASCII.
+    """
+    where: List[str] = []
+    params: List = []
+    if url_prefix:
+        if "://" in url_prefix:
+            # stored URLs are normalize_url()ed; keep a trailing slash so "/cases/" doesn't match "/casestudy"
+            prefix = normalize_url(url_prefix)
+            if url_prefix.rstrip().endswith("/") and not prefix.endswith("/"):
+                prefix += "/"
+            where.append("url >= ? AND url < ?")
+            params += [prefix, prefix + "\U0010ffff"]
+        else:
+            path = "/" + url_prefix.lstrip("/")
+            where.append("substr(substr(url, instr(url, '://') + 3), instr(substr(url, instr(url, '://') + 3), '/'), ?) = ?")
+            params += [len(path), path]
+    if document_ids is not None:
+        if not len(document_ids):
+            return np.empty(0, dtype="int64")
+        where.append(f"id IN ({','.join('?' * len(document_ids))})")
+        params += [int(d) for d in document_ids]
+    if fetched_after:
+        where.append("fetched_at >= ?")
+        params.append(fetched_after)
+    sql = "SELECT id, url, title FROM documents" + (" WHERE " + " AND ".join(where) if where else "")
+    rows = get_conn().execute(sql, params).fetchall()
+    if keyword:
+        key = keyword.casefold()
+        rows = [r for r in rows if key in (r[1] + " " + (r[2] or "")).casefold()]
+    return np.sort(np.fromiter((r[0] for r in rows), dtype="int64", count=len(rows)))
+
+
+def fetch_embeddings_by_ids(chunk_ids: Sequence[int]):
+    """Normalized vectors of the given chunks grouped by dimension, straight from SQLite (no full-index scan)."""
+    if not chunk_ids:
+        return {}
+    marks = ",".join("?" * len(chunk_ids))
+    return group_blobs(get_conn().execute(
+        f"SELECT id, document_id, embedding, embedding_dtype, embedding_scale FROM chunks WHERE id IN ({marks})",
+        list(chunk_ids)
+    ))
+
+
+@metrics.timed("fetch_chunks")
+def fetch_chunks_by_ids(chunk_ids: Sequence[int]) -> List[Tuple[int, int, str, str, Optional[str]]]:
+    if not chunk_ids:
+        return []
+    marks = ",".join("?" * len(chunk_ids))
+    conn = get_conn()
+    rows = conn.execute(f"""
+        SELECT c.id, c.document_id, c.text, d.url, d.title
+        FROM chunks c
+        JOIN documents d ON d.id = c.document_id
+        WHERE c.id IN ({marks})
+    """, list(chunk_ids)).fetchall()
+    by_id = {r[0]: r for r in rows}
+    return [by_id[cid] for cid in chunk_ids if cid in by_id]
+
+
+@metrics.timed("fetch_top_k")
 def fetch_top_k_by_embedding(query_emb: Iterable[float], k: int) -> List[Tuple[int, int, str, str, Optional[str]]]:
-    q = np.array(list(query_emb), dtype="float32")
-    qn = np.linalg.norm(q) or 1.0
+    q = np.asarray(query_emb if isinstance(query_emb, np.ndarray) else list(query_emb), dtype="float32")
+    ids, _ = get_index().search(q, k)
+    return fetch_chunks_by_ids([int(i) for i in ids])
+
+
+def get_cached_embeddings(backend: str, model: str, hashes: Sequence[str]) -> dict[str, bytes]:
+    out: dict[str, bytes] = {}
+    unique = list(dict.fromkeys(hashes))
+    conn = get_conn()
+    for start in range(0, len(unique), 500):
+        part = unique[start:start + 500]
+        marks = ",".join("?" * len(part))
+        out.update(conn.execute(
+            f"SELECT text_hash, embedding FROM embedding_cache "
+            f"WHERE backend = ? AND model = ? AND text_hash IN ({marks})",
+            [backend, model, *part]
+        ))
+    return out
+
+
+def put_cached_embeddings(backend: str, model: str, items: Iterable[Tuple[str, bytes]]) -> None:
+    with write_tx() as conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO embedding_cache(backend, model, text_hash, embedding) VALUES (?,?,?,?)",
+            [(backend, model, h, blob) for h, blob in items]
+        )
 
-    with contextlib.closing(get_conn()) as conn:
+
+def prune_embedding_cache() -> int:
+    with write_tx() as conn:
         cur = conn.execute("""
-            SELECT c.id, c.document_id, c.text, c.embedding, d.url, d.title
-            FROM chunks c
-            JOIN documents d ON d.id = c.document_id
+            DELETE FROM embedding_cache
+            WHERE text_hash NOT IN (SELECT text_hash FROM chunks WHERE text_hash IS NOT NULL)
         """)
-        rows = cur.fetchall()
+        return cur.rowcount
+
+
+def iter_chunk_texts(batch_size: int = 5000) -> Iterator[List[str]]:
+    cur = get_conn().execute("SELECT text FROM chunks ORDER BY id")
+    while True:
+        batch = cur.fetchmany(batch_size)
+        if not batch:
+            break
+        yield [t for (t,) in batch]
+
+
+def get_model_state(name: str) -> Optional[Tuple[int, bytes]]:
+    """(version, data) of fitted embedding-model state, e.g. the hashing backend's IDF."""
+    return get_conn().execute("SELECT version, data FROM embedding_models WHERE name = ?", (name,)).fetchone()
 
-    scored: List[Tuple[float, int, int, str, str, Optional[str]]] = []
-    for cid, did, text, emb_blob, url, title in rows:
-        vec = np.frombuffer(emb_blob, dtype="float32")
-        if vec.size != q.size:
-            continue
-        denom = (np.linalg.norm(vec) * qn) or 1.0
-        score = float(np.dot(vec, q) / denom)
-        scored.append((score, cid, did, text, url, title))
 
-    scored.sort(key=lambda x: x[0], reverse=True)
-    top = scored[:k]
-    return [(cid, did, text, url, title) for (score, cid, did, text, url, title) in top]
+def put_model_state(name: str, data: bytes) -> int:
+    """Store a new fit and return its version; bumps index_version, since query vectors change with it."""
+    with write_tx() as conn:
+        conn.execute("""
+            INSERT INTO embedding_models(name, version, data, updated_at) VALUES (?, 1, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET version = version + 1, data = excluded.data, updated_at = excluded.updated_at
+        """, (name, data, time.time()))
+        _bump(conn, "index_version")
+        (version,) = conn.execute("SELECT version FROM embedding_models WHERE name = ?", (name,)).fetchone()
+    return version
+
+
+def get_index_version() -> int:
+    """Bumped by every write that changes documents or chunks; part of the answer cache key."""
+    conn = get_conn()
+    version = _data_version(conn)
+    cached = getattr(_local, "index_version", None)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    value = _meta(conn, "index_version")
+    _local.index_version = (version, value)
+    return value
+
+
+def get_cached_answer(key: str, index_version: int, max_age: float) -> Optional[str]:
+    oldest = time.time() - max_age if max_age > 0 else 0.0
+    row = get_conn().execute(
+        "SELECT value FROM answer_cache WHERE key = ? AND index_version = ? AND created_at >= ?",
+        (key, index_version, oldest)
+    ).fetchone()
+    return row[0] if row else None
+
+
+def put_cached_answer(key: str, index_version: int, value: str) -> None:
+    with write_tx() as conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO answer_cache(key, index_version, value, created_at) VALUES (?,?,?,?)",
+            (key, index_version, value, time.time())
+        )
+
+
+def prune_answer_cache(index_version: int, max_age: float) -> int:
+    """Drop answers computed against an older corpus or past their TTL."""
+    oldest = time.time() - max_age if max_age > 0 else 0.0
+    with write_tx() as conn:
+        cur = conn.execute(
+            "DELETE FROM answer_cache WHERE index_version <> ? OR created_at < ?",
+            (index_version, oldest)
+        )
+        return cur.rowcount
 
 
 def list_documents() -> List[Tuple[int, str, Optional[str]]]:
-    with contextlib.closing(get_conn()) as conn:
-        return list(conn.execute("SELECT id, url, title FROM documents ORDER BY id DESC"))
+    conn = get_conn()
+    return list(conn.execute("SELECT id, url, title FROM documents ORDER BY id DESC"))
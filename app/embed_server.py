@@ -0,0 +1,143 @@
+"""Shared embedding server: one model instance for every worker process on the host.
+
+    python -m app.embed_server --uds /tmp/eora-embed.sock
+    EMBEDDING_SERVER=unix:/tmp/eora-embed.sock uvicorn app.main:app --workers 4
+
+Workers reach it through RemoteEmbeddings (EMBEDDING_SERVER=unix:<path> or
+http://host:port). Requests arriving within EMBED_SERVER_WINDOW_MS of each
+other are coalesced into one encode call on a single model thread; vectors
+go back as raw float32 with the dimension in X-Dim.
+"""
+from __future__ import annotations
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Literal, Optional, Tuple
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from .config import settings
+from .embeddings import EmbeddingsBackend, LocalEmbeddings
+
+Kind = Literal["document", "query"]
+
+
+class EmbedRequest(BaseModel):
+    texts: List[str]
+    kind: Kind = "document"
+    model: Optional[str] = None  # checked against the hosted model, so clients never mix vector spaces
+
+
+class _Batcher:
+    """Coalesces concurrent requests into one embed call per kind; the model runs on one thread."""
+
+    def __init__(self, embedder: EmbeddingsBackend, window_ms: float, max_items: int):
+        self.embedder = embedder
+        self.window = window_ms / 1000
+        self.max_items = max_items
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._pending: List[Tuple[Kind, List[str], asyncio.Future]] = []
+        self._count = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0}
+
+    async def submit(self, kind: Kind, texts: List[str]) -> np.ndarray:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((kind, texts, fut))
+        self._count += len(texts)
+        self.stats["requests"] += 1
+        self.stats["texts"] += len(texts)
+        if self._count >= self.max_items or not self.window:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _run(self, kind: Kind, texts: List[str]) -> np.ndarray:
+        fn = self.embedder.embed_query_many if kind == "query" else self.embedder.embed_many
+        return np.asarray(fn(texts), dtype="float32")
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._count = self._pending, [], 0
+        loop = asyncio.get_running_loop()
+        for kind in ("document", "query"):
+            group = [(texts, fut) for k, texts, fut in batch if k == kind]
+            if not group:
+                continue
+            self.stats["batches"] += 1
+            job = loop.run_in_executor(self.executor, self._run, kind, [t for texts, _ in group for t in texts])
+            job.add_done_callback(partial(self._resolve, group))
+
+    @staticmethod
+    def _resolve(group: List[Tuple[List[str], asyncio.Future]], job: asyncio.Future) -> None:
+        error = job.exception()
+        start = 0
+        for texts, fut in group:
+            if not fut.done():
+                if error is not None:
+                    fut.set_exception(error)
+                else:
+                    fut.set_result(job.result()[start:start + len(texts)])
+            start += len(texts)
+
+
+def create_app(model: Optional[str] = None, window_ms: Optional[float] = None, max_items: Optional[int] = None) -> FastAPI:
+    model = model or settings.local_embedding_model
+    app = FastAPI(title="EORA embedding server")
+    state: dict = {}
+
+    @app.on_event("startup")
+    async def _load():
+        # load before accepting traffic: workers should never wait on a cold model
+        embedder = await asyncio.to_thread(LocalEmbeddings, model)
+        state["batcher"] = _Batcher(embedder,
+                                    settings.embed_server_window_ms if window_ms is None else window_ms,
+                                    max_items or settings.embed_batch_size)
+
+    @app.get("/health")
+    def health():
+        batcher = state.get("batcher")
+        return {"status": "ok" if batcher else "loading", "model": model, **(batcher.stats if batcher else {})}
+
+    @app.post("/embed")
+    async def embed(req: EmbedRequest):
+        if req.model and req.model != model:
+            raise HTTPException(409, f"server hosts {model}, not {req.model}")
+        batcher = state.get("batcher")
+        if batcher is None:
+            raise HTTPException(503, "model is loading")
+        if not req.texts:
+            return Response(b"", media_type="application/octet-stream", headers={"X-Dim": "0"})
+        mat = await batcher.submit(req.kind, req.texts)
+        return Response(np.ascontiguousarray(mat).tobytes(), media_type="application/octet-stream",
+                        headers={"X-Dim": str(mat.shape[1])})
+
+    return app
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--uds", help="Unix socket path (preferred on one host)")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--model", default=None, help="Default LOCAL_EMBEDDING_MODEL")
+    p.add_argument("--window-ms", type=float, default=None, help="Default EMBED_SERVER_WINDOW_MS")
+    args = p.parse_args()
+    app = create_app(args.model, args.window_ms)
+    if args.uds:
+        uvicorn.run(app, uds=args.uds, log_level="warning")
+    else:
+        uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,23 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import List, Sequence, Optional
+import asyncio
+import re
+import threading
+import time
+import multiprocessing
+import multiprocessing.util
+import os
+import queue
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Sequence, Optional, Tuple
 
-from .config import settings
+import httpx
+import numpy as np
+
+from . import metrics
+from .cache import LRUCache, normalize_question
+from .config import Settings, settings
 
 try:
     from openai import OpenAI
@@ -13,61 +28,600 @@ except Exception:
 @dataclass
 class EmbeddingsBackend:
     name: str
+    model: str = ""
+    # set by rag on first use; lives and dies with the embedder (the registry is an LRU)
+    query_batcher: Optional["QueryBatcher"] = field(default=None, repr=False, compare=False)
     def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
         raise NotImplementedError
     def embed_one(self, text: str) -> List[float]:
         return self.embed_many([text])[0]
 
+    def embed_query_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Query-side embedding; the same as embed_many except for asymmetric backends."""
+        return self.embed_many(texts)
+
+    def embed_bulk(self, texts: Sequence[str]) -> np.ndarray:
+        """Document vectors as one (n, dim) float32 matrix, for ingest; backends override it to skip list round-trips."""
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        return np.asarray(self.embed_many(texts), dtype="float32")
+
+    @property
+    def vector_key(self) -> str:
+        """Which embedder made a document's stored vectors; model ids fix the dimension (hashing ids carry it)."""
+        return f"{self.name}:{self.model}"
+
+    @property
+    def query_model(self) -> str:
+        """Model id for caching query vectors (changes whenever embed_query_many would)."""
+        return self.model
+
 
 class OpenAIEmbeddings(EmbeddingsBackend):
-    def __init__(self):
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None):
         if OpenAI is None:
             raise RuntimeError("OpenAI SDK недоступен")
-        if not settings.openai_api_key:
+        if not api_key:
             raise RuntimeError("OPENAI_API_KEY не задан")
-        self.client = OpenAI(api_key=settings.openai_api_key)
-        super().__init__(name="openai")
+        self.client = OpenAI(api_key=api_key, base_url=settings.openai_base_url or None)
+        super().__init__(name="openai", model=model or settings.openai_embedding_model)
 
     def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
-        model = settings.openai_embedding_model
         try:
-            resp = self.client.embeddings.create(input=list(texts), model=model)
+            resp = self.client.embeddings.create(input=list(texts), model=self.model)
             return [d.embedding for d in resp.data]
         except Exception as e:
-            if "model_not_found" in str(e) or "does not have access" in str(e):
-                fallback = "text-embedding-3-small"
+            fallback = "text-embedding-3-small"
+            if self.model != fallback and ("model_not_found" in str(e) or "does not have access" in str(e)):
+                # sticky, so cached vectors are keyed by the model that actually produced them
+                self.model = fallback
                 resp = self.client.embeddings.create(input=list(texts), model=fallback)
                 return [d.embedding for d in resp.data]
             raise
 
 
 class LocalEmbeddings(EmbeddingsBackend):
-    def __init__(self):
+    def __init__(self, model: Optional[str] = None):
         from sentence_transformers import SentenceTransformer
-        self.model = SentenceTransformer(settings.local_embedding_model)
-        super().__init__(name="local")
+        model = model or settings.local_embedding_model
+        self.st_model = SentenceTransformer(model)
+        super().__init__(name="local", model=model)
+
+    def _encode(self, texts: Sequence[str]) -> np.ndarray:
+        return self.st_model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True).astype("float32", copy=False)
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return list(self._encode(texts))
+
+    def embed_bulk(self, texts: Sequence[str]) -> np.ndarray:
+        """With LOCAL_EMBED_PROCESSES > 0, shards of the batch are encoded in parallel by the process pool."""
+        if not texts:
+            return np.empty((0, 0), dtype="float32")
+        pool = get_encode_pool(self.model)
+        if pool is None:
+            return self._encode(texts)
+        n_shards = min(settings.local_embed_processes, -(-len(texts) // settings.local_embed_min_shard))
+        step = -(-len(texts) // n_shards)
+        shards = [list(texts[i:i + step]) for i in range(0, len(texts), step)]
+        return np.vstack(list(pool.map(_encode_in_worker, shards)))
+
+
+# Bulk-encode process pool: each worker holds its own model copy, pinned to its own cores.
+_encode_pool: Optional[Executor] = None
+_encode_pool_model: Optional[str] = None
+_encode_pool_lock = threading.Lock()
+_worker_model = None
+
+
+def _core_sets(processes: int, threads: int) -> List[List[int]]:
+    cores = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    threads = threads or max(1, len(cores) // processes)
+    return [[cores[(i * threads + j) % len(cores)] for j in range(threads)] for i in range(processes)]
+
+
+def _claim_cores(core_sets, timeout: float = 5.0) -> Optional[List[int]]:
+    """Take a core set for this worker; it goes back to the queue when the worker exits, for the one replacing it."""
+    try:
+        cores = core_sets.get(timeout=timeout)
+    except queue.Empty:
+        print(f"[WARN] encode worker {os.getpid()}: нет свободного набора ядер за {timeout:g}s — работает без привязки")
+        return None
+    # atexit does not run in multiprocessing children, their finalizers do; priority > 0 runs before the queue is joined
+    multiprocessing.util.Finalize(None, core_sets.put, args=(cores,), exitpriority=10)
+    return cores
+
+
+def _init_encode_worker(model: str, core_sets, threads: int) -> None:
+    global _worker_model
+    cores = _claim_cores(core_sets)
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(len(cores) if cores else max(1, threads))
+    _worker_model = SentenceTransformer(model)
+
+
+def _encode_in_worker(texts: List[str]) -> np.ndarray:
+    return _worker_model.encode(texts, normalize_embeddings=True, convert_to_numpy=True).astype("float32", copy=False)
+
+
+def get_encode_pool(model: str) -> Optional[Executor]:
+    """Spawned pool of LOCAL_EMBED_PROCESSES encoders for `model` (None when disabled); built once, reused by ingests."""
+    global _encode_pool, _encode_pool_model
+    processes = settings.local_embed_processes
+    if processes <= 0:
+        return None
+    with _encode_pool_lock:
+        if _encode_pool is not None and _encode_pool_model != model:
+            _encode_pool.shutdown(wait=True)
+            _encode_pool = None
+        if _encode_pool is None:
+            ctx = multiprocessing.get_context("spawn")
+            core_sets = ctx.Queue()
+            for cores in _core_sets(processes, settings.local_embed_threads):
+                core_sets.put(cores)
+            _encode_pool = ProcessPoolExecutor(
+                max_workers=processes, mp_context=ctx,
+                initializer=_init_encode_worker, initargs=(model, core_sets, settings.local_embed_threads),
+            )
+            _encode_pool_model = model
+    return _encode_pool
+
+
+def close_encode_pool() -> None:
+    global _encode_pool
+    with _encode_pool_lock:
+        if _encode_pool is not None:
+            _encode_pool.shutdown(wait=True)
+            _encode_pool = None
+
+
+class RemoteEmbeddings(EmbeddingsBackend):
+    """Client of app.embed_server, which hosts one copy of the local model for all worker processes.
+
+    ``address`` is ``unix:/path/to.sock`` or ``http://host:port``. Vectors
+    are the same as LocalEmbeddings would produce (the server refuses a
+    different model), so caches are shared under the "local" name. When
+    the server can't be reached the model is loaded in-process and used
+    until ``retry_after`` seconds have passed, then the server is tried again.
+    """
+
+    def __init__(self, address: str, model: Optional[str] = None, timeout: float = 30.0, retry_after: float = 30.0):
+        self.address = address
+        self.retry_after = retry_after
+        if address.startswith("unix:"):
+            self.client = httpx.Client(transport=httpx.HTTPTransport(uds=address[len("unix:"):]),
+                                       base_url="http://embed-server", timeout=timeout)
+        else:
+            self.client = httpx.Client(base_url=address.rstrip("/"), timeout=timeout)
+        self._local: Optional[LocalEmbeddings] = None
+        self._local_lock = threading.Lock()
+        self._down_until = 0.0
+        self.stats = {"remote": 0, "fallback": 0}
+        super().__init__(name="local", model=model or settings.local_embedding_model)
+
+    def _fallback(self) -> LocalEmbeddings:
+        with self._local_lock:
+            if self._local is None:
+                self._local = LocalEmbeddings(self.model)
+        return self._local
+
+    def _embed(self, texts: Sequence[str], kind: str) -> List[List[float]]:
+        if not texts:
+            return []
+        if time.monotonic() >= self._down_until:
+            try:
+                r = self.client.post("/embed", json={"texts": list(texts), "kind": kind, "model": self.model})
+                r.raise_for_status()
+                self.stats["remote"] += len(texts)
+                return list(np.frombuffer(r.content, dtype="float32").reshape(len(texts), int(r.headers["X-Dim"])))
+            except (httpx.HTTPError, KeyError, ValueError) as e:
+                self._down_until = time.monotonic() + self.retry_after
+                print(f"[WARN] embedding server {self.address} unavailable ({e}); "
+                      f"embedding in-process for {self.retry_after:.0f}s")
+        self.stats["fallback"] += len(texts)
+        local = self._fallback()
+        return local.embed_query_many(texts) if kind == "query" else local.embed_many(texts)
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return self._embed(texts, "document")
+
+    def embed_bulk(self, texts: Sequence[str]) -> np.ndarray:
+        return np.asarray(self._embed(texts, "document"), dtype="float32")
+
+    def embed_query_many(self, texts: Sequence[str]) -> List[List[float]]:
+        return self._embed(texts, "query")
+
+
+_NON_WORD = re.compile(r"[\W_]+")
+_M1, _M2 = np.uint64(0xFF51AFD7ED558CCD), np.uint64(0xC4CEB9FE1A85EC53)
+
+
+def _mix(h: np.ndarray) -> np.ndarray:
+    """splitmix/murmur3 finalizer on uint64 arrays (multiplications wrap mod 2**64)."""
+    h = h ^ (h >> np.uint64(33))
+    h = h * _M1
+    h = h ^ (h >> np.uint64(33))
+    h = h * _M2
+    return h ^ (h >> np.uint64(33))
+
+
+class HashingEmbeddings(EmbeddingsBackend):
+    """CPU-only character n-gram vectorizer, no torch and no model download.
+
+    Texts are case-folded, punctuation collapsed to spaces, and every
+    character n-gram (``ngrams`` range) is hashed into 2**``bits`` features,
+    all in vectorized NumPy over the whole batch. Sublinear TF weights are
+    then folded into ``dim`` dense dimensions by a fixed sparse random
+    projection (each feature adds +-w to ``projections`` dimensions), and the
+    result is L2-normalized.
+
+    IDF is fitted on the ingested chunks (refit_hashing_idf, run after each
+    ingest) and kept in the ``embedding_models`` table. It is applied on the
+    query side only, squared, so query . chunk approximates the TF-IDF dot
+    product while stored chunk vectors never depend on the fit and need no
+    re-embedding when it changes.
+    """
+
+    def __init__(self, dim: int = 512, bits: int = 18, ngrams: Tuple[int, int] = (3, 5), projections: int = 2):
+        self.dim = dim
+        self.bits = bits
+        self.ngrams = ngrams
+        self.n_features = 1 << bits
+        feats = np.arange(self.n_features, dtype="uint64")
+        self._proj_dims = []
+        self._proj_signs = []
+        for j in range(projections):
+            h = _mix(feats * np.uint64(2 * j + 1) + np.uint64(0x9E3779B97F4A7C15))
+            self._proj_dims.append((h % np.uint64(dim)).astype("int64"))
+            self._proj_signs.append(np.where(h >> np.uint64(63), 1.0, -1.0).astype("float32"))
+        self.query_weights = np.ones(self.n_features, dtype="float32")
+        self.idf_version = 0
+        self.idf_check_interval = 1.0
+        self._idf_checked = 0.0
+        self._lock = threading.Lock()
+        super().__init__(name="hashing", model=f"char{ngrams[0]}-{ngrams[1]}-h{bits}-d{dim}")
+
+    @property
+    def query_model(self) -> str:
+        self.load_idf()  # so a refit elsewhere changes the cache key before the cache is consulted
+        return f"{self.model}@idf{self.idf_version}"
+
+    def features(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, feature, count) of every distinct n-gram feature per text."""
+        norm = [" " + _NON_WORD.sub(" ", t.casefold()).strip() + " " for t in texts]
+        codes = np.frombuffer("".join(norm).encode("utf-32-le"), dtype="<u4").astype("uint64")
+        rows = np.repeat(np.arange(len(norm), dtype="int64"), [len(t) for t in norm])
+        keys = []
+        for n in range(self.ngrams[0], self.ngrams[1] + 1):
+            m = len(codes) - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, n, dtype="uint64")
+            for j in range(n):
+                h = h * np.uint64(1_000_003) + codes[j:j + m]
+            valid = rows[:m] == rows[n - 1:n - 1 + m]  # n-grams never span two texts
+            feats = (_mix(h[valid]) & np.uint64(self.n_features - 1)).astype("int64")
+            keys.append(rows[:m][valid] * self.n_features + feats)
+        if not keys:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64"), np.empty(0, dtype="int64")
+        uniq, counts = np.unique(np.concatenate(keys), return_counts=True)
+        return uniq // self.n_features, uniq % self.n_features, counts
+
+    def _embed(self, texts: Sequence[str], weights: Optional[np.ndarray]) -> np.ndarray:
+        rows, feats, counts = self.features(texts)
+        w = (1.0 + np.log(counts)).astype("float32")
+        if weights is not None:
+            w *= weights[feats]
+        out = np.zeros(len(texts) * self.dim, dtype="float64")
+        for dims, signs in zip(self._proj_dims, self._proj_signs):
+            out += np.bincount(rows * self.dim + dims[feats], weights=w * signs[feats], minlength=len(out))
+        mat = out.reshape(len(texts), self.dim).astype("float32")
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return mat / norms
 
     def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
-        embs = self.model.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
-        return [e.tolist() for e in embs]
+        return list(self._embed(texts, None))
+
+    def embed_bulk(self, texts: Sequence[str]) -> np.ndarray:
+        return self._embed(texts, None)
+
+    def embed_query_many(self, texts: Sequence[str]) -> List[List[float]]:
+        self.load_idf()
+        return list(self._embed(texts, self.query_weights))
+
+    def document_frequencies(self, batches) -> Tuple[np.ndarray, int]:
+        """(df per feature, number of texts) over an iterable of text batches."""
+        df = np.zeros(self.n_features, dtype="int64")
+        n = 0
+        for texts in batches:
+            _, feats, _ = self.features(texts)
+            df += np.bincount(feats, minlength=self.n_features)
+            n += len(texts)
+        return df, n
+
+    def set_idf(self, df: np.ndarray, n: int, version: int) -> None:
+        idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+        with self._lock:
+            self.query_weights = (idf * idf).astype("float32")
+            self.idf_version = version
+
+    def load_idf(self) -> None:
+        """Pick up the IDF persisted by the latest refit (in this or another process); polls at most once a second."""
+        from .db import get_model_state
+
+        now = time.monotonic()
+        if now - self._idf_checked < self.idf_check_interval:
+            return
+        self._idf_checked = now
+        state = get_model_state(self.model)
+        if state is None or state[0] == self.idf_version:
+            return
+        version, blob = state
+        data = np.frombuffer(blob, dtype="int64")
+        if len(data) == self.n_features + 1:
+            self.set_idf(data[1:], int(data[0]), version)
+
+
+def refit_hashing_idf(embedder: HashingEmbeddings, batch_size: int = 5000) -> int:
+    """Recompute IDF over every chunk text in the DB and persist it; returns the new version.
 
+    Bumps index_version, so cached answers computed with the old weights are dropped.
+    """
+    from .db import iter_chunk_texts, put_model_state
 
-_backend: Optional[EmbeddingsBackend] = None
+    df, n = embedder.document_frequencies(iter_chunk_texts(batch_size))
+    version = put_model_state(embedder.model, np.concatenate([[n], df]).astype("int64").tobytes())
+    embedder.set_idf(df, n, version)
+    return version
 
 
-def reset_embedder(backend_name: Optional[str] = None) -> None:
-    global _backend
-    _backend = None
-    if backend_name:
-        settings.embedding_backend = backend_name  # type: ignore[attr-defined]
+# (backend, model, api key) -> embedder, shared by all requests; bounded because per-request API keys are keys too.
+# An evicted embedder is not closed: requests still holding it finish, then it is garbage-collected.
+_registry = LRUCache(max(1, settings.client_cache_size))
+_registry_lock = threading.Lock()
 
 
-def get_embedder() -> EmbeddingsBackend:
-    global _backend
-    if _backend is not None:
-        return _backend
-    if settings.embedding_backend == "openai":
-        _backend = OpenAIEmbeddings()
+def get_embedder(cfg: Optional[Settings] = None) -> EmbeddingsBackend:
+    """Shared embedder for cfg (default: the global settings); per-request overrides come in as a Settings copy."""
+    cfg = cfg or settings
+    if cfg.embedding_backend == "openai":
+        key = ("openai", cfg.openai_embedding_model, cfg.openai_api_key)
+    elif cfg.embedding_backend == "hashing":
+        key = ("hashing", str(cfg.hashing_dim), None)
     else:
-        _backend = LocalEmbeddings()
-    return _backend
+        key = ("local", cfg.local_embedding_model, None)
+    embedder = _registry.get(key)
+    if embedder is not None:
+        return embedder
+    with _registry_lock:
+        embedder = _registry.get(key)
+        if embedder is None:
+            if key[0] == "openai":
+                embedder = OpenAIEmbeddings(key[1], key[2])
+            elif key[0] == "hashing":
+                embedder = HashingEmbeddings(dim=int(key[1]))
+            elif cfg.embedding_server:
+                embedder = RemoteEmbeddings(cfg.embedding_server, key[1], cfg.embedding_server_timeout)
+            else:
+                embedder = LocalEmbeddings(key[1])
+            _registry.put(key, embedder)
+    return embedder
+
+
+cache_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+
+@metrics.timed("embed_documents")
+def embed_cached(embedder: EmbeddingsBackend, texts: Sequence[str]) -> List[np.ndarray]:
+    """embed_many through the (backend, model, sha256(text)) cache table; only misses hit the embedder."""
+    from .db import get_cached_embeddings, put_cached_embeddings, text_hash
+
+    hashes = [text_hash(t) for t in texts]
+    cached = get_cached_embeddings(embedder.name, embedder.model, hashes)
+    missing = list(dict.fromkeys(h for h in hashes if h not in cached))
+    hits = len(texts) - sum(1 for h in hashes if h not in cached)
+    cache_stats["hits"] += hits
+    cache_stats["misses"] += len(missing)
+    metrics.inc("eora_embedding_cache_total", hits, result="hit")
+    metrics.inc("eora_embedding_cache_total", len(missing), result="miss")
+
+    vectors = {h: np.frombuffer(blob, dtype="float32") for h, blob in cached.items()}
+    if missing:
+        by_hash = {h: t for h, t in zip(hashes, texts)}
+        fresh = embedder.embed_bulk([by_hash[h] for h in missing])
+        new = dict(zip(missing, fresh))
+        # read the model after the call: OpenAIEmbeddings may have switched to its fallback
+        put_cached_embeddings(embedder.name, embedder.model, [(h, v.tobytes()) for h, v in new.items()])
+        vectors.update(new)
+    return [vectors[h] for h in hashes]
+
+
+query_cache = LRUCache(settings.query_cache_size, settings.query_cache_ttl)
+
+
+@metrics.timed("embed_query")
+def embed_queries(embedder: EmbeddingsBackend, texts: Sequence[str]) -> List[np.ndarray]:
+    """Query vectors through the in-memory LRU keyed by (backend, query model, normalized question)."""
+    keys = [(embedder.name, embedder.query_model, normalize_question(t)) for t in texts]
+    out: List[Optional[np.ndarray]] = [query_cache.get(key) for key in keys]
+    missing = [i for i, v in enumerate(out) if v is None]
+    if missing:
+        fresh = embedder.embed_query_many([texts[i] for i in missing])
+        for i, vec in zip(missing, fresh):
+            out[i] = np.asarray(vec, dtype="float32")
+            query_cache.put((embedder.name, embedder.query_model, keys[i][2]), out[i])
+    return out
+
+
+class EmbeddingBatcher:
+    """Packs chunks from many documents into batches capped by item count and character budget.
+
+    Chunks are length-sorted inside a batch so the local model pads less; a
+    batch that fails is retried as two halves, down to single chunks, so one
+    bad input only fails its own document. Results are scattered back per
+    document key once all of that document's chunks are resolved.
+    """
+
+    def __init__(self, embedder: EmbeddingsBackend, max_items: Optional[int] = None, max_chars: Optional[int] = None):
+        self.embedder = embedder
+        self.max_items = max_items or settings.embed_batch_size
+        self.max_chars = max_chars or settings.embed_batch_chars
+        self._pending: List[Tuple[Hashable, int, str]] = []
+        self._pending_chars = 0
+        self._docs: Dict[Hashable, List[Optional[np.ndarray]]] = {}
+        self._left: Dict[Hashable, int] = {}
+        self._failed: set = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def add(self, key: Hashable, texts: Sequence[str]) -> None:
+        if not texts:
+            raise ValueError("EmbeddingBatcher.add() needs at least one text")
+        self._docs[key] = [None] * len(texts)
+        self._left[key] = len(texts)
+        for i, t in enumerate(texts):
+            self._pending.append((key, i, t))
+            self._pending_chars += len(t)
+
+    def ready(self) -> bool:
+        return len(self._pending) >= self.max_items or self._pending_chars >= self.max_chars
+
+    def take(self, flush: bool = False) -> List[List[Tuple[Hashable, int, str]]]:
+        """Cut full batches off the pending queue (and the remainder too if flush)."""
+        batches: List[List[Tuple[Hashable, int, str]]] = []
+        batch: List[Tuple[Hashable, int, str]] = []
+        chars = 0
+        consumed = 0
+        for item in self._pending:
+            if batch and (len(batch) >= self.max_items or chars + len(item[2]) > self.max_chars):
+                batches.append(batch)
+                consumed += len(batch)
+                batch, chars = [], 0
+            batch.append(item)
+            chars += len(item[2])
+        if batch and (flush or len(batch) >= self.max_items or chars >= self.max_chars):
+            batches.append(batch)
+            consumed += len(batch)
+        self._pending = self._pending[consumed:]
+        self._pending_chars = sum(len(t) for _, _, t in self._pending)
+        return batches
+
+    def embed(self, batch: List[Tuple[Hashable, int, str]]) -> List[Optional[np.ndarray]]:
+        order = sorted(range(len(batch)), key=lambda i: len(batch[i][2]))
+        vecs = self._embed_retry([batch[i][2] for i in order])
+        out: List[Optional[np.ndarray]] = [None] * len(batch)
+        for pos, i in enumerate(order):
+            out[i] = vecs[pos]
+        return out
+
+    def _embed_retry(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        try:
+            return embed_cached(self.embedder, texts)
+        except Exception as e:
+            if len(texts) == 1:
+                print(f"[WARN] embedding failed for a chunk via {self.embedder.name}: {e}")
+                return [None]
+            mid = len(texts) // 2
+            return self._embed_retry(texts[:mid]) + self._embed_retry(texts[mid:])
+
+    def scatter(
+        self, batch: List[Tuple[Hashable, int, str]], vectors: List[Optional[np.ndarray]]
+    ) -> List[Tuple[Hashable, Optional[List[np.ndarray]]]]:
+        """Store batch results; return (key, vectors) for completed documents, vectors=None if any chunk failed."""
+        done: List[Tuple[Hashable, Optional[List[np.ndarray]]]] = []
+        for (key, i, _), vec in zip(batch, vectors):
+            if vec is None:
+                self._failed.add(key)
+            else:
+                self._docs[key][i] = vec
+            self._left[key] -= 1
+            if self._left[key] == 0:
+                vecs = self._docs.pop(key)
+                del self._left[key]
+                if key in self._failed:
+                    self._failed.discard(key)
+                    done.append((key, None))
+                else:
+                    done.append((key, vecs))
+        return done
+
+
+class QueryBatcher:
+    """Coalesces concurrent query embeddings into one embed_many call.
+
+    The first query opens a window of ``window_ms``; everything that arrives
+    before it closes (or until ``max_items`` are waiting) goes to the
+    embedder as one batch on ``executor``. With ``then``, the batch of
+    vectors and the callers' extras are handed on in the same executor job
+    (e.g. for one batched index search) and its results are what callers get.
+    """
+
+    def __init__(
+        self,
+        embedder: EmbeddingsBackend,
+        window_ms: Optional[float] = None,
+        max_items: Optional[int] = None,
+        executor: Optional[Executor] = None,
+        then: Optional[Callable[[List[np.ndarray], List[Any]], List[Any]]] = None,
+    ):
+        self.embedder = embedder
+        self.window = (settings.query_batch_window_ms if window_ms is None else window_ms) / 1000
+        self.max_items = max_items or settings.query_batch_max
+        self.executor = executor
+        self.then = then
+        self._pending: List[Tuple[str, Any, asyncio.Future, tuple]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.stats: Dict[str, int] = {"batches": 0, "items": 0}
+
+    async def submit(self, text: str, extra: Any = None) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, extra, fut, metrics.collecting()))
+        if len(self._pending) >= self.max_items:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    def _run(self, texts: List[str], extras: List[Any], sinks: tuple) -> List[Any]:
+        # stage timings of the shared job go to every caller that collects them
+        with metrics.collect_timings(*sinks):
+            vectors = embed_queries(self.embedder, texts)
+            return self.then(vectors, extras) if self.then else vectors
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+        self.stats["batches"] += 1
+        self.stats["items"] += len(batch)
+        job = asyncio.get_running_loop().run_in_executor(
+            self.executor, self._run, [t for t, *_ in batch], [x for _, x, *_ in batch],
+            tuple(s for *_, sinks in batch for s in sinks))
+        job.add_done_callback(partial(self._resolve, batch))
+
+    @staticmethod
+    def _resolve(batch: List[Tuple[str, Any, asyncio.Future, tuple]], job: asyncio.Future) -> None:
+        if job.cancelled():  # e.g. the executor shut down; exception() would raise here
+            for _, _, fut, _ in batch:
+                if not fut.done():
+                    fut.cancel()
+            return
+        error = job.exception()
+        for i, (_, _, fut, _) in enumerate(batch):
+            if fut.done():  # caller went away
+                continue
+            if error is not None:
+                fut.set_exception(error)
+            else:
+                fut.set_result(job.result()[i])
+
@@ -0,0 +1,182 @@
+from __future__ import annotations
+import asyncio
+import datetime as dt
+import random
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from .config import settings
+
+try:
+    import h2  # noqa: F401  (httpx needs it for http2=True)
+    _HAS_H2 = True
+except ImportError:
+    _HAS_H2 = False
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+@dataclass
+class FetchResult:
+    status: int
+    title: str = ""
+    text: str = ""
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    html: str = ""
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status == 304
+
+
+class ResponseTooLarge(httpx.HTTPError):
+    pass
+
+
+def _retry_after(value: Optional[str]) -> Optional[float]:
+    """Retry-After is either delta-seconds or an HTTP-date."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=dt.timezone.utc)
+    return max(0.0, (when - dt.datetime.now(dt.timezone.utc)).total_seconds())
+
+
+class Fetcher:
+    """Polite HTTP GET: global + per-host concurrency caps, retries with jittered
+    exponential backoff on 429/5xx and transport errors, and a response size cap.
+    A Retry-After longer than backoff_max fails the URL instead of retrying early.
+
+    Use as `async with Fetcher() as f: await f.get(url)`. A ready client can be
+    passed in (e.g. one with a MockTransport, or pointed at a local stub server).
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        concurrency: Optional[int] = None,
+        per_host: Optional[int] = None,
+        retries: Optional[int] = None,
+        backoff_base: Optional[float] = None,
+        backoff_max: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+    ):
+        self._own_client = client is None
+        self.client = client or self._make_client()
+        self.retries = settings.fetch_retries if retries is None else retries
+        self.backoff_base = settings.fetch_backoff_base if backoff_base is None else backoff_base
+        self.backoff_max = settings.fetch_backoff_max if backoff_max is None else backoff_max
+        self.max_bytes = settings.fetch_max_bytes if max_bytes is None else max_bytes
+        self._global = asyncio.Semaphore(concurrency or settings.ingest_fetch_concurrency)
+        self._per_host_limit = per_host or settings.fetch_per_host
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self.stats: Dict[str, int] = {"requests": 0, "retries": 0, "failures": 0}
+
+    @staticmethod
+    def _make_client() -> httpx.AsyncClient:
+        http2 = settings.fetch_http2 and _HAS_H2
+        if settings.fetch_http2 and not _HAS_H2:
+            print("[WARN] FETCH_HTTP2=true, но пакет h2 не установлен — используется HTTP/1.1")
+        return httpx.AsyncClient(
+            follow_redirects=True,
+            http2=http2,
+            timeout=settings.timeout_seconds,
+            headers={"User-Agent": settings.user_agent},
+            limits=httpx.Limits(
+                max_connections=settings.fetch_max_connections,
+                max_keepalive_connections=settings.fetch_max_connections,
+            ),
+        )
+
+    async def __aenter__(self) -> "Fetcher":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._own_client:
+            await self.client.aclose()
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = (urlsplit(url).hostname or "").lower()
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self._per_host_limit)
+        return sem
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        cap = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        delay = random.uniform(cap / 2, cap)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+    async def _once(self, url: str, headers: Dict[str, str]) -> FetchResult:
+        # host slot first: a request queued behind a busy host must not hold one of the global slots
+        async with self._host_slot(url), self._global:
+            self.stats["requests"] += 1
+            async with self.client.stream("GET", url, headers=headers) as r:
+                if r.status_code == 304:
+                    return FetchResult(304, etag=r.headers.get("ETag"), last_modified=r.headers.get("Last-Modified"))
+                if r.status_code in RETRY_STATUSES:
+                    # raised with the response so the retry loop can read Retry-After
+                    raise httpx.HTTPStatusError(f"HTTP {r.status_code}", request=r.request, response=r)
+                r.raise_for_status()
+                length = r.headers.get("Content-Length")
+                if length and length.isdigit() and int(length) > self.max_bytes:
+                    raise ResponseTooLarge(f"response too large: {length} bytes > {self.max_bytes}")
+                body = bytearray()
+                async for part in r.aiter_bytes():
+                    body += part
+                    if len(body) > self.max_bytes:
+                        raise ResponseTooLarge(f"response too large: > {self.max_bytes} bytes")
+                html = body.decode(r.charset_encoding or "utf-8", errors="replace")
+                return FetchResult(r.status_code, etag=r.headers.get("ETag"),
+                                   last_modified=r.headers.get("Last-Modified"), html=html)
+
+    async def get(self, url: str, etag: Optional[str] = None, last_modified: Optional[str] = None) -> FetchResult:
+        headers: Dict[str, str] = {}
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+        attempt = 0
+        while True:
+            try:
+                res = await self._once(url, headers)
+                if res.not_modified:
+                    res.etag = res.etag or etag
+                    res.last_modified = res.last_modified or last_modified
+                return res
+            except httpx.HTTPStatusError as e:
+                retry_after = _retry_after(e.response.headers.get("Retry-After"))
+                # asked to come back later than we are willing to wait: retrying sooner would ignore the server
+                too_late = retry_after is not None and retry_after > self.backoff_max
+                if e.response.status_code not in RETRY_STATUSES or attempt >= self.retries or too_late:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, retry_after)
+            except ResponseTooLarge:
+                self.stats["failures"] += 1
+                raise
+            except httpx.TransportError:
+                if attempt >= self.retries:
+                    self.stats["failures"] += 1
+                    raise
+                delay = self._backoff(attempt, None)
+            attempt += 1
+            self.stats["retries"] += 1
+            await asyncio.sleep(delay)  # slots are released while we wait
@@ -0,0 +1,397 @@
+from __future__ import annotations
+import copy
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .quantize import STORAGE_DTYPES, decode_embedding, dequantize_rows, quantize_rows
+
+
+def _normalize_rows(mat: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return mat / norms
+
+
+Group = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# Rows are (chunk_id, document_id, blob) or (chunk_id, document_id, blob, storage, scale).
+BlobRow = Tuple
+
+# (dim, chunk ids) -> their full-precision (float32, not necessarily normalized) vectors; ids it can't serve are left out
+Originals = Callable[[int, np.ndarray], Dict[int, np.ndarray]]
+
+
+def group_blobs(rows: Iterable[BlobRow]) -> Dict[int, Group]:
+    """Decode embedding rows, split them by dimensionality into normalized float32 matrices."""
+    by_dim: Dict[int, List[Tuple[int, int, np.ndarray]]] = {}
+    for row in rows:
+        cid, did, blob = row[:3]
+        vec = decode_embedding(blob, *row[3:5])
+        by_dim.setdefault(vec.size, []).append((cid, did, vec))
+    out: Dict[int, Group] = {}
+    for dim, items in by_dim.items():
+        out[dim] = (
+            np.fromiter((c for c, _, _ in items), dtype="int64", count=len(items)),
+            np.fromiter((d for _, d, _ in items), dtype="int64", count=len(items)),
+            _normalize_rows(np.vstack([v for _, _, v in items])),
+        )
+    return out
+
+
+class _Segment:
+    """Pre-normalized vectors of one dimensionality.
+
+    An optional read-only float32 ``base`` (typically a memory-mapped segment
+    file) is followed by a growable in-RAM tail for rows added after it was
+    opened. The tail is kept in ``storage`` precision; for float16/int8 the
+    scan picks ``rescore * k`` candidates on the quantized matrix and the
+    final top-k is rescored on the candidates' float32 originals, looked up
+    through ``originals``. A candidate without one (or with no lookup at
+    all) is rescored on its dequantized row, which only re-normalizes it.
+
+    VectorIndex treats published segments as snapshots: it changes a shallow
+    copy() and swaps it in. add() only writes past ``size`` (rows no
+    snapshot reads) and remove()/set_base() build new arrays, so searches
+    on an older snapshot stay consistent without a lock.
+    """
+
+    # upcast quantized rows this many values at a time: small enough to stay in cache, whatever the dim
+    block_values = 1 << 19
+
+    def __init__(
+        self, dim: int, capacity: int = 1024, storage: str = "float32", rescore: int = 4,
+        originals: Optional[Originals] = None,
+    ):
+        self.dim = dim
+        self.storage = storage
+        self.rescore = rescore
+        self.originals = originals
+        self.size = 0
+        self.matrix = np.empty((capacity, dim), dtype=STORAGE_DTYPES[storage])
+        self.scales = np.empty(capacity, dtype="float32") if storage == "int8" else None
+        self.chunk_ids = np.empty(capacity, dtype="int64")
+        self.doc_ids = np.empty(capacity, dtype="int64")
+        self.base: Group | None = None
+        self.base_alive: np.ndarray | None = None
+        self.base_count = 0
+        self._postings: Tuple[np.ndarray, np.ndarray] | None = None
+
+    @property
+    def total(self) -> int:
+        return self.size + self.base_count
+
+    def copy(self) -> "_Segment":
+        return copy.copy(self)
+
+    def set_base(self, group: Group, alive: np.ndarray | None = None) -> None:
+        self.base = group
+        self.base_alive = alive if alive is not None else np.ones(len(group[0]), dtype=bool)
+        self.base_count = int(self.base_alive.sum())
+        self._postings = None
+
+    def remove(self, chunk_ids: np.ndarray) -> int:
+        removed = 0
+        if self.base is not None:
+            hit = np.isin(self.base[0], chunk_ids) & self.base_alive
+            if hit.any():
+                self.base_alive = self.base_alive & ~hit
+                self.base_count -= int(hit.sum())
+                removed += int(hit.sum())
+                self._postings = None
+        keep = ~np.isin(self.chunk_ids[:self.size], chunk_ids)
+        n = int(keep.sum())
+        if n < self.size:
+            removed += self.size - n
+            self.matrix = _compacted(self.matrix, self.size, keep)
+            if self.scales is not None:
+                self.scales = _compacted(self.scales, self.size, keep)
+            self.chunk_ids = _compacted(self.chunk_ids, self.size, keep)
+            self.doc_ids = _compacted(self.doc_ids, self.size, keep)
+            self.size = n
+            self._postings = None
+        return removed
+
+    def _reserve(self, extra: int) -> None:
+        need = self.size + extra
+        cap = self.matrix.shape[0]
+        if need <= cap:
+            return
+        while cap < need:
+            cap *= 2
+        self.matrix = np.resize(self.matrix, (cap, self.dim))
+        if self.scales is not None:
+            self.scales = np.resize(self.scales, cap)
+        self.chunk_ids = np.resize(self.chunk_ids, cap)
+        self.doc_ids = np.resize(self.doc_ids, cap)
+
+    def add(self, chunk_ids: np.ndarray, doc_ids: np.ndarray, normalized: np.ndarray) -> None:
+        n = len(chunk_ids)
+        self._reserve(n)
+        codes, scales = quantize_rows(normalized, self.storage)
+        self.matrix[self.size:self.size + n] = codes
+        if self.scales is not None:
+            self.scales[self.size:self.size + n] = scales
+        self.chunk_ids[self.size:self.size + n] = chunk_ids
+        self.doc_ids[self.size:self.size + n] = doc_ids
+        self.size += n
+        self._postings = None
+
+    def vectors(self, rows: np.ndarray | slice) -> np.ndarray:
+        """Tail rows dequantized to float32 and re-normalized."""
+        scales = self.scales[rows] if self.scales is not None else None
+        return _normalize_rows(dequantize_rows(self.matrix[rows], scales))
+
+    def exact(self, rows: np.ndarray) -> np.ndarray:
+        """Tail rows in full precision for rescoring: the originals where available, else vectors(), normalized."""
+        scales = self.scales[rows] if self.scales is not None else None
+        mat = dequantize_rows(self.matrix[rows], scales)
+        if self.originals is not None and len(rows):
+            found = self.originals(self.dim, self.chunk_ids[rows])
+            for i, cid in enumerate(self.chunk_ids[rows].tolist()):
+                vec = found.get(cid)
+                if vec is not None and vec.size == self.dim:
+                    mat[i] = vec
+        return _normalize_rows(mat)
+
+    def rows_for_documents(self, doc_ids: np.ndarray) -> np.ndarray:
+        """Live row positions (base rows first, then tail rows offset by the base length) of the given documents.
+
+        Uses a doc_id -> rows posting list (argsort of doc_ids), built lazily and
+        dropped on add/remove, so a lookup costs O(len(doc_ids) * log n + rows found).
+        """
+        if self._postings is None:
+            dids = self.doc_ids[:self.size]
+            if self.base is not None:
+                dids = np.concatenate([self.base[1], dids])
+            order = np.argsort(dids, kind="stable")
+            self._postings = (dids[order], order)
+        sorted_dids, order = self._postings
+        lo = np.searchsorted(sorted_dids, doc_ids, side="left")
+        hi = np.searchsorted(sorted_dids, doc_ids, side="right")
+        if not (hi > lo).any():
+            return np.empty(0, dtype="int64")
+        rows = np.sort(np.concatenate([order[a:b] for a, b in zip(lo, hi) if b > a]))
+        if self.base is not None and len(self.base[0]):
+            offset = len(self.base[0])
+            base_rows = rows < offset
+            rows = rows[~base_rows | self.base_alive[np.where(base_rows, rows, 0)]]
+        return rows
+
+    def _scan(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Scores of the tail rows (all, or just `rows`) for a (n_queries, dim) block, as one matrix product."""
+        n = self.size if rows is None else len(rows)
+        if self.storage == "float32":
+            return queries @ (self.matrix[:self.size] if rows is None else self.matrix[rows]).T
+        scores = np.empty((len(queries), n), dtype="float32")
+        step = max(64, self.block_values // self.dim)
+        for i in range(0, n, step):
+            j = min(n, i + step)
+            part = self.matrix[i:j] if rows is None else self.matrix[rows[i:j]]
+            scores[:, i:j] = queries @ part.astype("float32").T
+        if self.scales is not None:
+            scores *= self.scales[:self.size] if rows is None else self.scales[rows]
+        return scores
+
+    def search(self, q: np.ndarray, k: int, doc_ids: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        return self.search_many(q[None, :], k, doc_ids)[0]
+
+    def search_many(
+        self, queries: np.ndarray, k: int, doc_ids: np.ndarray | None = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """Top-k per query; with `doc_ids`, only the rows of those documents are scored."""
+        empty = [(np.empty(0, dtype="int64"), np.empty(0, dtype="float32")) for _ in range(len(queries))]
+        if self.total == 0 or k <= 0:
+            return empty
+        offset = len(self.base[0]) if self.base is not None else 0
+        if doc_ids is None:
+            tail_rows = None
+            scores = self._scan(queries)
+            ids = self.chunk_ids[:self.size]
+            if self.base is not None:
+                base_scores = queries @ self.base[2].T
+                base_scores[:, ~self.base_alive] = -np.inf
+                scores = np.concatenate([base_scores, scores], axis=1)
+                ids = np.concatenate([self.base[0], ids])
+        else:
+            rows = self.rows_for_documents(doc_ids)
+            if not len(rows):
+                return empty
+            base_rows, tail_rows = rows[rows < offset], rows[rows >= offset] - offset
+            scores = self._scan(queries, tail_rows)
+            ids = self.chunk_ids[tail_rows]
+            if len(base_rows):
+                scores = np.concatenate([queries @ self.base[2][base_rows].T, scores], axis=1)
+                ids = np.concatenate([self.base[0][base_rows], ids])
+            offset = len(base_rows)
+        quantized = self.storage != "float32" and scores.shape[1] > offset
+        tops = []
+        for row in scores:
+            top = _top_k(row, k * self.rescore if quantized else k)
+            tops.append(top[np.isfinite(row[top])])
+        if quantized:
+            # one originals lookup for the tail candidates of all queries
+            cand = np.unique(np.concatenate(tops))
+            cand = cand[cand >= offset]
+            exact = self.exact(cand - offset if tail_rows is None else tail_rows[cand - offset])
+            for i, (q, row) in enumerate(zip(queries, scores)):
+                top = tops[i]
+                tail = top[top >= offset]
+                row[tail] = exact[np.searchsorted(cand, tail)] @ q
+                tops[i] = top[_top_k(row[top], k)]
+        return [(ids[top], row[top]) for row, top in zip(scores, tops)]
+
+
+def _compacted(arr: np.ndarray, size: int, keep: np.ndarray) -> np.ndarray:
+    """New array of the same capacity holding the kept rows of arr[:size] first."""
+    out = np.empty_like(arr)
+    out[:int(keep.sum())] = arr[:size][keep]
+    return out
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    n = len(scores)
+    k = min(k, n)
+    top = np.argpartition(-scores, k - 1)[:k] if k < n else np.arange(n)
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+class VectorIndex:
+    """Process-resident index of chunk embeddings.
+
+    Vectors are grouped by dimensionality, so a database that mixes
+    backends (e.g. local and OpenAI embeddings) keeps working: a query is
+    scored only against vectors of its own size.
+    """
+
+    # past this many logged removals the log is dropped and epoch bumped: consumers resync instead of replaying
+    removed_log_max = 65536
+
+    def __init__(self, storage: str = "float32", rescore: int = 4, originals: Optional[Originals] = None):
+        self.storage = storage
+        self.rescore = rescore
+        # full-precision lookup for rescoring quantized candidates, see _Segment
+        self.originals = originals
+        # guards writers and the swap of `_segments`; searches only hold it to take the current snapshot
+        self._lock = threading.Lock()
+        self._segments: Dict[int, _Segment] = {}
+        self.max_chunk_id = 0
+        self.loaded = False
+        # bumped by clear(); consumers holding derived structures (IVF) rebuild on change
+        self.epoch = 0
+        # chunk ids removed since the last clear() or compaction, in order; consumers replay the tail they haven't seen
+        self.removed_ids: List[int] = []
+        # value of the `deletions` counter in the DB meta table this index reflects
+        self.deletions = 0
+
+    def __len__(self) -> int:
+        return sum(s.total for s in self._segments.values())
+
+    def add_blobs(self, rows: Iterable[BlobRow]) -> None:
+        self.add_groups(group_blobs(rows))
+
+    def add_groups(self, groups: Dict[int, Group]) -> None:
+        with self._lock:
+            segments = dict(self._segments)
+            for dim, (cids, dids, mat) in groups.items():
+                if not len(cids):
+                    continue
+                self._writable(segments, dim).add(cids, dids, mat)
+                self.max_chunk_id = max(self.max_chunk_id, int(cids.max()))
+            self._segments = segments
+
+    def attach_base(self, dim: int, group: Group, alive: np.ndarray | None = None) -> None:
+        with self._lock:
+            segments = dict(self._segments)
+            self._writable(segments, dim).set_base(group, alive)
+            self._segments = segments
+            if self.removed_ids:
+                # removals before the new base are already reflected in `alive`
+                self.compact_removed()
+            if len(group[0]):
+                self.max_chunk_id = max(self.max_chunk_id, int(group[0].max()))
+
+    def _writable(self, segments: Dict[int, _Segment], dim: int) -> _Segment:
+        """Private copy of a segment (or a new one) in `segments`, the dict to publish after the change."""
+        seg = segments.get(dim)
+        seg = segments[dim] = seg.copy() if seg is not None else _Segment(
+            dim, storage=self.storage, rescore=self.rescore, originals=self.originals)
+        return seg
+
+    def dims(self) -> List[int]:
+        return list(self._segments)
+
+    def export(self, dim: int, after_id: int = 0) -> Group:
+        """Copy of (chunk_ids, doc_ids, normalized vectors) with chunk_id > after_id."""
+        with self._lock:
+            seg = self._segments.get(dim)
+        if seg is None:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="int64"), np.empty((0, dim), dtype="float32")
+        parts = [(seg.chunk_ids[:seg.size], seg.doc_ids[:seg.size], seg.vectors(slice(0, seg.size)))]
+        if seg.base is not None:
+            parts.insert(0, tuple(a[seg.base_alive] for a in seg.base))
+        cids = np.concatenate([p[0] for p in parts])
+        mask = cids > after_id
+        return (
+            cids[mask],
+            np.concatenate([p[1] for p in parts])[mask],
+            np.concatenate([p[2] for p in parts])[mask],
+        )
+
+    def search(self, query: np.ndarray, k: int, doc_ids: np.ndarray | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (chunk_ids, scores); `doc_ids` (sorted or not) restricts scoring to those documents' rows."""
+        q = np.asarray(query, dtype="float32").ravel()
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            seg = self._segments.get(q.size)
+        if seg is None:
+            return np.empty(0, dtype="int64"), np.empty(0, dtype="float32")
+        return seg.search(q, k, doc_ids)
+
+    def search_many(
+        self, queries: List[np.ndarray], k: int, doc_ids: np.ndarray | None = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """search() for several queries; queries of the same size are scored in one matrix product."""
+        out: List[Tuple[np.ndarray, np.ndarray]] = [(np.empty(0, dtype="int64"), np.empty(0, dtype="float32"))] * len(queries)
+        by_dim: Dict[int, List[int]] = {}
+        vecs = [np.asarray(q, dtype="float32").ravel() for q in queries]
+        for i, q in enumerate(vecs):
+            by_dim.setdefault(q.size, []).append(i)
+        with self._lock:
+            segments = self._segments
+        for dim, rows in by_dim.items():
+            seg = segments.get(dim)
+            if seg is None:
+                continue
+            block = _normalize_rows(np.vstack([vecs[i] for i in rows])).astype("float32")
+            for i, res in zip(rows, seg.search_many(block, k, doc_ids)):
+                out[i] = res
+        return out
+
+    def remove(self, chunk_ids: Iterable[int]) -> int:
+        ids = np.fromiter(chunk_ids, dtype="int64")
+        if not len(ids):
+            return 0
+        with self._lock:
+            segments = dict(self._segments)
+            removed = sum(self._writable(segments, dim).remove(ids) for dim in list(segments))
+            self._segments = segments
+            self.removed_ids.extend(ids.tolist())
+            if len(self.removed_ids) > self.removed_log_max:
+                self.compact_removed()
+        return removed
+
+    def compact_removed(self) -> None:
+        """Forget the removal log (caller holds the lock); the epoch bump makes consumers (IVF) rebuild from the live rows."""
+        self.removed_ids = []
+        self.epoch += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._segments = {}
+            self.max_chunk_id = 0
+            self.loaded = False
+            self.epoch += 1
+            self.removed_ids = []
+            self.deletions = 0
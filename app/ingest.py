@@ -1,66 +1,310 @@
 import asyncio
 import datetime as dt
-from typing import List, Sequence, Any
-import httpx
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Any, Optional, Iterable, Iterator, Callable, Awaitable
 import numpy as np
 
-from .config import settings
-from .db import init_db, insert_document, insert_chunks
-from .utils import html_to_text, chunk_text
-from .embeddings import get_embedder
+from . import metrics
+from .config import Settings, settings
+from .fetch import Fetcher, FetchResult
+from .db import init_db, get_document_meta, replace_documents, DocumentWrite, touch_document, text_hash
+from .links import normalize_url
+from .utils import extract_document
+from .embeddings import get_embedder, cache_stats, EmbeddingBatcher, HashingEmbeddings, LocalEmbeddings, refit_hashing_idf
+from .retriever import get_retriever
 
 
-async def fetch_url(client: httpx.AsyncClient, url: str) -> tuple[str, str]:
-    r = await client.get(url, timeout=settings.timeout_seconds, headers={"User-Agent": settings.user_agent})
-    r.raise_for_status()
-    title, text = html_to_text(r.text)
-    return title, text
+_parse_pool: Optional[Executor] = None
 
 
-def _urls_to_str_list(urls: Sequence[Any]) -> List[str]:
-    return [str(u) for u in urls]
+def get_parse_pool() -> Optional[Executor]:
+    """Process pool for HTML extraction (None = default thread pool), shared across ingest runs."""
+    global _parse_pool
+    if _parse_pool is None and settings.parse_in_processes:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=settings.ingest_parse_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_pool
+
+
+def _unique_urls(urls: Iterable[Any]) -> Iterator[str]:
+    seen = set()
+    for u in urls:
+        key = normalize_url(str(u))
+        if key not in seen:
+            seen.add(key)
+            yield str(u)
+
+
+@dataclass
+class _Doc:
+    url: str
+    meta: Optional[tuple]
+    res: FetchResult
+    fetched_at: str
+    content_hash: str = ""
+    chunks: List[str] = field(default_factory=list)
+    vectors: List[np.ndarray] = field(default_factory=list)
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    items_in: int = 0
+    items_out: int = 0
+    busy: float = 0.0
+
+    def report(self, elapsed: float) -> str:
+        rate = self.items_in / elapsed if elapsed else 0.0
+        util = self.busy / (elapsed * self.workers) if elapsed else 0.0
+        return (f"{self.name:<6} x{self.workers:<3} in={self.items_in:<6} out={self.items_out:<6} "
+                f"{rate:8.1f} docs/s  busy={self.busy:7.2f}s  util={util:4.0%}")
+
+
+_DONE = object()
+
+
+async def _stage(
+    stats: StageStats,
+    inbox: asyncio.Queue,
+    outbox: Optional[asyncio.Queue],
+    fn: Callable[[Any], Awaitable[Any]],
+) -> None:
+    """Run `stats.workers` copies of fn over inbox; None results are dropped, exceptions logged and skipped."""
+    alive = stats.workers
+
+    async def worker():
+        nonlocal alive
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                await inbox.put(_DONE)  # let sibling workers see it too
+                break
+            stats.items_in += 1
+            t0 = time.perf_counter()
+            try:
+                out = await fn(item)
+            except Exception as e:
+                url = getattr(item, "url", item)
+                print(f"[WARN] {stats.name} failed for {url}: {e}")
+                metrics.inc("eora_ingest_documents_total", result=f"{stats.name}_failed")
+                out = None
+            spent = time.perf_counter() - t0
+            stats.busy += spent
+            metrics.observe("eora_ingest_stage_seconds", spent, stage=stats.name)
+            if out is not None:
+                stats.items_out += 1
+                if outbox is not None:
+                    await outbox.put(out)
+        alive -= 1
+        if alive == 0 and outbox is not None:
+            await outbox.put(_DONE)
+
+    await asyncio.gather(*(worker() for _ in range(stats.workers)))
 
 
-async def ingest_urls(urls: Sequence[Any]) -> List[int]:
+async def _call_inline(fn: Callable[..., Any], *args: Any) -> Any:
+    return fn(*args)
+
+
+async def ingest_urls(urls: Iterable[Any], cfg: Optional[Settings] = None, inline: bool = False) -> List[int]:
+    """Streaming fetch -> parse/chunk -> embed -> write pipeline.
+
+    Stages are connected by bounded queues, so memory stays flat however
+    long the URL list is, and every stage runs with its own concurrency.
+    cfg carries per-request overrides (embedding backend, model, API key).
+    inline=True runs the blocking steps (DB, HTML extraction, embedding) on
+    the event loop thread instead of threads/processes: much slower, but a
+    profiler attached to that thread then sees all of the work.
+    """
     init_db()
+    offload = _call_inline if inline else asyncio.to_thread
+    hits0, misses0 = cache_stats["hits"], cache_stats["misses"]
     fetched_ids: List[int] = []
-    urls_str = _urls_to_str_list(urls)
+    embedder = get_embedder(cfg)
+
+    embed_workers = settings.ingest_embed_workers
+    if isinstance(embedder, LocalEmbeddings):
+        # keep every encoder process busy: one batch in flight per process
+        embed_workers = max(embed_workers, settings.local_embed_processes)
+    qsize = settings.ingest_queue_size
+    q_urls: asyncio.Queue = asyncio.Queue(qsize)
+    q_fetched: asyncio.Queue = asyncio.Queue(qsize)
+    q_parsed: asyncio.Queue = asyncio.Queue(qsize)
+    q_embedded: asyncio.Queue = asyncio.Queue(qsize)
+
+    stats = [
+        StageStats("fetch", settings.ingest_fetch_concurrency),
+        StageStats("parse", settings.ingest_parse_workers),
+        StageStats("embed", embed_workers),
+        StageStats("write", 1),
+    ]
+
+    async def produce():
+        for u in _unique_urls(urls):
+            await q_urls.put(u)
+        await q_urls.put(_DONE)
+
+    async def fetch(url: str) -> Optional[_Doc]:
+        meta = await offload(get_document_meta, url)
+        # validators only count if the stored vectors came from this embedder; otherwise refetch and re-embed
+        current = meta is not None and meta[4] == embedder.vector_key
+        res = await fetcher.get(url, *(meta[1:3] if current else ()))
+        doc = _Doc(url, meta, res, dt.datetime.utcnow().isoformat())
+        if res.not_modified:
+            if current:
+                await offload(touch_document, meta[0], doc.fetched_at, res.etag, res.last_modified)
+            print(f"[SKIP] not modified: {url}")
+            metrics.inc("eora_ingest_documents_total", result="not_modified")
+            return None
+        return doc
+
+    pool = None if inline else get_parse_pool()
+    loop = asyncio.get_running_loop()
+
+    async def parse(doc: _Doc) -> Optional[_Doc]:
+        res = doc.res
+        args = (res.html, settings.html_backend, settings.chunk_size, settings.chunk_overlap)
+        res.title, res.text, doc.chunks = (
+            extract_document(*args) if inline else await loop.run_in_executor(pool, extract_document, *args)
+        )
+        res.html = ""
+        doc.content_hash = text_hash(f"{res.title}\n{res.text}")
+        if doc.meta and doc.meta[3] == doc.content_hash and doc.meta[4] == embedder.vector_key:
+            await offload(touch_document, doc.meta[0], doc.fetched_at, res.etag, res.last_modified)
+            print(f"[SKIP] unchanged: {doc.url}")
+            metrics.inc("eora_ingest_documents_total", result="unchanged")
+            return None
+        return doc
+
+    async def embed_stage() -> None:
+        """Cross-document batching: full batches go out as soon as they fill; a partial batch is
+        flushed whenever the upstream queue runs dry, so batch size adapts to the arrival rate."""
+        st = stats[2]
+        batcher = EmbeddingBatcher(embedder)
+        docs: dict[int, _Doc] = {}
+        limit = asyncio.Semaphore(st.workers)
+        running: set[asyncio.Task] = set()
+
+        async def run_batch(batch) -> None:
+            async with limit:
+                t0 = time.perf_counter()
+                vectors = await offload(batcher.embed, batch)
+                spent = time.perf_counter() - t0
+                st.busy += spent
+                metrics.observe("eora_ingest_stage_seconds", spent, stage="embed")
+            for key, vecs in batcher.scatter(batch, vectors):
+                doc = docs.pop(key)
+                if vecs is None:
+                    print(f"[WARN] embeddings failed for {doc.url} via {embedder.name}")
+                    metrics.inc("eora_ingest_documents_total", result="embed_failed")
+                    continue
+                doc.vectors = vecs
+                st.items_out += 1
+                await q_embedded.put(doc)
+
+        def launch(flush: bool) -> None:
+            for batch in batcher.take(flush):
+                task = asyncio.create_task(run_batch(batch))
+                running.add(task)
+                task.add_done_callback(running.discard)
 
-    async with httpx.AsyncClient(follow_redirects=True) as client:
-        tasks = [fetch_url(client, u) for u in urls_str]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        while True:
+            doc = await q_parsed.get()
+            if doc is _DONE:
+                break
+            st.items_in += 1
+            if not doc.chunks:
+                st.items_out += 1
+                await q_embedded.put(doc)
+                continue
+            docs[id(doc)] = doc
+            batcher.add(id(doc), doc.chunks)
+            if batcher.ready() or q_parsed.empty():
+                launch(flush=q_parsed.empty())
+            while len(running) >= st.workers:
+                await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+        launch(flush=True)
+        while running:
+            await asyncio.gather(*list(running))
+        await q_embedded.put(_DONE)
 
-    embedder = get_embedder()
+    def _write(docs: List[_Doc]) -> None:
+        writes = []
+        for doc in docs:
+            res = doc.res
+            rows = [(idx, c, np.asarray(vec, dtype="float32").tobytes())
+                    for idx, (c, vec) in enumerate(zip(doc.chunks, doc.vectors))]
+            writes.append(DocumentWrite(doc.url, res.title, res.text, doc.fetched_at, rows,
+                                        res.etag, res.last_modified, doc.content_hash, embedder.vector_key))
+        doc_ids = replace_documents(writes)
+        for doc, w, doc_id in zip(docs, writes, doc_ids):
+            if not w.rows:
+                print(f"[WARN] empty content after chunking: {doc.url}")
+                metrics.inc("eora_ingest_documents_total", result="empty")
+                continue
+            fetched_ids.append(doc_id)
+            metrics.inc("eora_ingest_documents_total", result="indexed")
+            metrics.inc("eora_ingest_chunks_total", len(w.rows))
+            stats[3].items_out += 1
+            print(f"[OK] indexed {doc.url} -> doc_id={doc_id}, chunks={len(w.rows)} using {embedder.name}")
 
-    for url, res in zip(urls_str, results):
-        if isinstance(res, Exception):
-            print(f"[WARN] skip {url}: {res}")
-            continue
+    async def write_stage() -> None:
+        """Group whatever has queued up (up to WRITE_BATCH_DOCS) into one transaction."""
+        st = stats[3]
+        done = False
+        while not done:
+            batch = [await q_embedded.get()]
+            while len(batch) < settings.write_batch_docs and not q_embedded.empty():
+                batch.append(q_embedded.get_nowait())
+            if batch[-1] is _DONE:
+                batch.pop()
+                done = True
+            if not batch:
+                continue
+            st.items_in += len(batch)
+            t0 = time.perf_counter()
+            try:
+                await offload(_write, batch)
+            except Exception:
+                # retry one by one so a bad document only loses itself
+                for doc in batch:
+                    try:
+                        await offload(_write, [doc])
+                    except Exception as e:
+                        print(f"[WARN] write failed for {doc.url}: {e}")
+                        metrics.inc("eora_ingest_documents_total", result="write_failed")
+            spent = time.perf_counter() - t0
+            st.busy += spent
+            metrics.observe("eora_ingest_stage_seconds", spent, stage="write")
 
-        title, text = res
-        doc_id = insert_document(
-            url=url,
-            title=title,
-            content=text,
-            fetched_at=dt.datetime.utcnow().isoformat()
+    t0 = time.perf_counter()
+    async with Fetcher() as fetcher:
+        await asyncio.gather(
+            produce(),
+            _stage(stats[0], q_urls, q_fetched, fetch),
+            _stage(stats[1], q_fetched, q_parsed, parse),
+            embed_stage(),
+            write_stage(),
         )
-        chunks = chunk_text(text, settings.chunk_size, settings.chunk_overlap)
-        if not chunks:
-            print(f"[WARN] empty content after chunking: {url}")
-            continue
-
-        try:
-            vectors = embedder.embed_many(chunks)
-        except Exception as e:
-            print(f"[WARN] embeddings failed for {url} via {embedder.name}: {e}")
-            continue
-
-        rows = []
-        for idx, (c, vec) in enumerate(zip(chunks, vectors)):
-            arr = np.array(vec, dtype="float32")
-            rows.append((idx, c, arr.tobytes()))
-        insert_chunks(doc_id, rows)
-        fetched_ids.append(doc_id)
-        print(f"[OK] indexed {url} -> doc_id={doc_id}, chunks={len(chunks)} using {embedder.name}")
+    elapsed = time.perf_counter() - t0
+    metrics.observe("eora_ingest_seconds", elapsed)
 
+    fs = fetcher.stats
+    print(f"[INFO] fetch: requests={fs['requests']}, retries={fs['retries']}, failures={fs['failures']}")
+    print(f"[INFO] embedding cache: hits={cache_stats['hits'] - hits0}, misses={cache_stats['misses'] - misses0}")
+    print(f"[STATS] pipeline {elapsed:.2f}s")
+    for st in stats:
+        print(f"[STATS] {st.report(elapsed)}")
+    if fetched_ids:
+        await offload(get_retriever().save)  # IVF assigns the new chunks and writes its .npz
+        if isinstance(embedder, HashingEmbeddings):
+            t0 = time.perf_counter()
+            version = await offload(refit_hashing_idf, embedder)
+            print(f"[OK] hashing IDF refit v{version} in {time.perf_counter() - t0:.2f}s")
     return fetched_ids
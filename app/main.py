@@ -1,14 +1,20 @@
-from fastapi import FastAPI
+import asyncio
+import time
+from contextlib import nullcontext
+
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, Response
+from fastapi.responses import FileResponse, RedirectResponse, Response
 
+from . import metrics, profiling
 from .config import settings
 from .db import init_db, list_documents
 from .webui import router as web_router
 from .ingest import ingest_urls
-from .rag import answer
-from .schemas import IngestRequest, AskRequest, AskResponse, DocListItem
+from .rag import answer, answer_async, answer_batch, answer_stream, cache_report, close_clients, make_filter
+from .sse import sse_response
+from .schemas import IngestRequest, AskRequest, AskResponse, AskBatchRequest, AskBatchResponse, DocListItem
 
 app = FastAPI(title="EORA RAG Assistant", version="1.2.0")
 
@@ -26,6 +32,10 @@ app.include_router(web_router, prefix="/ui")
 def _startup():
     init_db()
 
+@app.on_event("shutdown")
+async def _shutdown():
+    await close_clients()
+
 @app.get("/", include_in_schema=False)
 def root_redirect():
     return RedirectResponse(url="/ui/")
@@ -38,18 +48,76 @@ def favicon():
 def health():
     return {"status": "ok"}
 
+def _wants_profile(request: Request) -> bool:
+    """?profile=1 or an X-Profile: 1 header; only honoured with PROFILING_ENABLED."""
+    flag = request.query_params.get("profile") or request.headers.get("x-profile")
+    if not flag or flag.lower() in ("0", "false", "no"):
+        return False
+    if not settings.profiling_enabled:
+        raise HTTPException(403, "profiling is disabled (PROFILING_ENABLED=false)")
+    return True
+
 @app.post("/ingest")
-async def ingest(req: IngestRequest):
-    urls = req.urls or settings.seed_links
-    ids = await ingest_urls([str(u) for u in urls])
+async def ingest(req: IngestRequest, request: Request, response: Response):
+    """With profiling the whole pipeline runs in one thread (see ingest_urls(inline=True)) under the profiler."""
+    urls = [str(u) for u in req.urls or settings.seed_links]
+    if _wants_profile(request):
+        ids, profile_id = await asyncio.to_thread(
+            profiling.profile_call, "ingest", asyncio.run, ingest_urls(urls, inline=True))
+        response.headers["X-Profile-Id"] = profile_id
+        return {"indexed_documents": ids, "count": len(ids), "profile_id": profile_id}
+    ids = await ingest_urls(urls)
     return {"indexed_documents": ids, "count": len(ids)}
 
+@app.get("/profiles/{profile_id}", include_in_schema=False)
+def profile_download(profile_id: str):
+    if not settings.profiling_enabled:
+        raise HTTPException(403, "profiling is disabled (PROFILING_ENABLED=false)")
+    path = profiling.find_profile(profile_id)
+    if path is None:
+        raise HTTPException(404, "unknown profile id")
+    return FileResponse(path, filename=path.name)
+
+@app.get("/cache/stats")
+def cache_stats():
+    return cache_report()
+
+@app.get("/metrics", include_in_schema=False)
+def metrics_export():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/docs")
 def docs_list() -> list[DocListItem]:
     rows = list_documents()
     return [DocListItem(id=i, url=u, title=t) for (i, u, t) in rows]
 
+def _filters(req: AskRequest | AskBatchRequest):
+    return make_filter(req.section, req.document_ids, req.fetched_after, req.project)
+
 @app.post("/ask", response_model=AskResponse)
-def ask(req: AskRequest):
-    ans, srcs = answer(req.question, req.mode, req.top_k)
-    return AskResponse(answer=ans, sources=srcs)
+async def ask(req: AskRequest, request: Request, response: Response):
+    """With profiling the synchronous answer() runs in one worker thread under the profiler, embedding,
+    retrieval, the OpenAI call and post-processing included."""
+    profile_id = None
+    with metrics.collect_timings() if req.timings else nullcontext() as timings:
+        if _wants_profile(request):
+            (ans, srcs), profile_id = await asyncio.to_thread(
+                profiling.profile_call, "ask", answer, req.question, req.mode, req.top_k, filters=_filters(req))
+            response.headers["X-Profile-Id"] = profile_id
+        else:
+            ans, srcs = await answer_async(req.question, req.mode, req.top_k, filters=_filters(req))
+    if timings is not None:
+        timings = {stage: round(ms, 2) for stage, ms in timings.items()}
+    return AskResponse(answer=ans, sources=srcs, timings=timings, profile_id=profile_id)
+
+@app.post("/ask/stream")
+async def ask_stream(req: AskRequest):
+    """SSE: `sources` after retrieval, `token` deltas, then `final` with the post-processed answer."""
+    return sse_response(answer_stream(req.question, req.mode, req.top_k, filters=_filters(req)))
+
+@app.post("/ask/batch", response_model=AskBatchResponse)
+async def ask_batch(req: AskBatchRequest):
+    """Many questions at once: one embedding call, one index pass, concurrent generation; results in input order."""
+    started = time.perf_counter()
+    results = await answer_batch(req.questions, req.mode, req.top_k, filters=_filters(req), concurrency=req.concurrency)
+    return AskBatchResponse(results=results, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
@@ -0,0 +1,162 @@
+"""Latency histograms and counters, exported in Prometheus text format at /metrics.
+
+``with stage("search"):`` times a block into ``eora_stage_seconds`` (labelled
+with the stage and any extra labels, e.g. mode) and, inside
+``collect_timings()``, into that request's own dict of milliseconds.
+With METRICS_ENABLED=false and no request collecting, stage() hands back a
+shared no-op context manager, so instrumented code pays one flag check.
+"""
+from __future__ import annotations
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import partial, wraps
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+from .config import settings
+
+enabled = settings.metrics_enabled
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_histograms: Dict[str, Dict[Labels, "Histogram"]] = {}
+_counters: Dict[str, Dict[Labels, float]] = {}
+_sinks: contextvars.ContextVar[Tuple[Dict[str, float], ...]] = contextvars.ContextVar("metrics_sinks", default=())
+_NOOP = nullcontext()
+
+
+class Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels: Dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    if not enabled:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(key)
+        if hist is None:
+            hist = series[key] = Histogram()
+        hist.observe(seconds)
+
+
+def inc(name: str, value: float = 1, **labels: Any) -> None:
+    if not enabled:
+        return
+    key = _labels(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+class _Stage:
+    __slots__ = ("name", "labels", "sinks", "t0")
+
+    def __init__(self, name: str, labels: Dict[str, Any], sinks: Tuple[Dict[str, float], ...]):
+        self.name, self.labels, self.sinks = name, labels, sinks
+
+    def __enter__(self) -> "_Stage":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        spent = time.perf_counter() - self.t0
+        observe("eora_stage_seconds", spent, stage=self.name, **self.labels)
+        for timings in self.sinks:
+            timings[self.name] = timings.get(self.name, 0.0) + spent * 1000
+
+
+def stage(name: str, **labels: Any):
+    sinks = _sinks.get()
+    if not enabled and not sinks:
+        return _NOOP
+    return _Stage(name, labels, sinks)
+
+
+def timed(name: str, **labels: Any) -> Callable[[Callable], Callable]:
+    """Decorator form of stage() for a whole function."""
+    def decorate(fn: Callable) -> Callable:
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def collecting() -> Tuple[Dict[str, float], ...]:
+    """The timing dicts stage() currently writes into; hand them to collect_timings() in a job run on someone's behalf."""
+    return _sinks.get()
+
+
+@contextmanager
+def collect_timings(*into: Dict[str, float]) -> Iterator[Dict[str, float]]:
+    """Record stage() times (ms, summed per stage) into a fresh dict, and into `into` (e.g. every request a shared batch serves)."""
+    timings: Dict[str, float] = {}
+    token = _sinks.set((*_sinks.get(), timings, *into))
+    try:
+        yield timings
+    finally:
+        _sinks.reset(token)
+
+
+def in_context(fn: Callable, *args: Any) -> Callable[[], Any]:
+    """fn(*args) in a copy of the caller's context, for run_in_executor (which, unlike to_thread, does not carry it)."""
+    return partial(contextvars.copy_context().run, fn, *args)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(labels: Labels, le: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels]
+    if le:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def render() -> str:
+    """Everything recorded so far, in the Prometheus text exposition format."""
+    lines: List[str] = []
+    with _lock:
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# TYPE {name} counter")
+            for labels, value in sorted(series.items()):
+                lines.append(f"{name}{_fmt_labels(labels)} {value:g}")
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# TYPE {name} histogram")
+            for labels, hist in sorted(series.items()):
+                cumulative = 0
+                for bound, n in zip((*BUCKETS, "+Inf"), hist.counts):
+                    cumulative += n
+                    lines.append(f"{name}_bucket{_fmt_labels(labels, str(bound))} {cumulative}")
+                lines.append(f"{name}_sum{_fmt_labels(labels)} {hist.sum:.6f}")
+                lines.append(f"{name}_count{_fmt_labels(labels)} {hist.count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,76 @@
+"""Opt-in profiling of a single /ask or /ingest request (or a cli.py command).
+
+profile_call() runs a function under PROFILER and saves the result in
+PROFILE_DIR as ``<id>.pstats`` (cProfile, deterministic; open with pstats,
+snakeviz) or ``<id>.speedscope.json`` (pyinstrument, sampling; open at
+https://www.speedscope.app). Both profilers only see the thread they run in,
+so callers keep the work in one thread (see ingest_urls(inline=True)).
+Profiled calls are serialized: only one profiler can be active at a time.
+"""
+from __future__ import annotations
+import cProfile
+import datetime as dt
+import re
+import threading
+import uuid
+from pathlib import Path
+from typing import Any, Callable, Optional, Tuple
+
+from .config import settings
+
+_lock = threading.Lock()
+_ID_RE = re.compile(r"^[\w-]+$")
+SUFFIXES = (".pstats", ".speedscope.json")
+
+
+def _new_id(kind: str) -> str:
+    return f"{kind}-{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def _pyinstrument():
+    try:
+        from pyinstrument import Profiler
+        from pyinstrument.renderers import SpeedscopeRenderer
+    except ImportError:
+        print("[WARN] PROFILER=pyinstrument, но пакет pyinstrument не установлен — используется cProfile")
+        return None
+    return Profiler, SpeedscopeRenderer
+
+
+def profile_call(kind: str, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Tuple[Any, str]:
+    """(fn(*args, **kwargs), profile id); the profile is written even if fn raises."""
+    out_dir = Path(settings.profile_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    profile_id = _new_id(kind)
+    sampling = _pyinstrument() if settings.profiler == "pyinstrument" else None
+    with _lock:
+        if sampling is not None:
+            Profiler, SpeedscopeRenderer = sampling
+            profiler = Profiler(interval=settings.profile_interval_ms / 1000)
+            profiler.start()
+            try:
+                result = fn(*args, **kwargs)
+            finally:
+                profiler.stop()
+                path = out_dir / f"{profile_id}.speedscope.json"
+                path.write_text(profiler.output(SpeedscopeRenderer()), encoding="utf-8")
+        else:
+            profiler = cProfile.Profile()
+            try:
+                result = profiler.runcall(fn, *args, **kwargs)
+            finally:
+                path = out_dir / f"{profile_id}.pstats"
+                profiler.dump_stats(path)
+    print(f"[INFO] profile {profile_id} -> {path}")
+    return result, profile_id
+
+
+def find_profile(profile_id: str) -> Optional[Path]:
+    """Saved file of a profile id, None if unknown (ids are checked, so no path tricks)."""
+    if not _ID_RE.match(profile_id):
+        return None
+    for suffix in SUFFIXES:
+        path = Path(settings.profile_dir) / f"{profile_id}{suffix}"
+        if path.is_file():
+            return path
+    return None
@@ -0,0 +1,41 @@
+from __future__ import annotations
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Storage mode of an embedding BLOB, recorded per chunk in chunks.embedding_dtype.
+# int8 rows are scaled per vector: value = code * chunks.embedding_scale.
+STORAGE_DTYPES = {"float32": "<f4", "float16": "<f2", "int8": "i1"}
+
+
+def quantize_rows(mat: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    mat = np.asarray(mat, dtype="float32")
+    if storage == "float32":
+        return mat, None
+    if storage == "float16":
+        return mat.astype("float16"), None
+    if storage == "int8":
+        scales = np.abs(mat).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        codes = np.clip(np.rint(mat / scales[:, None]), -127, 127).astype("int8")
+        return codes, scales.astype("float32")
+    raise ValueError(f"unknown embedding storage: {storage}")
+
+
+def dequantize_rows(codes: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    out = codes.astype("float32")
+    if scales is not None:
+        out *= scales[:, None]
+    return out
+
+
+def encode_embedding(vec: np.ndarray, storage: str) -> Tuple[bytes, Optional[float]]:
+    codes, scales = quantize_rows(np.asarray(vec, dtype="float32").reshape(1, -1), storage)
+    return codes.tobytes(), (float(scales[0]) if scales is not None else None)
+
+
+def decode_embedding(blob: bytes, storage: Optional[str] = None, scale: Optional[float] = None) -> np.ndarray:
+    vec = np.frombuffer(blob, dtype=STORAGE_DTYPES[storage or "float32"]).astype("float32")
+    if scale is not None:
+        vec *= scale
+    return vec
@@ -1,23 +1,93 @@
-from typing import List, Tuple, Literal, Optional
-from dataclasses import dataclass
+import asyncio
+import json
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Tuple, Literal, Optional
+from dataclasses import asdict, dataclass
+import datetime as dt
 import re
 import textwrap
 
-from .config import settings
-from .db import fetch_top_k_by_embedding
+import httpx
+
+from . import metrics
+from .config import Settings, settings
+from .retriever import SearchFilter, get_retriever
 from .utils import make_inline_citations
-from .embeddings import get_embedder
+from .embeddings import QueryBatcher, embed_queries, get_embedder, query_cache
+from .cache import LRUCache, normalize_question
+from .db import get_index_version, get_cached_answer, put_cached_answer, prune_answer_cache, text_hash
 
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
 except Exception:
-    OpenAI = None
+    OpenAI = AsyncOpenAI = None
+
+# One client (and so one keep-alive connection pool) per API key, shared by all requests; the least recently
+# used keys are dropped past CLIENT_CACHE_SIZE (not closed, a request may still be using the client).
+_clients = LRUCache(max(1, settings.client_cache_size))
+_async_clients = LRUCache(max(1, settings.client_cache_size))
+_clients_lock = threading.Lock()
+# LLM_CONCURRENCY slots per event loop: a semaphore binds to the loop it first waits on, and the CLI and
+# tests run several asyncio.run() in one process; entries go with their loop.
+_llm_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary())
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=settings.llm_concurrency, max_keepalive_connections=settings.llm_concurrency,
+                        keepalive_expiry=60)
+
+
+def _client_kwargs(cfg: Settings) -> dict:
+    return {
+        "api_key": cfg.openai_api_key,
+        "base_url": cfg.openai_base_url or None,
+        "timeout": httpx.Timeout(cfg.openai_timeout, connect=10.0),
+        "max_retries": cfg.openai_max_retries,
+    }
 
 
-def _get_openai_client() -> Optional["OpenAI"]:
-    if OpenAI is None or not settings.openai_api_key:
+def _get_openai_client(cfg: Settings) -> Optional["OpenAI"]:
+    if OpenAI is None or not cfg.openai_api_key:
         return None
-    return OpenAI(api_key=settings.openai_api_key)
+    with _clients_lock:
+        client = _clients.get(cfg.openai_api_key)
+        if client is None:
+            client = OpenAI(**_client_kwargs(cfg), http_client=httpx.Client(limits=_http_limits()))
+            _clients.put(cfg.openai_api_key, client)
+    return client
+
+
+def _get_async_openai_client(cfg: Settings) -> Optional["AsyncOpenAI"]:
+    if AsyncOpenAI is None or not cfg.openai_api_key:
+        return None
+    with _clients_lock:
+        client = _async_clients.get(cfg.openai_api_key)
+        if client is None:
+            client = AsyncOpenAI(**_client_kwargs(cfg), http_client=httpx.AsyncClient(limits=_http_limits()))
+            _async_clients.put(cfg.openai_api_key, client)
+    return client
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Bounded pool for the CPU/DB part of a question (query embedding + retrieval)."""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.retrieval_workers, thread_name_prefix="retrieve")
+    return _executor
+
+
+async def close_clients() -> None:
+    for client in _async_clients.values():
+        await client.close()
+    _async_clients.clear()
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
 
 
 @dataclass
@@ -48,6 +118,34 @@ _PROJECT_KEYWORDS = [
 ]
 
 
+def make_filter(
+    section: Optional[str] = None,
+    document_ids: Optional[List[int]] = None,
+    fetched_after: dt.date | str | None = None,
+    project: Optional[str] = None,
+) -> Optional[SearchFilter]:
+    """SearchFilter from request-level options, None when nothing is set.
+
+    `project` is a key or display name from _PROJECT_KEYWORDS ("Магнит",
+    "dodo"); anything else is used as a plain URL/title substring.
+    """
+    if isinstance(fetched_after, str):
+        fetched_after = dt.datetime.fromisoformat(fetched_after)
+    if isinstance(fetched_after, dt.datetime) and fetched_after.tzinfo is not None:
+        fetched_after = fetched_after.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    keyword = None
+    if project:
+        wanted = project.strip().casefold()
+        keyword = next((key for key, canon in _PROJECT_KEYWORDS if wanted in (key, canon.casefold())), wanted)
+    flt = SearchFilter(
+        url_prefix=section or None,
+        document_ids=tuple(sorted(set(document_ids))) if document_ids is not None else None,
+        fetched_after=fetched_after.isoformat() if fetched_after else None,
+        keyword=keyword,
+    )
+    return flt or None
+
+
 def _extract_project_names(title: Optional[str], url: str) -> List[str]:
     s = ((title or "") + " " + url).lower()
     found: List[str] = []
@@ -74,12 +172,12 @@ def _build_context(chunks: List[RetrievedChunk], max_chars: int) -> Tuple[str, L
     return "\n---\n".join(parts), refs, proj_map
 
 
-def _gen_via_openai(system: str, user: str) -> str:
-    client = _get_openai_client()
+def _gen_via_openai(system: str, user: str, cfg: Settings) -> str:
+    client = _get_openai_client(cfg)
     if client is None:
         raise RuntimeError("OpenAI client is not available")
     resp = client.chat.completions.create(
-        model=settings.openai_chat_model,
+        model=cfg.openai_chat_model,
         messages=[{"role": "system", "content": system}, {"role": "user", "content": user}],
         temperature=0.1,
         max_tokens=220,
@@ -87,6 +185,44 @@ def _gen_via_openai(system: str, user: str) -> str:
     return resp.choices[0].message.content.strip()
 
 
+def _llm_limit() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    slots = _llm_slots.get(loop)
+    if slots is None:
+        slots = _llm_slots[loop] = asyncio.Semaphore(settings.llm_concurrency)
+    return slots
+
+
+def _chat_kwargs(system: str, user: str, cfg: Settings) -> dict:
+    return {
+        "model": cfg.openai_chat_model,
+        "messages": [{"role": "system", "content": system}, {"role": "user", "content": user}],
+        "temperature": 0.1,
+        "max_tokens": 220,
+    }
+
+
+async def _agen_via_openai(system: str, user: str, cfg: Settings) -> str:
+    client = _get_async_openai_client(cfg)
+    if client is None:
+        raise RuntimeError("OpenAI client is not available")
+    async with _llm_limit():
+        resp = await client.chat.completions.create(**_chat_kwargs(system, user, cfg))
+    return resp.choices[0].message.content.strip()
+
+
+async def _astream_openai(system: str, user: str, cfg: Settings) -> AsyncIterator[str]:
+    """Completion text deltas as they arrive; the LLM slot is held for the whole stream."""
+    client = _get_async_openai_client(cfg)
+    if client is None:
+        raise RuntimeError("OpenAI client is not available")
+    async with _llm_limit():
+        stream = await client.chat.completions.create(**_chat_kwargs(system, user, cfg), stream=True)
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
 def _unique_keep_order(urls: List[str]) -> List[str]:
     seen = set()
     out: List[str] = []
@@ -98,7 +234,7 @@ def _unique_keep_order(urls: List[str]) -> List[str]:
     return out
 
 
-def gen_answer_simple(question: str, context: str) -> str:
+def _prompt_simple(question: str, context: str) -> Tuple[str, str]:
     system = (
         "Ты помощник. Отвечай по-русски. Используй только Контекст. "
         "Ответ — 1–2 коротких предложения, без воды. "
@@ -106,10 +242,14 @@ def gen_answer_simple(question: str, context: str) -> str:
         "Используй 'Например', 'В числе', 'Среди', в вопросах, где требуется перечисление кейсов и тп."
     )
     user = f"Вопрос:\n{question}\n\nКонтекст:\n{context}\n\nОтветь без ссылок."
-    return _gen_via_openai(system, user)
+    return system, user
+
 
+def gen_answer_simple(question: str, context: str, cfg: Settings = settings) -> str:
+    return _gen_via_openai(*_prompt_simple(question, context), cfg)
 
-def gen_answer_with_sources(question: str, context: str) -> str:
+
+def _prompt_sources(question: str, context: str) -> Tuple[str, str]:
     system = (
         "Ты помощник. Отвечай по-русски. Используй только Контекст. "
         "Ответ лаконичный: 1–2 предложения. В конце: 'Источники: [1], [2]'. "
@@ -123,7 +263,11 @@ def gen_answer_with_sources(question: str, context: str) -> str:
     Контекст:
     {context}
     """).strip()
-    return _gen_via_openai(system, user)
+    return system, user
+
+
+def gen_answer_with_sources(question: str, context: str, cfg: Settings = settings) -> str:
+    return _gen_via_openai(*_prompt_sources(question, context), cfg)
 
 
 def _force_inline_if_missing(text: str, refs: List[Tuple[str, str]], proj_map: List[List[str]]) -> str:
@@ -150,7 +294,7 @@ def _force_inline_if_missing(text: str, refs: List[Tuple[str, str]], proj_map: L
     return out
 
 
-def gen_answer_inline(question: str, context: str, refs: List[Tuple[str, str]], proj_map: List[List[str]]) -> str:
+def _prompt_inline(question: str, context: str, proj_map: List[List[str]]) -> Tuple[str, str]:
     hint_lines: List[str] = []
     for i, projects in enumerate(proj_map, start=1):
         if projects:
@@ -177,8 +321,10 @@ def gen_answer_inline(question: str, context: str, refs: List[Tuple[str, str]],
     Подсказки по соответствию меток и проектов:
     {hints}
     """).strip()
+    return system, user
 
-    raw = _gen_via_openai(system, user)
+
+def _finish_inline(raw: str, refs: List[Tuple[str, str]], proj_map: List[List[str]]) -> str:
     with_links = make_inline_citations(raw, refs)
     finalized = _force_inline_if_missing(with_links, refs, proj_map)
     for idx in range(1, len(refs) + 1):
@@ -186,6 +332,13 @@ def gen_answer_inline(question: str, context: str, refs: List[Tuple[str, str]],
     return finalized
 
 
+def gen_answer_inline(
+    question: str, context: str, refs: List[Tuple[str, str]], proj_map: List[List[str]], cfg: Settings = settings
+) -> str:
+    raw = _gen_via_openai(*_prompt_inline(question, context, proj_map), cfg)
+    return _finish_inline(raw, refs, proj_map)
+
+
 def gen_answer_extractive(question: str, chunks: List[RetrievedChunk]) -> str:
     if not chunks:
         return "К сожалению, по вопросу не найдены релевантные фрагменты."
@@ -202,30 +355,333 @@ def gen_answer_extractive(question: str, chunks: List[RetrievedChunk]) -> str:
     return lead + "\n".join(parts)
 
 
+def _retrieve(question: str, k: int, cfg: Settings, filters: Optional[SearchFilter] = None) -> List[RetrievedChunk]:
+    q_emb = embed_queries(get_embedder(cfg), [question])[0]
+    return _to_chunks(get_retriever().retrieve(q_emb, k, question, filters))
+
+
+def _to_chunks(rows) -> List[RetrievedChunk]:
+    return [RetrievedChunk(chunk_id=cid, document_id=did, text=text, url=url, title=title) for (cid, did, text, url, title) in rows]
+
+
+def _retrieve_batch(
+    vectors: List, extras: List[Tuple[str, int, Optional[SearchFilter]]]
+) -> List[List[RetrievedChunk]]:
+    """One retrieve_many per distinct filter in the batch (usually just the unfiltered one)."""
+    groups: Dict[Optional[SearchFilter], List[int]] = {}
+    for i, (_, _, flt) in enumerate(extras):
+        groups.setdefault(flt, []).append(i)
+    out: List[List[RetrievedChunk]] = [[] for _ in extras]
+    for flt, idx in groups.items():
+        ks = [extras[i][1] for i in idx]
+        found = get_retriever().retrieve_many([vectors[i] for i in idx], max(ks), [extras[i][0] for i in idx], flt)
+        for i, rows, k in zip(idx, found, ks):
+            out[i] = _to_chunks(rows[:k])
+    return out
+
+
+def _get_query_batcher(cfg: Settings) -> QueryBatcher:
+    """One batcher per shared embedder: concurrent questions become one embed_many + one index product."""
+    embedder = get_embedder(cfg)
+    if embedder.query_batcher is None:
+        embedder.query_batcher = QueryBatcher(embedder, executor=_get_executor(), then=_retrieve_batch)
+    return embedder.query_batcher
+
+
+answer_cache = LRUCache(settings.answer_cache_size, settings.answer_cache_ttl)
+answer_cache_stats = {"persistent_hits": 0, "persistent_misses": 0}
+_persisted_version = -1
+
+
+def _answer_key(question: str, mode: str, k: int, cfg: Settings, filters: Optional[SearchFilter] = None) -> str:
+    embed_model = {"openai": cfg.openai_embedding_model, "hashing": str(cfg.hashing_dim)}.get(
+        cfg.embedding_backend, cfg.local_embedding_model)
+    return text_hash(json.dumps(
+        [normalize_question(question), mode, k, cfg.openai_chat_model, cfg.embedding_backend, embed_model,
+         asdict(filters) if filters else None],
+        ensure_ascii=False,
+    ))
+
+
+def _cached_answer(key: str, version: int, cfg: Settings) -> Optional[Tuple[str, List[str]]]:
+    hit = answer_cache.get((key, version))
+    if hit is None and cfg.answer_cache_persist:
+        raw = get_cached_answer(key, version, cfg.answer_cache_ttl)
+        answer_cache_stats["persistent_hits" if raw else "persistent_misses"] += 1
+        if raw:
+            text, urls = json.loads(raw)
+            hit = (text, urls)
+            answer_cache.put((key, version), hit)
+    metrics.inc("eora_answer_cache_total", result="miss" if hit is None else "hit")
+    return hit
+
+
+def _lookup_answers(keys: List[str], cfg: Settings) -> Tuple[int, List[Optional[Tuple[str, List[str]]]]]:
+    """(index version, cached answer or None per key); both may query SQLite, so async callers run it in a thread."""
+    version = get_index_version()
+    return version, [_cached_answer(key, version, cfg) for key in keys]
+
+
+def _store_answer(key: str, version: int, result: Tuple[str, List[str]], cfg: Settings) -> None:
+    global _persisted_version
+    answer_cache.put((key, version), result)
+    if cfg.answer_cache_persist:
+        if version != _persisted_version:
+            # corpus changed since the last write: everything stored for older versions is dead
+            prune_answer_cache(version, cfg.answer_cache_ttl)
+            _persisted_version = version
+        put_cached_answer(key, version, json.dumps(list(result), ensure_ascii=False))
+
+
+def cache_report() -> dict:
+    return {
+        "index_version": get_index_version(),
+        "query_embeddings": query_cache.stats(),
+        "answers": {**answer_cache.stats(), **answer_cache_stats},
+    }
+
+
+def _offline_fallback(question: str, chunks: List[RetrievedChunk], e: Exception) -> str:
+    return gen_answer_extractive(question, chunks) + f"\n\n_Примечание: генерация через OpenAI недоступна ({e}). Показан офлайн-ответ._"
+
+
 def answer(
     question: str,
     mode: Literal["simple", "sources", "inline", "extractive"] = "inline",
-    top_k: int | None = None
+    top_k: int | None = None,
+    cfg: Optional[Settings] = None,
+    filters: Optional[SearchFilter] = None,
 ) -> Tuple[str, List[str]]:
-    k = top_k or settings.top_k
-    embedder = get_embedder()
-    q_emb = embedder.embed_one(question)
-    rows = fetch_top_k_by_embedding(q_emb, k)
-    chunks = [RetrievedChunk(chunk_id=cid, document_id=did, text=text, url=url, title=title) for (cid, did, text, url, title) in rows]
+    """cfg carries per-request overrides (backend, models, API key); defaults to the global settings.
+    filters (see make_filter) restrict retrieval to a subset of documents before vector scoring."""
+    cfg = cfg or settings
+    with metrics.stage("total", mode=mode):
+        return _answer(question, mode, top_k or cfg.top_k, cfg, filters)
 
-    context, refs, proj_map = _build_context(chunks, settings.max_context_chars)
 
+def _answer(question: str, mode: str, k: int, cfg: Settings, filters: Optional[SearchFilter]) -> Tuple[str, List[str]]:
+    version, key = get_index_version(), _answer_key(question, mode, k, cfg, filters)
+    hit = _cached_answer(key, version, cfg)
+    if hit is not None:
+        return hit
+
+    with metrics.stage("retrieval", mode=mode):
+        chunks = _retrieve(question, k, cfg, filters)
+    with metrics.stage("build_context", mode=mode):
+        context, refs, proj_map = _build_context(chunks, cfg.max_context_chars)
+
+    cacheable = True
     try:
-        if mode == "simple":
-            text = gen_answer_simple(question, context)
-        elif mode == "sources":
-            text = gen_answer_with_sources(question, context)
-        elif mode == "inline":
-            text = gen_answer_inline(question, context, refs, proj_map)
-        else:
+        if mode == "extractive":
             text = gen_answer_extractive(question, chunks)
+        else:
+            with metrics.stage("llm", mode=mode):
+                if mode == "simple":
+                    text = _gen_via_openai(*_prompt_simple(question, context), cfg)
+                elif mode == "sources":
+                    text = _gen_via_openai(*_prompt_sources(question, context), cfg)
+                else:
+                    text = _gen_via_openai(*_prompt_inline(question, context, proj_map), cfg)
+            if mode == "inline":
+                with metrics.stage("postprocess", mode=mode):
+                    text = _finish_inline(text, refs, proj_map)
     except Exception as e:
-        text = gen_answer_extractive(question, chunks) + f"\n\n_Примечание: генерация через OpenAI недоступна ({e}). Показан офлайн-ответ._"
+        metrics.inc("eora_llm_errors_total", mode=mode)
+        text = _offline_fallback(question, chunks, e)
+        cacheable = False
 
     used_urls = _unique_keep_order([u for (_, u) in refs])
+    if cacheable:
+        _store_answer(key, version, (text, used_urls), cfg)
     return text, used_urls
+
+
+async def _aretrieve(question: str, k: int, cfg: Settings, filters: Optional[SearchFilter] = None) -> List[RetrievedChunk]:
+    if cfg.query_batch_window_ms > 0:
+        return await _get_query_batcher(cfg).submit(question, (question, k, filters))
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), metrics.in_context(_retrieve, question, k, cfg, filters))
+
+
+async def _astore_answer(key: str, version: int, result: Tuple[str, List[str]], cfg: Settings) -> None:
+    if cfg.answer_cache_persist:
+        await asyncio.to_thread(_store_answer, key, version, result, cfg)
+    else:
+        _store_answer(key, version, result, cfg)
+
+
+async def answer_async(
+    question: str,
+    mode: Literal["simple", "sources", "inline", "extractive"] = "inline",
+    top_k: int | None = None,
+    cfg: Optional[Settings] = None,
+    filters: Optional[SearchFilter] = None,
+) -> Tuple[str, List[str]]:
+    """Same as answer(), without blocking the event loop: embedding and retrieval run on a
+    bounded executor (micro-batched across concurrent questions when QUERY_BATCH_WINDOW_MS > 0),
+    generation goes through the shared AsyncOpenAI client under LLM_CONCURRENCY."""
+    cfg = cfg or settings
+    with metrics.stage("total", mode=mode):
+        return await _answer_async(question, mode, top_k or cfg.top_k, cfg, filters)
+
+
+async def _answer_async(question: str, mode: str, k: int, cfg: Settings, filters: Optional[SearchFilter]) -> Tuple[str, List[str]]:
+    key = _answer_key(question, mode, k, cfg, filters)
+    version, (hit,) = await asyncio.to_thread(_lookup_answers, [key], cfg)
+    if hit is not None:
+        return hit
+
+    with metrics.stage("retrieval", mode=mode):
+        chunks = await _aretrieve(question, k, cfg, filters)
+    text, used_urls, cacheable = await _agenerate(question, mode, chunks, cfg)
+    if cacheable:
+        await _astore_answer(key, version, (text, used_urls), cfg)
+    return text, used_urls
+
+
+async def _agenerate(question: str, mode: str, chunks: List[RetrievedChunk], cfg: Settings) -> Tuple[str, List[str], bool]:
+    """(answer, used urls, cacheable) for already retrieved chunks; the offline fallback is not cacheable."""
+    with metrics.stage("build_context", mode=mode):
+        context, refs, proj_map = _build_context(chunks, cfg.max_context_chars)
+    cacheable = True
+    try:
+        if mode == "extractive":
+            text = gen_answer_extractive(question, chunks)
+        else:
+            with metrics.stage("llm", mode=mode):
+                if mode == "simple":
+                    text = await _agen_via_openai(*_prompt_simple(question, context), cfg)
+                elif mode == "sources":
+                    text = await _agen_via_openai(*_prompt_sources(question, context), cfg)
+                else:
+                    text = await _agen_via_openai(*_prompt_inline(question, context, proj_map), cfg)
+            if mode == "inline":
+                with metrics.stage("postprocess", mode=mode):
+                    text = _finish_inline(text, refs, proj_map)
+    except Exception as e:
+        metrics.inc("eora_llm_errors_total", mode=mode)
+        text = _offline_fallback(question, chunks, e)
+        cacheable = False
+    return text, _unique_keep_order([u for (_, u) in refs]), cacheable
+
+
+def _retrieve_all(questions: List[str], k: int, cfg: Settings, filters: Optional[SearchFilter]) -> List[List[RetrievedChunk]]:
+    """All questions through one embed_many call and one retrieve_many (one index matrix product)."""
+    vectors = embed_queries(get_embedder(cfg), questions)
+    return _retrieve_batch(vectors, [(q, k, filters) for q in questions])
+
+
+async def answer_batch(
+    questions: List[str],
+    mode: Literal["simple", "sources", "inline", "extractive"] = "inline",
+    top_k: int | None = None,
+    cfg: Optional[Settings] = None,
+    filters: Optional[SearchFilter] = None,
+    concurrency: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """answer_async() for a list of questions, results in input order.
+
+    Cached answers are returned as is; the rest are embedded in one call and
+    retrieved with one search_many, then generated concurrently, at most
+    ``concurrency`` (BATCH_CONCURRENCY) at a time on top of LLM_CONCURRENCY.
+    Each result carries ``timings`` in ms: ``retrieval`` is the shared
+    embed + search time of the whole batch, ``generation`` the question's own,
+    ``total`` the time from the start of the batch to this answer.
+    """
+    cfg = cfg or settings
+    k = top_k or cfg.top_k
+    keys = [_answer_key(q, mode, k, cfg, filters) for q in questions]
+    started = time.perf_counter()
+    version, hits = await asyncio.to_thread(_lookup_answers, keys, cfg)
+    lookup_ms = round((time.perf_counter() - started) * 1000, 2)
+    results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+    todo: List[int] = []
+    for i, (question, hit) in enumerate(zip(questions, hits)):
+        if hit is None:
+            todo.append(i)
+            continue
+        results[i] = {"question": question, "answer": hit[0], "sources": hit[1], "cached": True,
+                      "timings": {"retrieval": 0.0, "generation": 0.0, "total": lookup_ms}}
+    if not todo:
+        return results
+
+    started = time.perf_counter()
+    found = await asyncio.get_running_loop().run_in_executor(
+        _get_executor(), _retrieve_all, [questions[i] for i in todo], k, cfg, filters)
+    retrieval_ms = round((time.perf_counter() - started) * 1000, 2)
+    slots = asyncio.Semaphore(concurrency or cfg.batch_concurrency)
+
+    async def generate(i: int, chunks: List[RetrievedChunk]) -> None:
+        async with slots:
+            t0 = time.perf_counter()
+            text, used_urls, cacheable = await _agenerate(questions[i], mode, chunks, cfg)
+            generation_ms = round((time.perf_counter() - t0) * 1000, 2)
+        if cacheable:
+            await _astore_answer(keys[i], version, (text, used_urls), cfg)
+        results[i] = {"question": questions[i], "answer": text, "sources": used_urls, "cached": False,
+                      "timings": {"retrieval": retrieval_ms, "generation": generation_ms,
+                                  "total": round((time.perf_counter() - started) * 1000, 2)}}
+
+    await asyncio.gather(*(generate(i, chunks) for i, chunks in zip(todo, found)))
+    return results
+
+
+async def answer_stream(
+    question: str,
+    mode: Literal["simple", "sources", "inline", "extractive"] = "inline",
+    top_k: int | None = None,
+    cfg: Optional[Settings] = None,
+    filters: Optional[SearchFilter] = None,
+) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """answer_async() as a sequence of (event, payload):
+
+    ``sources`` right after retrieval, then ``token`` deltas as the model
+    produces them, then ``final`` with the complete, post-processed answer
+    (inline citations are only resolved there, so clients replace the
+    streamed text with it). A cache hit yields ``sources`` and ``final`` only.
+    """
+    cfg = cfg or settings
+    k = top_k or cfg.top_k
+    key = _answer_key(question, mode, k, cfg, filters)
+    version, (hit,) = await asyncio.to_thread(_lookup_answers, [key], cfg)
+    if hit is not None:
+        yield "sources", {"sources": [{"n": i, "url": u, "title": None} for i, u in enumerate(hit[1], start=1)]}
+        yield "final", {"answer": hit[0], "sources": hit[1], "cached": True}
+        return
+
+    with metrics.stage("retrieval", mode=mode):
+        chunks = await _aretrieve(question, k, cfg, filters)
+    with metrics.stage("build_context", mode=mode):
+        context, refs, proj_map = _build_context(chunks, cfg.max_context_chars)
+    used_urls = _unique_keep_order([u for (_, u) in refs])
+    yield "sources", {"sources": [
+        {"n": i, "url": ch.url, "title": ch.title} for i, ch in enumerate(chunks[:len(refs)], start=1)
+    ]}
+
+    cacheable = True
+    try:
+        if mode == "extractive":
+            text = gen_answer_extractive(question, chunks)
+        else:
+            if mode == "simple":
+                prompt = _prompt_simple(question, context)
+            elif mode == "sources":
+                prompt = _prompt_sources(question, context)
+            else:
+                prompt = _prompt_inline(question, context, proj_map)
+            parts: List[str] = []
+            async for delta in _astream_openai(*prompt, cfg):
+                parts.append(delta)
+                yield "token", {"text": delta}
+            text = "".join(parts).strip()
+            if mode == "inline":
+                with metrics.stage("postprocess", mode=mode):
+                    text = _finish_inline(text, refs, proj_map)
+    except Exception as e:
+        metrics.inc("eora_llm_errors_total", mode=mode)
+        text = _offline_fallback(question, chunks, e)
+        cacheable = False
+
+    if cacheable:
+        await _astore_answer(key, version, (text, used_urls), cfg)
+    yield "final", {"answer": text, "sources": used_urls, "cached": False}
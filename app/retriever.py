@@ -0,0 +1,388 @@
+from __future__ import annotations
+import math
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .cache import LRUCache
+from .config import settings
+from .db import (
+    fetch_chunks_by_ids, fetch_embeddings_by_ids, filter_document_ids, get_index, get_index_version, search_fts,
+)
+from .index import Group, _Segment
+
+Row = Tuple[int, int, str, str, Optional[str]]
+DocIds = Optional[np.ndarray]
+
+_EMPTY = (np.empty(0, dtype="int64"), np.empty(0, dtype="float32"))
+
+
+@dataclass(frozen=True)
+class SearchFilter:
+    """Restricts retrieval to a subset of documents; set fields are ANDed.
+
+    ``url_prefix`` is a full URL prefix ("https://eora.ru/cases/") or a path
+    ("/cases/"); ``fetched_after`` an ISO date/datetime (UTC, like
+    documents.fetched_at); ``keyword`` a case-insensitive substring of the
+    URL or title (rag maps project names from _PROJECT_KEYWORDS to it).
+    """
+
+    url_prefix: Optional[str] = None
+    document_ids: Optional[Tuple[int, ...]] = None
+    fetched_after: Optional[str] = None
+    keyword: Optional[str] = None
+
+    def __bool__(self) -> bool:
+        return any(v is not None for v in (self.url_prefix, self.document_ids, self.fetched_after, self.keyword))
+
+
+# resolved document id sets per (filter, index_version); the TTL covers fetched_at moving on revalidation
+_filter_cache = LRUCache(256, ttl=60)
+
+
+def resolve_filter(flt: Optional[SearchFilter]) -> DocIds:
+    """Sorted document ids allowed by `flt`, or None for "no restriction"."""
+    if not flt:
+        return None
+    key = (flt, get_index_version())
+    doc_ids = _filter_cache.get(key)
+    if doc_ids is None:
+        doc_ids = filter_document_ids(flt.url_prefix, flt.document_ids, flt.fetched_after, flt.keyword)
+        _filter_cache.put(key, doc_ids)
+    return doc_ids
+
+
+def _merge_top_k(results: List[Tuple[np.ndarray, np.ndarray]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+    results = [r for r in results if len(r[0])]
+    if not results:
+        return _EMPTY
+    ids = np.concatenate([r[0] for r in results])
+    scores = np.concatenate([r[1] for r in results])
+    top = np.argsort(-scores, kind="stable")[:k]
+    return ids[top], scores[top]
+
+
+class Retriever:
+    name = "base"
+
+    def search(
+        self, query: np.ndarray, k: int, text: Optional[str] = None, doc_ids: DocIds = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (chunk_ids, scores) for a query vector; `text` is the raw question, used by lexical retrievers;
+        `doc_ids` (see resolve_filter) limits scoring to those documents' chunks."""
+        raise NotImplementedError
+
+    def search_many(
+        self, queries: List[np.ndarray], k: int, texts: Optional[List[Optional[str]]] = None, doc_ids: DocIds = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        texts = texts or [None] * len(queries)
+        return [self.search(q, k, t, doc_ids) for q, t in zip(queries, texts)]
+
+    def retrieve(
+        self, query_emb, k: int, text: Optional[str] = None, flt: Optional[SearchFilter] = None
+    ) -> List[Row]:
+        q = np.asarray(query_emb, dtype="float32").ravel()
+        doc_ids = resolve_filter(flt)
+        if doc_ids is not None and not len(doc_ids):
+            return []
+        with metrics.stage("search", retriever=self.name):
+            ids, _ = self.search(q, k, text, doc_ids)
+        return fetch_chunks_by_ids([int(i) for i in ids])
+
+    def retrieve_many(
+        self, query_embs, k: int, texts: Optional[List[Optional[str]]] = None, flt: Optional[SearchFilter] = None
+    ) -> List[List[Row]]:
+        """retrieve() for a batch of queries sharing one filter: one search_many and one chunk lookup for all."""
+        queries = [np.asarray(q, dtype="float32").ravel() for q in query_embs]
+        doc_ids = resolve_filter(flt)
+        if doc_ids is not None and not len(doc_ids):
+            return [[] for _ in queries]
+        with metrics.stage("search", retriever=self.name):
+            found = [[int(i) for i in ids] for ids, _ in self.search_many(queries, k, texts, doc_ids)]
+        rows = {r[0]: r for r in fetch_chunks_by_ids(list(dict.fromkeys(i for ids in found for i in ids)))}
+        return [[rows[i] for i in ids if i in rows] for ids in found]
+
+    def save(self) -> None:
+        pass
+
+
+class ExactRetriever(Retriever):
+    name = "exact"
+
+    def search(
+        self, query: np.ndarray, k: int, text: Optional[str] = None, doc_ids: DocIds = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return get_index().search(query, k, doc_ids)
+
+    def search_many(
+        self, queries: List[np.ndarray], k: int, texts: Optional[List[Optional[str]]] = None, doc_ids: DocIds = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return get_index().search_many(queries, k, doc_ids)
+
+
+def _assign(x: np.ndarray, centroids: np.ndarray, batch: int = 4096) -> np.ndarray:
+    return np.concatenate([
+        np.argmax(x[i:i + batch] @ centroids.T, axis=1) for i in range(0, len(x), batch)
+    ]) if len(x) else np.empty(0, dtype="int64")
+
+
+def kmeans(x: np.ndarray, n_clusters: int, iters: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on normalized rows; returns normalized centroids."""
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), n_clusters, replace=False)].copy()
+    for _ in range(iters):
+        assign = _assign(x, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, x)
+        counts = np.bincount(assign, minlength=n_clusters)
+        empty = counts == 0
+        if empty.any():
+            # re-seed empty clusters with random points instead of dropping them
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()), replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        centroids = (sums / norms).astype("float32")
+    return centroids
+
+
+class _IVFList:
+    """Inverted file for vectors of one dimensionality."""
+
+    def __init__(self, dim: int, centroids: np.ndarray):
+        self.dim = dim
+        self.centroids = centroids
+        self.lists = [_Segment(dim, capacity=16) for _ in range(len(centroids))]
+        self.size = 0
+        self.trained_on = 0
+
+    def add(self, group: Group) -> None:
+        if len(group[0]):
+            self._add_assigned(group, _assign(group[2], self.centroids))
+
+    def _add_assigned(self, group: Group, assign: np.ndarray) -> None:
+        cids, dids, mat = group
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(self.lists) + 1))
+        for li in np.unique(assign):
+            rows = order[bounds[li]:bounds[li + 1]]
+            self.lists[li].add(cids[rows], dids[rows], mat[rows])
+        self.size += len(cids)
+
+    def remove(self, chunk_ids: np.ndarray) -> None:
+        self.size -= sum(lst.remove(chunk_ids) for lst in self.lists)
+
+    def search(self, q: np.ndarray, k: int, nprobe: int) -> Tuple[np.ndarray, np.ndarray]:
+        nprobe = min(nprobe, len(self.lists))
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        return _merge_top_k([self.lists[li].search(q, k) for li in probe], k)
+
+    def assignments(self) -> Tuple[np.ndarray, np.ndarray]:
+        cids = [seg.chunk_ids[:seg.size] for seg in self.lists]
+        lists = [np.full(seg.size, li, dtype="int32") for li, seg in enumerate(self.lists)]
+        return np.concatenate(cids), np.concatenate(lists)
+
+
+class IVFRetriever(Retriever):
+    """Approximate search: k-means coarse quantizer + exact scoring inside `nprobe` lists.
+
+    Centroids and list assignments are persisted to ``<db>.ivf<dim>.npz``;
+    vectors themselves are taken from the resident index, so rag.db remains
+    the only source of truth. Chunks added after the index was trained are
+    assigned to their nearest centroid incrementally; the quantizer is
+    retrained once the corpus grows past 4x its training size.
+    """
+
+    name = "ivf"
+    min_train = 1024
+
+    def __init__(self, nlist: int = 0, nprobe: int = 8):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self._lock = threading.Lock()
+        self._ivf: Dict[int, _IVFList] = {}
+        self.max_chunk_id = 0
+        self.epoch = -1
+        self.removed_seen = 0
+
+    @staticmethod
+    def path_for(dim: int) -> Path:
+        base = Path(settings.sqlite_path)
+        return base.with_name(f"{base.name}.ivf{dim}.npz")
+
+    def _nlist_for(self, n: int) -> int:
+        return self.nlist or max(1, int(4 * math.sqrt(n)))
+
+    def _train(self, dim: int, group: Group) -> _IVFList:
+        cids, _, mat = group
+        nlist = min(self._nlist_for(len(cids)), len(cids))
+        sample = mat
+        if len(mat) > 32 * nlist:
+            sample = mat[np.random.default_rng(0).choice(len(mat), 32 * nlist, replace=False)]
+        ivf = _IVFList(dim, kmeans(np.asarray(sample, dtype="float32"), nlist))
+        ivf.add(group)
+        ivf.trained_on = len(cids)
+        return ivf
+
+    def _load(self, dim: int, group: Group) -> Optional[_IVFList]:
+        path = self.path_for(dim)
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            centroids = data["centroids"]
+            saved_ids, saved_lists = data["chunk_ids"], data["lists"]
+            trained_on = int(data["trained_on"])
+        if centroids.shape[1] != dim:
+            return None
+        cids = group[0]
+        pos = np.searchsorted(saved_ids, cids)
+        pos[pos >= len(saved_ids)] = 0
+        known = saved_ids[pos] == cids if len(saved_ids) else np.zeros(len(cids), dtype=bool)
+        ivf = _IVFList(dim, centroids)
+        ivf.trained_on = trained_on
+        ivf._add_assigned(tuple(g[known] for g in group), saved_lists[pos[known]])
+        ivf.add(tuple(g[~known] for g in group))
+        return ivf
+
+    def save(self) -> None:
+        with self._lock:
+            self._sync()
+            for dim, ivf in self._ivf.items():
+                cids, lists = ivf.assignments()
+                order = np.argsort(cids)
+                np.savez(
+                    self.path_for(dim),
+                    centroids=ivf.centroids,
+                    chunk_ids=cids[order],
+                    lists=lists[order],
+                    trained_on=np.int64(ivf.trained_on),
+                )
+
+    def _sync(self) -> None:
+        index = get_index()
+        if index.epoch != self.epoch:
+            # the resident index was rebuilt: start over from the persisted assignments
+            self._ivf.clear()
+            self.max_chunk_id = 0
+            self.removed_seen = 0
+            self.epoch = index.epoch
+        if len(index.removed_ids) > self.removed_seen:
+            gone = np.asarray(index.removed_ids[self.removed_seen:], dtype="int64")
+            self.removed_seen += len(gone)
+            for ivf in self._ivf.values():
+                ivf.remove(gone)
+        if index.max_chunk_id <= self.max_chunk_id:
+            return
+        for dim in index.dims():
+            ivf = self._ivf.get(dim)
+            new = index.export(dim, after_id=self.max_chunk_id if ivf is not None else 0)
+            if not len(new[0]):
+                continue
+            if ivf is None:
+                if len(new[0]) < self.min_train:
+                    continue
+                ivf = self._load(dim, new) or self._train(dim, new)
+            elif ivf.size + len(new[0]) > 4 * ivf.trained_on:
+                ivf = self._train(dim, index.export(dim))
+            else:
+                ivf.add(new)
+            self._ivf[dim] = ivf
+        self.max_chunk_id = index.max_chunk_id
+
+    def search(
+        self, query: np.ndarray, k: int, text: Optional[str] = None, doc_ids: DocIds = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.asarray(query, dtype="float32").ravel()
+        q = q / (np.linalg.norm(q) or 1.0)
+        if doc_ids is not None:
+            # a filtered query scores only its subset; exact scoring there beats probing lists
+            return get_index().search(q, k, doc_ids)
+        with self._lock:
+            self._sync()
+            ivf = self._ivf.get(q.size)
+            if ivf is not None:
+                return ivf.search(q, k, self.nprobe)
+        # corpus too small to train a quantizer: exact scan is cheap anyway
+        return get_index().search(q, k)
+
+
+class HybridRetriever(Retriever):
+    """Lexical (SQLite FTS5, BM25) + dense candidates.
+
+    ``hybrid``: top ``candidates`` from each side fused with reciprocal rank
+    fusion, score = sum 1 / (rrf_k + rank). ``prefilter``: only the FTS
+    candidate set is dense-scored, with vectors read from SQLite, so the
+    full index is never scanned; queries with fewer than k lexical matches
+    fall back to the dense retriever. Without a question text both behave
+    like the dense retriever.
+    """
+
+    def __init__(self, dense: Retriever, prefilter: bool = False, candidates: int = 50, rrf_k: int = 60):
+        self.dense = dense
+        self.prefilter = prefilter
+        self.name = "prefilter" if prefilter else "hybrid"
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+
+    def search(
+        self, query: np.ndarray, k: int, text: Optional[str] = None, doc_ids: DocIds = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        if not text:
+            return self.dense.search(query, k, doc_ids=doc_ids)
+        lexical = search_fts(text, self.candidates, doc_ids)
+        if self.prefilter:
+            return self._prefiltered(query, k, [cid for cid, _ in lexical], doc_ids)
+        dense_ids, _ = self.dense.search(query, max(k, self.candidates), doc_ids=doc_ids)
+        return self._fuse([[int(i) for i in dense_ids], [cid for cid, _ in lexical]], k)
+
+    def search_many(
+        self, queries: List[np.ndarray], k: int, texts: Optional[List[Optional[str]]] = None, doc_ids: DocIds = None
+    ) -> List[Tuple[np.ndarray, np.ndarray]]:
+        if self.prefilter:
+            return super().search_many(queries, k, texts, doc_ids)
+        # dense side stays batched (one matrix product); FTS is per question
+        texts = texts or [None] * len(queries)
+        out = []
+        for (ids, scores), text in zip(self.dense.search_many(queries, max(k, self.candidates), doc_ids=doc_ids), texts):
+            if not text:
+                out.append((ids[:k], scores[:k]))
+                continue
+            lexical = [cid for cid, _ in search_fts(text, self.candidates, doc_ids)]
+            out.append(self._fuse([[int(i) for i in ids], lexical], k))
+        return out
+
+    def _fuse(self, rankings: List[List[int]], k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores: Dict[int, float] = {}
+        for ranking in rankings:
+            for rank, cid in enumerate(ranking, start=1):
+                scores[cid] = scores.get(cid, 0.0) + 1.0 / (self.rrf_k + rank)
+        best = sorted(scores.items(), key=lambda kv: -kv[1])[:k]
+        return np.array([c for c, _ in best], dtype="int64"), np.array([v for _, v in best], dtype="float32")
+
+    def _prefiltered(self, query: np.ndarray, k: int, ids: List[int], doc_ids: DocIds) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.asarray(query, dtype="float32").ravel()
+        group = fetch_embeddings_by_ids(ids).get(q.size)
+        if group is None or len(group[0]) < k:
+            return self.dense.search(q, k, doc_ids=doc_ids)
+        scores = group[2] @ (q / (np.linalg.norm(q) or 1.0))
+        top = np.argsort(-scores, kind="stable")[:k]
+        return group[0][top], scores[top].astype("float32")
+
+
+_retriever: Optional[Retriever] = None
+
+
+def get_retriever() -> Retriever:
+    global _retriever
+    if _retriever is None:
+        if settings.retriever == "ivf":
+            _retriever = IVFRetriever(nlist=settings.ivf_nlist, nprobe=settings.ivf_nprobe)
+        elif settings.retriever in ("hybrid", "prefilter"):
+            _retriever = HybridRetriever(ExactRetriever(), prefilter=settings.retriever == "prefilter",
+                                         candidates=settings.hybrid_candidates, rrf_k=settings.rrf_k)
+        else:
+            _retriever = ExactRetriever()
+    return _retriever
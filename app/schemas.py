@@ -1,5 +1,6 @@
+import datetime as dt
 from pydantic import BaseModel, HttpUrl
-from typing import List, Literal
+from typing import Dict, List, Literal
 
 
 class IngestRequest(BaseModel):
@@ -10,11 +11,44 @@ class AskRequest(BaseModel):
     question: str
     mode: Literal["simple","sources","inline","extractive"] = "inline"
     top_k: int | None = None
+    # retrieval filters, ANDed; see rag.make_filter
+    section: str | None = None  # URL prefix or path, e.g. "/cases/"
+    document_ids: List[int] | None = None
+    fetched_after: dt.datetime | None = None
+    project: str | None = None  # e.g. "Магнит", "KazanExpress"
+    timings: bool = False  # return per-stage timings of this request
 
 
 class AskResponse(BaseModel):
     answer: str
     sources: List[HttpUrl]
+    timings: Dict[str, float] | None = None  # ms per stage (retrieval includes embed_query, search, fetch_chunks)
+    profile_id: str | None = None  # set when the request was profiled (?profile=1), see GET /profiles/{id}
+
+
+class AskBatchRequest(BaseModel):
+    questions: List[str]
+    mode: Literal["simple","sources","inline","extractive"] = "inline"
+    top_k: int | None = None
+    # filters apply to every question, as in AskRequest
+    section: str | None = None
+    document_ids: List[int] | None = None
+    fetched_after: dt.datetime | None = None
+    project: str | None = None
+    concurrency: int | None = None  # parallel LLM calls, default BATCH_CONCURRENCY
+
+
+class AskBatchItem(BaseModel):
+    question: str
+    answer: str
+    sources: List[HttpUrl]
+    cached: bool
+    timings: Dict[str, float]  # ms: retrieval (shared by the batch), generation, total
+
+
+class AskBatchResponse(BaseModel):
+    results: List[AskBatchItem]
+    elapsed_ms: float
 
 
 class DocListItem(BaseModel):
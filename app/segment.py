@@ -0,0 +1,147 @@
+from __future__ import annotations
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Tuple
+
+import numpy as np
+
+from .config import settings
+from .index import Group
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# On-disk layout, per embedding dimensionality, next to the SQLite file:
+#   <db>.vec<dim>.f32  raw float32 rows, pre-normalized, row-major
+#   <db>.vec<dim>.ids  int64 pairs (chunk_id, document_id), same row order
+# Files are append-only; rag.db stays the source of truth and the segment
+# can always be regenerated with `python cli.py rebuild-segment`.
+#
+# The originals sidecar (EMBEDDING_ORIGINALS=true with a quantized
+# EMBEDDING_STORAGE) uses the same layout as <db>.orig<dim>.f32/.ids: the
+# float32 vectors as the embedder returned them (normalized), for rescoring.
+# It is *not* derivable from rag.db, which only keeps the quantized codes;
+# rebuild-segment compacts it (drops rows of deleted chunks) but can't refill it.
+
+
+def segment_paths(dim: int, db_path: str | Path | None = None, kind: str = "vec") -> Tuple[Path, Path]:
+    base = Path(db_path or settings.sqlite_path)
+    return (
+        base.with_name(f"{base.name}.{kind}{dim}.f32"),
+        base.with_name(f"{base.name}.{kind}{dim}.ids"),
+    )
+
+
+def _existing_dims(db_path: str | Path | None = None, kind: str = "vec") -> Iterable[int]:
+    base = Path(db_path or settings.sqlite_path)
+    prefix = f"{base.name}.{kind}"
+    for p in base.parent.glob(f"{prefix}*.f32"):
+        tail = p.name[len(prefix):-len(".f32")]
+        if tail.isdigit():
+            yield int(tail)
+
+
+def append_segment(dim: int, group: Group, db_path: str | Path | None = None, kind: str = "vec") -> None:
+    cids, dids, mat = group
+    vec_path, ids_path = segment_paths(dim, db_path, kind)
+    ids = np.stack([cids, dids], axis=1).astype("<i8")
+    with open(ids_path, "ab") as f_ids, open(vec_path, "ab") as f_vec:
+        if fcntl is not None:
+            fcntl.flock(f_ids, fcntl.LOCK_EX)
+        try:
+            f_vec.write(np.ascontiguousarray(mat, dtype="<f4").tobytes())
+            f_vec.flush()
+            # ids are written last: a reader never maps a row whose vector is missing
+            f_ids.write(ids.tobytes())
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f_ids, fcntl.LOCK_UN)
+
+
+def open_segments(db_path: str | Path | None = None, kind: str = "vec") -> Dict[int, Group]:
+    out: Dict[int, Group] = {}
+    for dim in _existing_dims(db_path, kind):
+        vec_path, ids_path = segment_paths(dim, db_path, kind)
+        if not ids_path.exists():
+            continue
+        rows = min(ids_path.stat().st_size // 16, vec_path.stat().st_size // (4 * dim))
+        if rows == 0:
+            continue
+        ids = np.memmap(ids_path, dtype="<i8", mode="r", shape=(rows, 2))
+        mat = np.memmap(vec_path, dtype="<f4", mode="r", shape=(rows, dim))
+        out[dim] = (ids[:, 0], ids[:, 1], mat)
+    return out
+
+
+def write_segments(
+    groups: Iterable[Tuple[int, Group]], db_path: str | Path | None = None, kind: str = "vec"
+) -> Dict[int, int]:
+    """Write complete segment files via temp files + atomic rename. Returns rows per dim."""
+    written: Dict[int, int] = {}
+    stale = set(_existing_dims(db_path, kind))
+    for dim, (cids, dids, mat) in groups:
+        vec_path, ids_path = segment_paths(dim, db_path, kind)
+        tmp_vec = vec_path.with_suffix(".f32.tmp")
+        tmp_ids = ids_path.with_suffix(".ids.tmp")
+        mode = "ab" if dim in written else "wb"
+        with open(tmp_vec, mode) as f:
+            f.write(np.ascontiguousarray(mat, dtype="<f4").tobytes())
+        with open(tmp_ids, mode) as f:
+            f.write(np.stack([cids, dids], axis=1).astype("<i8").tobytes())
+        written[dim] = written.get(dim, 0) + len(cids)
+    for dim in written:
+        vec_path, ids_path = segment_paths(dim, db_path, kind)
+        os.replace(vec_path.with_suffix(".f32.tmp"), vec_path)
+        os.replace(ids_path.with_suffix(".ids.tmp"), ids_path)
+        stale.discard(dim)
+    for dim in stale:
+        for p in segment_paths(dim, db_path, kind):
+            p.unlink(missing_ok=True)
+    return written
+
+
+class OriginalsFile:
+    """Chunk id -> float32 original lookup over the <db>.orig<dim> sidecar (an index.Originals).
+
+    Files are memory-mapped with a sorted copy of their chunk ids; a lookup
+    costs a stat() and a binary search, and re-maps a file once it has grown.
+    Ids that aren't in the file (yet) are left out of the result.
+    """
+
+    def __init__(self, db_path: Callable[[], Path]):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # (db path, dim) -> (ids file size, sorted chunk ids, their rows, vectors)
+        self._maps: Dict[Tuple[Path, int], Tuple[int, np.ndarray, np.ndarray, np.ndarray]] = {}
+
+    def _open(self, dim: int) -> Tuple[int, np.ndarray, np.ndarray, np.ndarray] | None:
+        key = (self.db_path(), dim)
+        vec_path, ids_path = segment_paths(dim, key[0], "orig")
+        try:
+            size = ids_path.stat().st_size
+        except FileNotFoundError:
+            return None
+        entry = self._maps.get(key)
+        if entry is not None and entry[0] == size:
+            return entry
+        with self._lock:
+            rows = min(size // 16, vec_path.stat().st_size // (4 * dim))
+            if rows == 0:
+                return None
+            cids = np.array(np.memmap(ids_path, dtype="<i8", mode="r", shape=(rows, 2))[:, 0])
+            order = np.argsort(cids, kind="stable")
+            mat = np.memmap(vec_path, dtype="<f4", mode="r", shape=(rows, dim))
+            entry = self._maps[key] = (size, cids[order], order, mat)
+        return entry
+
+    def __call__(self, dim: int, chunk_ids: np.ndarray) -> Dict[int, np.ndarray]:
+        entry = self._open(dim)
+        if entry is None or not len(chunk_ids):
+            return {}
+        _, sorted_ids, order, mat = entry
+        pos = np.minimum(np.searchsorted(sorted_ids, chunk_ids), len(sorted_ids) - 1)
+        hit = sorted_ids[pos] == chunk_ids
+        return dict(zip(np.asarray(chunk_ids)[hit].tolist(), mat[order[pos[hit]]]))
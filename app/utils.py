@@ -2,6 +2,14 @@ import re
 from bs4 import BeautifulSoup
 from typing import Tuple, List
 
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:
+    LexborHTMLParser = None
+
+_NOISE_TAGS = ("script", "style", "noscript")
+_warned_fallback = False
+
 
 def _strip_noise(text: str) -> str:
     lines = text.splitlines()
@@ -20,17 +28,48 @@ def _strip_noise(text: str) -> str:
     return "\n".join(out)
 
 
-def html_to_text(html: str) -> Tuple[str, str]:
+def _extract_bs4(html: str) -> Tuple[str, str]:
     soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
+    for tag in soup(list(_NOISE_TAGS)):
         tag.decompose()
     title = soup.title.get_text(strip=True) if soup.title else ""
-    text = soup.get_text(separator="\n")
+    return title, soup.get_text(separator="\n")
+
+
+def _extract_selectolax(html: str) -> Tuple[str, str]:
+    tree = LexborHTMLParser(html)
+    for node in tree.css(", ".join(_NOISE_TAGS)):
+        node.decompose()
+    title_node = tree.css_first("title")
+    title = title_node.text(strip=True) if title_node else ""
+    return title, (tree.root.text(separator="\n") if tree.root else "")
+
+
+def _warn_fallback() -> None:
+    global _warned_fallback
+    if not _warned_fallback:
+        _warned_fallback = True
+        print("[WARN] HTML_BACKEND=selectolax, но пакет selectolax не установлен — используется bs4")
+
+
+def html_to_text(html: str, backend: str = "bs4") -> Tuple[str, str]:
+    if backend == "selectolax" and LexborHTMLParser is not None:
+        title, text = _extract_selectolax(html)
+    else:
+        if backend == "selectolax":
+            _warn_fallback()
+        title, text = _extract_bs4(html)
     text = re.sub(r"\n{2,}", "\n\n", text).strip()
     text = _strip_noise(text)
     return title, text
 
 
+def extract_document(html: str, backend: str, chunk_size_words: int, overlap_words: int) -> Tuple[str, str, List[str]]:
+    """html_to_text + chunk_text in one call, so a worker process returns everything the pipeline needs."""
+    title, text = html_to_text(html, backend)
+    return title, text, chunk_text(text, chunk_size_words, overlap_words)
+
+
 def chunk_text(text: str, chunk_size_words: int, overlap_words: int) -> List[str]:
     if chunk_size_words <= overlap_words:
         raise ValueError("chunk_size must be greater than overlap")
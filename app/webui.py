@@ -1,3 +1,4 @@
+import asyncio
 from typing import List, Optional
 from fastapi import APIRouter, Request, Form, UploadFile, File
 from fastapi.responses import HTMLResponse, StreamingResponse
@@ -5,10 +6,10 @@ from starlette.templating import Jinja2Templates
 from io import BytesIO
 from markdown import markdown  # NEW
 
-from .config import settings
-from .embeddings import reset_embedder
+from .config import Settings, settings
 from .ingest import ingest_urls
-from .rag import answer
+from .rag import answer_async, answer_stream
+from .sse import sse_response
 from .db import list_documents
 from .links import resolve_links
 
@@ -16,12 +17,24 @@ router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 
+def _request_settings(
+    embedding_backend: str, openai_api_key: Optional[str], openai_chat_model: str, openai_embedding_model: str,
+) -> Settings:
+    """Per-request copy of settings with the form overrides; the global object is never mutated."""
+    return settings.model_copy(update={
+        "embedding_backend": embedding_backend if embedding_backend in ("local", "openai", "hashing") else settings.embedding_backend,
+        "openai_api_key": openai_api_key or None,
+        "openai_chat_model": openai_chat_model or settings.openai_chat_model,
+        "openai_embedding_model": openai_embedding_model or settings.openai_embedding_model,
+    })
+
+
 @router.get("/", response_class=HTMLResponse)
 async def ui_index(request: Request):
     return templates.TemplateResponse("index.html", {
         "request": request,
         "settings": settings,
-        "docs": list_documents(),
+        "docs": await asyncio.to_thread(list_documents),
         "answer": None,
         "answer_html": None,
         "sources": [],
@@ -40,10 +53,7 @@ async def ui_ingest(
     custom_urls: str = Form(""),
     links_file: UploadFile | None = File(None),
 ):
-    settings.openai_api_key = openai_api_key or None
-    settings.openai_chat_model = openai_chat_model or settings.openai_chat_model
-    settings.openai_embedding_model = openai_embedding_model or settings.openai_embedding_model
-    reset_embedder(embedding_backend)
+    cfg = _request_settings(embedding_backend, openai_api_key, openai_chat_model, openai_embedding_model)
 
     file_text: Optional[str] = None
     if links_file is not None:
@@ -59,15 +69,15 @@ async def ui_ingest(
     )
 
     try:
-        ids = await ingest_urls(urls)
+        ids = await ingest_urls(urls, cfg)
         msg = f"Индексировано документов: {len(ids)}"
     except Exception as e:
         msg = f"Ошибка индексации: {e}"
 
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "settings": settings,
-        "docs": list_documents(),
+        "settings": cfg,
+        "docs": await asyncio.to_thread(list_documents),
         "answer": None,
         "answer_html": None,
         "sources": [],
@@ -87,18 +97,15 @@ async def ui_ask(
     openai_chat_model: str = Form("gpt-4o"),
     openai_embedding_model: str = Form("text-embedding-3-large"),
 ):
-    settings.openai_api_key = openai_api_key or None
-    settings.openai_chat_model = openai_chat_model or settings.openai_chat_model
-    settings.openai_embedding_model = openai_embedding_model or settings.openai_embedding_model
-    reset_embedder(embedding_backend)
+    cfg = _request_settings(embedding_backend, openai_api_key, openai_chat_model, openai_embedding_model)
 
-    text, srcs = answer(question, mode, top_k)
+    text, srcs = await answer_async(question, mode, top_k, cfg)
     html = markdown(text, extensions=["extra", "nl2br"])
 
     return templates.TemplateResponse("index.html", {
         "request": request,
-        "settings": settings,
-        "docs": list_documents(),
+        "settings": cfg,
+        "docs": await asyncio.to_thread(list_documents),
         "answer": text,
         "answer_html": html,
         "sources": srcs,
@@ -109,6 +116,27 @@ async def ui_ask(
     })
 
 
+@router.post("/ask/stream")
+async def ui_ask_stream(
+    question: str = Form(...),
+    mode: str = Form("inline"),
+    top_k: int = Form(6),
+    embedding_backend: str = Form("local"),
+    openai_api_key: Optional[str] = Form(None),
+    openai_chat_model: str = Form("gpt-4o"),
+    openai_embedding_model: str = Form("text-embedding-3-large"),
+):
+    cfg = _request_settings(embedding_backend, openai_api_key, openai_chat_model, openai_embedding_model)
+
+    async def events():
+        async for name, data in answer_stream(question, mode, top_k, cfg):
+            if name == "final":
+                data = {**data, "html": markdown(data["answer"], extensions=["extra", "nl2br"])}
+            yield name, data
+
+    return sse_response(events())
+
+
 @router.post("/export", response_class=StreamingResponse)
 async def ui_export(
     answer_md: str = Form(...),
@@ -0,0 +1 @@
+"""Reproducible benchmark suite: synthetic corpus, offline fake embedder, stub site; see benchmarks/run.py."""
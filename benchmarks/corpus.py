@@ -0,0 +1,141 @@
+"""Deterministic synthetic data for the benchmarks: text, HTML pages, chunk databases and a fake embedder.
+
+Everything is a function of a seed, so two runs (or two machines) measure
+the same work. Nothing here touches the network or loads a model.
+"""
+from __future__ import annotations
+import contextlib
+import datetime as dt
+import re
+import zlib
+from pathlib import Path
+from typing import Iterator, List, Sequence
+
+import numpy as np
+
+from app import db
+from app.db import DocumentWrite, close_connections, init_db, replace_documents
+from app.embeddings import EmbeddingsBackend
+from app.rag import _PROJECT_KEYWORDS
+
+WORDS = (
+    "компания разработала систему нейросеть бот ассистент клиент проект данные модель поиск рекомендации "
+    "распознавание изображение видео голос навык чат автоматизация контакт центр оператор аналитика отзывы "
+    "магазин товар фото каталог сегментация интеграция сервис пользователь задача решение результат точность "
+    "скорость обучение датасет платформа приложение сайт заказ доставка ритейл промышленность безопасность "
+    "производство логистика финансы страхование медицина игра сказка викторина город транспорт завод "
+    "процесс отчет качество метрика запуск пилот внедрение команда эксперт клиентов запросов обращений"
+).split()
+BRANDS = [canon for _, canon in _PROJECT_KEYWORDS]
+
+CHUNK_WORDS = 60
+CHUNKS_PER_DOC = 10
+
+
+def make_text(rng: np.random.Generator, n_words: int) -> str:
+    """Russian-looking prose with a brand name every ~40 words and a sentence break every ~12."""
+    words = [WORDS[i] for i in rng.integers(0, len(WORDS), n_words)]
+    for i in range(0, n_words, 40):
+        words[int(rng.integers(i, min(i + 40, n_words)))] = BRANDS[int(rng.integers(0, len(BRANDS)))]
+    for i in range(11, n_words, 12):
+        words[i] += "."
+    return " ".join(words)
+
+
+def make_html(rng: np.random.Generator, title: str, paragraphs: int = 12, words: int = 80) -> str:
+    """A page shaped like a case study on the site: nav, article, boilerplate footer, scripts."""
+    body = "\n".join(f"<p>{make_text(rng, words)}</p>" for _ in range(paragraphs))
+    nav = "".join(f'<li><a href="/cases/{i}">Кейс {i}</a></li>' for i in range(30))
+    return (
+        f"<!doctype html><html><head><title>{title}</title>"
+        "<script>window.dataLayer=[];function gtag(){dataLayer.push(arguments)}</script>"
+        "<style>body{font-family:sans-serif}</style></head><body>"
+        f"<header><nav><ul>{nav}</ul></nav></header>"
+        f"<main><article><h1>{title}</h1>{body}</article></main>"
+        "<footer><p>© EORA. Все права защищены. Политика конфиденциальности.</p></footer>"
+        "<script src=\"/static/app.js\"></script></body></html>"
+    )
+
+
+def make_questions(n: int, seed: int = 1) -> List[str]:
+    rng = np.random.default_rng(seed)
+    templates = ["Что вы делали для {}?", "Какие проекты в области {} у вас есть?", "Расскажите про {}"]
+    return [templates[i % len(templates)].format(
+        BRANDS[int(rng.integers(0, len(BRANDS)))] if i % 2 == 0 else WORDS[int(rng.integers(0, len(WORDS)))])
+        for i in range(n)]
+
+
+class FakeEmbedder(EmbeddingsBackend):
+    """Deterministic offline embedder: feature hashing of word unigrams into `dim` signed buckets.
+
+    crc32 (unlike hash()) is stable across processes, so vectors are
+    reproducible; texts sharing words get similar vectors, which keeps
+    retrieval results meaningful enough for smoke checks.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+        super().__init__(name="fake", model=f"hash-{dim}")
+
+    def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            for word in re.findall(r"\w+", text.casefold()):
+                h = zlib.crc32(word.encode("utf-8"))
+                out[row, h % self.dim] += 1.0 if h & 0x80000000 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (out / norms).tolist()
+
+
+@contextlib.contextmanager
+def use_db(path: Path) -> Iterator[Path]:
+    """Point app.db (connections and the resident index) at another SQLite file for the duration."""
+    previous = db.DB_PATH
+    close_connections()
+    db._index.clear()  # not get_index(): that would sync against (and create) the previous DB file
+    db.DB_PATH = Path(path)
+    try:
+        init_db()
+        yield db.DB_PATH
+    finally:
+        close_connections()
+        db._index.clear()
+        db.DB_PATH = previous
+
+
+def build_chunk_db(path: Path, n_chunks: int, dim: int = 384, seed: int = 0, batch_docs: int = 500) -> Path:
+    """SQLite corpus of `n_chunks` chunks (CHUNKS_PER_DOC per document) with random unit vectors.
+
+    Reused when the file already exists: building 1M chunks takes minutes.
+    Vectors are clustered Gaussian noise rather than FakeEmbedder output,
+    since scoring cost does not depend on what the vectors mean.
+    """
+    path = Path(path)
+    if path.exists():
+        return path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".part")
+    for suffix in ("", "-wal", "-shm"):
+        Path(str(tmp) + suffix).unlink(missing_ok=True)
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(8, n_chunks // 500), dim)).astype("float32")
+    fetched_at = dt.datetime(2025, 1, 1).isoformat()
+    n_docs = -(-n_chunks // CHUNKS_PER_DOC)
+    with use_db(tmp):
+        for start in range(0, n_docs, batch_docs):
+            docs = []
+            for d in range(start, min(n_docs, start + batch_docs)):
+                first = d * CHUNKS_PER_DOC
+                count = min(CHUNKS_PER_DOC, n_chunks - first)
+                vecs = centers[rng.integers(0, len(centers), count)] + 0.35 * rng.standard_normal((count, dim)).astype("float32")
+                vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+                rows = [(i, make_text(rng, CHUNK_WORDS), vecs[i].tobytes()) for i in range(count)]
+                brand = BRANDS[d % len(BRANDS)]
+                docs.append(DocumentWrite(f"https://bench.local/cases/{d}", f"Кейс {d}: {brand}",
+                                          " ".join(r[1] for r in rows), fetched_at, rows))
+            replace_documents(docs)
+    for suffix in ("-wal", "-shm"):
+        Path(str(tmp) + suffix).unlink(missing_ok=True)
+    tmp.rename(path)
+    return path
@@ -0,0 +1,238 @@
+"""Benchmark suite: microbenchmarks, retrieval at several corpus sizes and end-to-end ingest, written as JSON.
+
+    python benchmarks/run.py                                         # all groups, 1k and 10k chunks
+    python benchmarks/run.py --only retrieval --sizes 1k 10k 100k 1m
+    python benchmarks/run.py --out before.json
+    python benchmarks/run.py --out after.json --compare before.json --threshold 0.15
+
+Inputs are generated from fixed seeds (benchmarks/corpus.py) and embedded
+with a hashing fake embedder, so no network, API key or model is needed.
+Chunk databases are cached in benchmarks/.data/; ingest runs against a
+local stub site. With --compare, every timing that got slower (or
+throughput that dropped) by more than --threshold is flagged and the exit
+code is 1.
+"""
+import argparse
+import asyncio
+import contextlib
+import datetime as dt
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app import embeddings  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.db import fetch_top_k_by_embedding, get_conn, get_index  # noqa: E402
+from app.ingest import ingest_urls  # noqa: E402
+from app.rag import RetrievedChunk, _build_context, _extract_project_names, _finish_inline  # noqa: E402
+from app.utils import chunk_text, html_to_text, make_inline_citations  # noqa: E402
+from benchmarks.corpus import BRANDS, FakeEmbedder, build_chunk_db, make_html, make_questions, make_text, use_db  # noqa: E402
+from benchmarks.stub_site import serve_site  # noqa: E402
+
+DATA = Path(__file__).resolve().parent / ".data"
+RESULTS = Path(__file__).resolve().parent / "results"
+# metric -> True when higher is better
+COMPARED = {"p50_ms": False, "p95_ms": False, "load_s": False, "docs_per_s": True, "chunks_per_s": True}
+
+
+def measure(fn: Callable[[], object], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    samples.sort()
+    return {
+        "n": repeat,
+        "mean_ms": round(statistics.mean(samples), 4),
+        "p50_ms": round(samples[len(samples) // 2], 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        "min_ms": round(samples[0], 4),
+    }
+
+
+def parse_size(s: str) -> int:
+    s = s.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(s[-1], 1)
+    return int(float(s[:-1] if mult > 1 else s) * mult)
+
+
+def bench_micro(repeat: int, seed: int) -> Dict[str, dict]:
+    rng = np.random.default_rng(seed)
+    out: Dict[str, dict] = {}
+    page = make_html(rng, "Кейс: HR-бот для Магнит", paragraphs=12, words=80)
+    backends = ["bs4"]
+    with contextlib.suppress(ImportError):
+        import selectolax  # noqa: F401
+        backends.append("selectolax")
+    for backend in backends:
+        out[f"micro.html_to_text[{backend}]"] = measure(lambda: html_to_text(page, backend), repeat)
+
+    text = make_text(rng, 20_000)
+    out["micro.chunk_text[20k words]"] = measure(
+        lambda: chunk_text(text, settings.chunk_size, settings.chunk_overlap), repeat)
+
+    chunks = [RetrievedChunk(chunk_id=i, document_id=i, text=make_text(rng, 180),
+                             url=f"https://eora.ru/cases/{BRANDS[i].lower().replace(' ', '-')}-{i}",
+                             title=f"Кейс {BRANDS[i]}") for i in range(settings.top_k)]
+    out["micro.build_context"] = measure(lambda: _build_context(chunks, settings.max_context_chars), repeat * 10)
+
+    _, refs, proj_map = _build_context(chunks, settings.max_context_chars)
+    raw = " ".join(f"Для {BRANDS[i]} сделали систему [{i + 1}]." for i in range(0, len(refs), 2))
+    raw += " Источники: " + ", ".join(f"[{i + 1}]" for i in range(len(refs)))
+    out["micro.make_inline_citations"] = measure(lambda: make_inline_citations(raw, refs), repeat * 10)
+    out["micro.finish_inline"] = measure(lambda: _finish_inline(raw, refs, proj_map), repeat * 10)
+    out["micro.extract_project_names"] = measure(
+        lambda: [_extract_project_names(c.title, c.url) for c in chunks], repeat * 10)
+    return out
+
+
+def bench_retrieval(sizes: List[int], dim: int, queries: int, k: int, seed: int) -> Dict[str, dict]:
+    out: Dict[str, dict] = {}
+    embedder = FakeEmbedder(dim)
+    vectors = [np.asarray(v, dtype="float32") for v in embedder.embed_many(make_questions(queries, seed + 1))]
+    for n in sizes:
+        label = f"{n // 1000}k" if n < 1_000_000 else f"{n // 1_000_000}m"
+        path = DATA / f"chunks-{n}-d{dim}-s{seed}.db"
+        t = time.perf_counter()
+        fresh = not path.exists()
+        build_chunk_db(path, n, dim, seed)
+        if fresh:
+            print(f"[INFO] built {path.name} in {time.perf_counter() - t:.1f}s", file=sys.stderr)
+        with use_db(path):
+            t = time.perf_counter()
+            get_index()
+            load_s = time.perf_counter() - t
+            it = iter(range(1 << 62))
+            stats = measure(lambda: fetch_top_k_by_embedding(vectors[next(it) % len(vectors)], k), queries)
+            out[f"retrieval.fetch_top_k_by_embedding[{label}]"] = {**stats, "load_s": round(load_s, 3), "chunks": n}
+            batch = measure(lambda: get_index().search_many(vectors, k), max(3, queries // 20), warmup=1)
+            out[f"retrieval.search_many[{label}]"] = {
+                **batch, "batch": len(vectors), "per_query_ms": round(batch["p50_ms"] / len(vectors), 4)}
+    return out
+
+
+def bench_ingest(pages: int, latency: float, dim: int, seed: int) -> Dict[str, dict]:
+    cfg = settings.model_copy(update={"embedding_backend": "local", "local_embedding_model": f"bench-fake-{dim}"})
+    embeddings._registry.put(("local", cfg.local_embedding_model, None), FakeEmbedder(dim))
+    with tempfile.TemporaryDirectory() as tmp, serve_site(pages, latency, seed) as urls, use_db(Path(tmp) / "ingest.db"):
+        log = io.StringIO()
+        t = time.perf_counter()
+        with contextlib.redirect_stdout(log):
+            ids = asyncio.run(ingest_urls(urls, cfg))
+        elapsed = time.perf_counter() - t
+        (chunks,) = get_conn().execute("SELECT COUNT(*) FROM chunks").fetchone()
+    # per-stage throughput and utilisation of the pipeline, as ingest_urls reports it
+    for line in log.getvalue().splitlines():
+        if line.startswith("[STATS]"):
+            print(line)
+    return {"ingest.e2e": {
+        "pages": pages,
+        "documents": len(ids),
+        "chunks": chunks,
+        "elapsed_s": round(elapsed, 3),
+        "docs_per_s": round(len(ids) / elapsed, 2),
+        "chunks_per_s": round(chunks / elapsed, 2),
+        "latency_s": latency,
+    }}
+
+
+def _git_rev() -> str:
+    with contextlib.suppress(Exception):
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    return "unknown"
+
+
+def compare(old: dict, new: dict, threshold: float) -> List[str]:
+    """Print the metrics both runs share; return the ones that regressed past `threshold`."""
+    regressions: List[str] = []
+    print(f"{'benchmark':<48} {'metric':<13} {'old':>11} {'new':>11} {'change':>8}")
+    for name, res in new["results"].items():
+        before = old.get("results", {}).get(name)
+        if before is None:
+            continue
+        for metric, higher_better in COMPARED.items():
+            if metric not in res or not before.get(metric):
+                continue
+            change = res[metric] / before[metric] - 1
+            worse = -change if higher_better else change
+            flag = "  REGRESSION" if worse > threshold else ""
+            if flag:
+                regressions.append(f"{name} {metric}")
+            print(f"{name:<48} {metric:<13} {before[metric]:>11.4g} {res[metric]:>11.4g} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--only", nargs="*", choices=["micro", "retrieval", "ingest"], default=["micro", "retrieval", "ingest"])
+    p.add_argument("--sizes", nargs="*", default=["1k", "10k"], help="Corpus sizes in chunks: 1k 10k 100k 1m")
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("-k", type=int, default=settings.top_k)
+    p.add_argument("--repeat", type=int, default=50, help="Samples per microbenchmark")
+    p.add_argument("--pages", type=int, default=200, help="Pages served by the stub site for the ingest run")
+    p.add_argument("--latency", type=float, default=0.0, help="Per-page delay of the stub site, seconds")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", help="JSON output (default benchmarks/results/<time>-<rev>.json)")
+    p.add_argument("--compare", help="Earlier JSON result to compare against")
+    p.add_argument("--threshold", type=float, default=0.15, help="Relative slowdown that counts as a regression")
+    args = p.parse_args()
+
+    rev = _git_rev()
+    results: Dict[str, dict] = {}
+    if "micro" in args.only:
+        results.update(bench_micro(args.repeat, args.seed))
+    if "retrieval" in args.only:
+        results.update(bench_retrieval([parse_size(s) for s in args.sizes], args.dim, args.queries, args.k, args.seed))
+    if "ingest" in args.only:
+        results.update(bench_ingest(args.pages, args.latency, args.dim, args.seed))
+
+    report = {
+        "meta": {
+            "time": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "git": rev,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "settings": {key: getattr(settings, key) for key in (
+                "embedding_storage", "retriever", "html_backend", "parse_in_processes", "chunk_size", "chunk_overlap")},
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    out = Path(args.out) if args.out else RESULTS / f"{dt.datetime.now():%Y%m%d-%H%M%S}-{rev}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    for name, res in results.items():
+        main_metric = next((m for m in ("p50_ms", "docs_per_s") if m in res), None)
+        print(f"{name:<48} {main_metric}={res.get(main_metric)}")
+    print(f"[OK] results -> {out}")
+
+    if args.compare:
+        regressions = compare(json.loads(Path(args.compare).read_text(encoding="utf-8")), report, args.threshold)
+        if regressions:
+            print(f"[WARN] {len(regressions)} regression(s) over {args.threshold:.0%}: " + "; ".join(regressions))
+            raise SystemExit(1)
+        print("[OK] no regressions")
+
+
+if __name__ == "__main__":
+    main()
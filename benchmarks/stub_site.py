@@ -0,0 +1,53 @@
+"""Local HTTP site serving synthetic case pages, for end-to-end ingest runs without the network."""
+from __future__ import annotations
+import contextlib
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, List
+
+import numpy as np
+
+from .corpus import make_html
+
+
+class _Handler(BaseHTTPRequestHandler):
+    pages: List[bytes] = []
+    latency = 0.0
+
+    def do_GET(self):
+        try:
+            page = self.pages[int(self.path.rstrip("/").rsplit("/", 1)[-1])]
+        except (ValueError, IndexError):
+            self.send_error(404)
+            return
+        if self.latency:
+            time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@contextlib.contextmanager
+def serve_site(n_pages: int, latency: float = 0.0, seed: int = 0) -> Iterator[List[str]]:
+    """Serve `n_pages` pages (pre-rendered, so the server is never the bottleneck); yields their URLs."""
+    rng = np.random.default_rng(seed)
+    handler = type("Handler", (_Handler,), {
+        "pages": [make_html(rng, f"Кейс {i}").encode("utf-8") for i in range(n_pages)],
+        "latency": latency,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        host, port = server.server_address
+        yield [f"http://{host}:{port}/cases/{i}" for i in range(n_pages)]
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -1,11 +1,17 @@
 import argparse
 import asyncio
+import json
+import sys
+import time
 from pathlib import Path
 
 from app.ingest import ingest_urls
-from app.rag import answer
+from app.rag import answer, answer_batch, close_clients, make_filter
 from app.config import settings
+from app.db import init_db, rebuild_segment, prune_embedding_cache
 from app.links import load_links_from_file, resolve_links
+from app.embeddings import get_embedder, refit_hashing_idf
+from app.profiling import profile_call
 
 
 def cmd_ingest(args):
@@ -17,11 +23,51 @@ def cmd_ingest(args):
     else:
         urls = resolve_links()
 
-    asyncio.run(ingest_urls(urls))
+    # under --profile blocking stages run on the loop thread, where the profiler can see them
+    asyncio.run(ingest_urls(urls, inline=args.profile))
+
+
+def _read_questions(path: str) -> list[dict]:
+    """JSONL ({"question": ..., any other fields are copied to the result}) or plain text, one question per line."""
+    items = []
+    for line in Path(path).read_text(encoding="utf-8-sig").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        items.append(json.loads(line) if line.startswith("{") else {"question": line})
+    return items
+
+
+def cmd_ask_batch(args, filters):
+    items = _read_questions(args.questions_file)
+
+    async def run():
+        try:
+            return await answer_batch([it["question"] for it in items], args.mode, args.top_k,
+                                      filters=filters, concurrency=args.concurrency)
+        finally:
+            await close_clients()
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    elapsed = time.perf_counter() - started
+    out = open(args.out, "w", encoding="utf-8") if args.out else sys.stdout
+    try:
+        for item, res in zip(items, results):
+            out.write(json.dumps({**item, **res}, ensure_ascii=False) + "\n")
+    finally:
+        if args.out:
+            out.close()
+    cached = sum(r["cached"] for r in results)
+    print(f"[OK] {len(results)} questions in {elapsed:.1f}s ({cached} from cache)"
+          + (f" -> {Path(args.out).resolve()}" if args.out else ""), file=sys.stderr)
 
 
 def cmd_ask(args):
-    txt, srcs = answer(args.q, args.mode, args.top_k)
+    filters = make_filter(args.section, args.doc_id, args.after, args.project)
+    if args.questions_file:
+        return cmd_ask_batch(args, filters)
+    txt, srcs = answer(args.q, args.mode, args.top_k, filters=filters)
     if args.out_md:
         out = Path(args.out_md)
         out.write_text(txt, encoding="utf-8")
@@ -34,24 +80,70 @@ def cmd_ask(args):
             print(f"[{i}] {u}")
 
 
+def cmd_rebuild_segment(args):
+    init_db()
+    written = rebuild_segment()
+    if not written:
+        print("[INFO] no chunks in the database, segment files removed")
+    for dim, rows in sorted(written.items()):
+        print(f"[OK] segment dim={dim}: {rows} vectors")
+
+
+def cmd_fit_idf(args):
+    init_db()
+    embedder = get_embedder(settings.model_copy(update={"embedding_backend": "hashing"}))
+    version = refit_hashing_idf(embedder)
+    print(f"[OK] hashing IDF v{version} fitted on the chunks in {settings.sqlite_path}")
+
+
+def cmd_prune_cache(args):
+    init_db()
+    removed = prune_embedding_cache()
+    print(f"[OK] embedding cache: removed {removed} entries not referenced by any chunk")
+
+
 def main():
     p = argparse.ArgumentParser(description="EORA RAG CLI")
     sub = p.add_subparsers()
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--profile", action="store_true",
+                        help="Run under PROFILER, save the profile to PROFILE_DIR (.pstats or .speedscope.json)")
 
-    p_ing = sub.add_parser("ingest", help="Index seed links / file / custom URLs")
+    p_ing = sub.add_parser("ingest", help="Index seed links / file / custom URLs", parents=[common])
     p_ing.add_argument("--file", help="Path to links.txt (one URL per line, lines starting with # ignored)")
     p_ing.add_argument("--urls", nargs="*", help="Override URLs (space-separated)")
     p_ing.set_defaults(func=cmd_ingest)
 
-    p_ask = sub.add_parser("ask", help="Ask a question")
-    p_ask.add_argument("-q", required=True, help="Question")
+    p_ask = sub.add_parser("ask", help="Ask a question (or a file of questions)", parents=[common])
+    src = p_ask.add_mutually_exclusive_group(required=True)
+    src.add_argument("-q", help="Question")
+    src.add_argument("--questions-file", help="JSONL ({\"question\": ...}) or text, one question per line; "
+                                              "answered as one batch, results written as JSONL")
     p_ask.add_argument("--mode", choices=["simple", "sources", "inline", "extractive"], default="inline")
     p_ask.add_argument("--top-k", type=int, default=None)
+    p_ask.add_argument("--section", help="Only documents under this URL prefix or path, e.g. /cases/")
+    p_ask.add_argument("--doc-id", type=int, action="append", help="Only this document id (repeatable)")
+    p_ask.add_argument("--after", help="Only documents fetched at/after this ISO date, e.g. 2025-08-01")
+    p_ask.add_argument("--project", help="Only documents of this project, e.g. Магнит")
     p_ask.add_argument("--out-md", help="Save answer as Markdown file")
+    p_ask.add_argument("--out", help="With --questions-file: write JSONL results here instead of stdout")
+    p_ask.add_argument("--concurrency", type=int, default=None, help="With --questions-file: parallel LLM calls "
+                                                                     "(default BATCH_CONCURRENCY)")
     p_ask.set_defaults(func=cmd_ask)
 
+    p_seg = sub.add_parser("rebuild-segment", help="Regenerate the memory-mapped embedding segment from SQLite BLOBs", parents=[common])
+    p_seg.set_defaults(func=cmd_rebuild_segment)
+
+    p_idf = sub.add_parser("fit-idf", help="Refit the IDF of the hashing embedding backend on all chunks (ingest does it too)", parents=[common])
+    p_idf.set_defaults(func=cmd_fit_idf)
+
+    p_prune = sub.add_parser("prune-cache", help="Drop cached embeddings no longer referenced by any chunk", parents=[common])
+    p_prune.set_defaults(func=cmd_prune_cache)
+
     args = p.parse_args()
-    if hasattr(args, "func"):
+    if hasattr(args, "func") and args.profile:
+        profile_call(args.func.__name__.removeprefix("cmd_").replace("_", "-"), args.func, args)
+    elif hasattr(args, "func"):
         args.func(args)
     else:
         p.print_help()
@@ -2,6 +2,7 @@ document.addEventListener("DOMContentLoaded", () => {
   const copyBtn = document.getElementById("copy-btn");
   const hiddenInput = document.getElementById("answer_md_input");
   const loader = document.getElementById("loader");
+  const canStream = !!(window.fetch && window.ReadableStream && window.TextDecoder);
 
   if (copyBtn && hiddenInput) {
     copyBtn.addEventListener("click", async () => {
@@ -17,9 +18,97 @@ document.addEventListener("DOMContentLoaded", () => {
 
   const forms = document.querySelectorAll("form.show-loader");
   forms.forEach((f) => {
+    if (canStream && f.dataset.stream) {
+      f.addEventListener("submit", (ev) => {
+        ev.preventDefault();
+        streamAnswer(f);
+      });
+      return;
+    }
     f.addEventListener("submit", () => {
       f.querySelectorAll("button[type=submit]").forEach((b) => (b.disabled = true));
       if (loader) loader.classList.remove("hidden");
     });
   });
+
+  // Reads the SSE stream of /ui/ask/stream: "sources" first, then "token" deltas,
+  // then "final" with the post-processed answer (inline citations) rendered as HTML.
+  async function streamAnswer(form) {
+    const box = document.getElementById("answer-box");
+    const placeholder = document.getElementById("answer-placeholder");
+    const html = document.getElementById("answer_html");
+    const sourcesBox = document.getElementById("sources-box");
+    const sourcesList = document.getElementById("sources-list");
+    const buttons = form.querySelectorAll("button[type=submit]");
+    const mode = form.querySelector("[name=mode]").value;
+
+    buttons.forEach((b) => (b.disabled = true));
+    placeholder.textContent = "Ищу фрагменты…";
+    placeholder.classList.remove("hidden");
+    box.classList.add("hidden");
+    sourcesBox.classList.add("hidden");
+    html.textContent = "";
+    html.classList.add("streaming");
+
+    const handlers = {
+      sources(data) {
+        sourcesList.innerHTML = "";
+        data.sources.forEach((s) => {
+          const li = document.createElement("li");
+          const a = document.createElement("a");
+          a.href = s.url;
+          a.target = "_blank";
+          a.rel = "noopener";
+          a.textContent = s.title || s.url;
+          li.appendChild(a);
+          sourcesList.appendChild(li);
+        });
+        placeholder.textContent = "Генерация ответа…";
+        if (mode !== "inline" && data.sources.length) sourcesBox.classList.remove("hidden");
+      },
+      token(data) {
+        placeholder.classList.add("hidden");
+        box.classList.remove("hidden");
+        html.textContent += data.text;
+      },
+      final(data) {
+        placeholder.classList.add("hidden");
+        box.classList.remove("hidden");
+        html.classList.remove("streaming");
+        html.innerHTML = data.html;
+        document.getElementById("answer").textContent = data.answer;
+        if (hiddenInput) hiddenInput.value = data.answer;
+      },
+    };
+
+    try {
+      const resp = await fetch(form.dataset.stream, { method: "POST", body: new FormData(form) });
+      if (!resp.ok || !resp.body) throw new Error("HTTP " + resp.status);
+      const reader = resp.body.getReader();
+      const decoder = new TextDecoder();
+      let buf = "";
+      for (;;) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buf += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buf.indexOf("\n\n")) >= 0) {
+          const raw = buf.slice(0, sep);
+          buf = buf.slice(sep + 2);
+          let event = "message";
+          let data = "";
+          raw.split("\n").forEach((line) => {
+            if (line.startsWith("event:")) event = line.slice(6).trim();
+            else if (line.startsWith("data:")) data += line.slice(5).trim();
+          });
+          if (handlers[event] && data) handlers[event](JSON.parse(data));
+        }
+      }
+    } catch (e) {
+      placeholder.textContent = "Ошибка: " + e;
+      placeholder.classList.remove("hidden");
+    } finally {
+      buttons.forEach((b) => (b.disabled = false));
+    }
+  }
 });
@@ -0,0 +1,18 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+@pytest.fixture
+def temp_db(tmp_path):
+    """app.db (connections and the resident index) pointed at an empty SQLite file under tmp_path."""
+    from app import retriever
+    from benchmarks.corpus import use_db
+
+    # cached per index_version, which starts over in every fresh database
+    retriever._filter_cache.clear()
+    with use_db(tmp_path / "rag.db") as path:
+        yield path
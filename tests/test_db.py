@@ -0,0 +1,63 @@
+"""app.db write path: what replace_documents leaves in SQLite, the resident index and the side files."""
+import numpy as np
+import pytest
+
+from app import db
+from app.config import settings
+from app.index import VectorIndex, _normalize_rows
+from app.segment import segment_paths
+
+DIM = 16
+
+
+def _doc(url, vecs, title="", fetched_at="2025-01-01T00:00:00"):
+    rows = [(i, f"{title or url} часть {i}", np.asarray(v, dtype="float32").tobytes()) for i, v in enumerate(vecs)]
+    return db.DocumentWrite(url, title or url, " ".join(t for _, t, _ in rows), fetched_at, rows)
+
+
+def _vectors(n, seed=0):
+    return _normalize_rows(np.random.default_rng(seed).standard_normal((n, DIM))).astype("float32")
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantized_storage_writes_originals_sidecar(temp_db, monkeypatch, storage):
+    monkeypatch.setattr(settings, "embedding_storage", storage)
+    monkeypatch.setattr(db, "_keep_originals", True)
+    monkeypatch.setattr(db, "_index", VectorIndex(storage=storage, rescore=4, originals=db._originals))
+    vecs = _vectors(200)
+    db.replace_documents([_doc(f"https://eora.ru/cases/{d}", vecs[d * 10:(d + 1) * 10]) for d in range(20)])
+
+    (dtype,) = db.get_conn().execute("SELECT DISTINCT embedding_dtype FROM chunks").fetchone()
+    assert dtype == storage
+    assert segment_paths(DIM, temp_db, "orig")[1].stat().st_size == 200 * 16
+    for q in vecs[::17]:
+        ids, scores = db.get_index().search(q, 5)
+        order = np.argsort(-(vecs @ q), kind="stable")[:5]
+        assert ids.tolist() == (order + 1).tolist()  # chunk ids are 1-based in insertion order
+        np.testing.assert_allclose(scores, (vecs @ q)[order], rtol=1e-5, atol=1e-6)
+
+
+def test_reingest_replaces_chunks_without_duplicates(temp_db):
+    vecs = _vectors(8, seed=1)
+    (first,) = db.replace_documents([_doc("https://eora.ru/cases/magnit", vecs[:5], title="Магнит")])
+    other = db.replace_documents([_doc("https://eora.ru/cases/lamoda", vecs[5:6])])[0]
+    assert len(db.get_index()) == 6
+    old_ids = [cid for (cid,) in db.get_conn().execute("SELECT id FROM chunks WHERE document_id = ?", (first,))]
+
+    # same page under a different spelling of its URL, now with fewer chunks
+    (again,) = db.replace_documents([_doc("https://EORA.ru/cases/magnit/", vecs[6:8], title="Магнит v2")])
+    conn = db.get_conn()
+    assert again == first
+    assert conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0] == 2
+    assert conn.execute("SELECT title FROM documents WHERE id = ?", (first,)).fetchone()[0] == "Магнит v2"
+    rows = conn.execute("SELECT id, chunk_index FROM chunks WHERE document_id = ? ORDER BY chunk_index",
+                        (first,)).fetchall()
+    assert [i for _, i in rows] == [0, 1] and not {cid for cid, _ in rows} & set(old_ids)
+    if db.FTS_AVAILABLE:
+        assert conn.execute("SELECT COUNT(*) FROM chunks_fts").fetchone()[0] == 3
+
+    index = db.get_index()
+    assert len(index) == 3
+    ids, _ = index.search(vecs[0], 10)
+    assert set(ids.tolist()) == {cid for cid, _ in rows} | {
+        cid for (cid,) in conn.execute("SELECT id FROM chunks WHERE document_id = ?", (other,))}
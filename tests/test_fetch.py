@@ -0,0 +1,177 @@
+"""Fetcher against local stub servers: concurrency caps, retries and the size cap."""
+import asyncio
+import contextlib
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from app.fetch import Fetcher, ResponseTooLarge
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """/slow sleeps 0.2 s, /flaky fails with 503 twice per path first, /later is a 429 with Retry-After: 120,
+    /big streams 64 KB without Content-Length."""
+
+    lock: threading.Lock
+    in_flight: dict
+    peak: dict
+    hits: dict
+
+    def do_GET(self):
+        host = self.headers["Host"].split(":")[0]
+        with self.lock:
+            self.hits[self.path] += 1
+            hits = self.hits[self.path]
+            self.in_flight[host] += 1
+            self.in_flight["*"] += 1
+            for key in (host, "*"):
+                self.peak[key] = max(self.peak[key], self.in_flight[key])
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.2)
+                self._send(b"<html><title>slow</title></html>")
+            elif self.path.startswith("/flaky") and hits <= 2:
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path.startswith("/flaky"):
+                self._send(b"<html><title>ok</title></html>")
+            elif self.path.startswith("/later"):
+                self.send_response(429)
+                self.send_header("Retry-After", "120")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+            elif self.path.startswith("/big"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html")
+                self.end_headers()
+                for _ in range(64):
+                    self.wfile.write(b"x" * 1024)
+            else:
+                self.send_error(404)
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+                self.in_flight["*"] -= 1
+
+    def _send(self, body: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def site():
+    """Same handler state behind 127.0.0.1 and 127.0.0.2, i.e. two hosts for the per-host cap."""
+    handler = type("Handler", (_Handler,), {
+        "lock": threading.Lock(), "in_flight": defaultdict(int), "peak": defaultdict(int), "hits": defaultdict(int),
+    })
+    with contextlib.ExitStack() as stack:
+        bases = []
+        for addr in ("127.0.0.1", "127.0.0.2"):
+            server = ThreadingHTTPServer((addr, 0), handler)
+            server.daemon_threads = True
+            threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+            stack.callback(server.server_close)
+            stack.callback(server.shutdown)
+            bases.append(f"http://{addr}:{server.server_address[1]}")
+        handler.bases = bases
+        yield handler
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_per_host_and_global_caps(site):
+    a, b = site.bases
+
+    async def main():
+        async with Fetcher(concurrency=3, per_host=2, retries=0) as f:
+            urls = [f"{a}/slow/{i}" for i in range(6)] + [f"{b}/slow/{i}" for i in range(6)]
+            return await asyncio.gather(*(f.get(u) for u in urls))
+
+    results = _run(main())
+    assert [r.status for r in results] == [200] * 12
+    assert site.peak["127.0.0.1"] <= 2 and site.peak["127.0.0.2"] <= 2
+    assert site.peak["*"] <= 3
+
+
+def test_busy_host_does_not_hold_global_slots(site):
+    a, b = site.bases
+
+    async def main():
+        async with Fetcher(concurrency=2, per_host=1, retries=0) as f:
+            busy = [asyncio.create_task(f.get(f"{a}/slow/{i}")) for i in range(4)]
+            await asyncio.sleep(0.05)
+            t = time.perf_counter()
+            await f.get(f"{b}/slow/0")
+            elapsed = time.perf_counter() - t
+            await asyncio.gather(*busy)
+            return elapsed
+
+    # the other host gets the free global slot right away instead of queueing behind host a
+    assert _run(main()) < 0.35
+
+
+def test_retries_503_then_succeeds(site):
+    async def main():
+        async with Fetcher(retries=3, backoff_base=0.01, backoff_max=0.05) as f:
+            res = await f.get(f"{site.bases[0]}/flaky")
+            return res, f.stats
+
+    res, stats = _run(main())
+    assert res.status == 200 and "ok" in res.html
+    assert stats == {"requests": 3, "retries": 2, "failures": 0}
+
+
+def test_gives_up_after_retries(site):
+    async def main():
+        async with Fetcher(retries=1, backoff_base=0.01, backoff_max=0.05) as f:
+            with pytest.raises(httpx.HTTPStatusError):
+                await f.get(f"{site.bases[0]}/flaky")
+            return f.stats
+
+    assert _run(main()) == {"requests": 2, "retries": 1, "failures": 1}
+
+
+def test_retry_after_beyond_the_cap_fails_the_url(site):
+    async def main():
+        async with Fetcher(retries=3, backoff_base=0.01, backoff_max=5) as f:
+            t = time.perf_counter()
+            with pytest.raises(httpx.HTTPStatusError):
+                await f.get(f"{site.bases[0]}/later")
+            return f.stats, time.perf_counter() - t
+
+    stats, elapsed = _run(main())
+    assert stats == {"requests": 1, "retries": 0, "failures": 1}
+    assert elapsed < 1
+
+
+def test_not_found_is_not_retried(site):
+    async def main():
+        async with Fetcher(retries=3, backoff_base=0.01) as f:
+            with pytest.raises(httpx.HTTPStatusError):
+                await f.get(f"{site.bases[0]}/missing")
+            return f.stats
+
+    assert _run(main()) == {"requests": 1, "retries": 0, "failures": 1}
+
+
+def test_streamed_body_over_the_cap_is_rejected(site):
+    async def main():
+        async with Fetcher(max_bytes=16 * 1024, retries=0) as f:
+            with pytest.raises(ResponseTooLarge):
+                await f.get(f"{site.bases[0]}/big")
+
+    _run(main())
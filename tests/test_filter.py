@@ -0,0 +1,61 @@
+"""SearchFilter: document subsets from filter_document_ids and search restricted to them."""
+import numpy as np
+import pytest
+
+from app import db
+from app.rag import make_filter
+from app.retriever import get_retriever, resolve_filter
+from benchmarks.corpus import FakeEmbedder
+
+EMBEDDER = FakeEmbedder(dim=64)
+DOCS = [
+    ("https://eora.ru/cases/magnit", "Магнит: чат-бот для сотрудников", "2025-01-01T00:00:00"),
+    ("https://eora.ru/cases/lamoda", "Lamoda: рекомендации", "2025-03-01T00:00:00"),
+    ("https://eora.ru/casestudy/qiwi", "QIWI", "2025-02-01T00:00:00"),
+    ("https://eora.ru/blog/post", "Блог", "2025-04-01T00:00:00"),
+]
+
+
+@pytest.fixture
+def docs(temp_db):
+    writes = []
+    for url, title, fetched_at in DOCS:
+        texts = [f"{title} часть {i}" for i in range(3)]
+        vecs = np.asarray(EMBEDDER.embed_many(texts), dtype="float32")
+        writes.append(db.DocumentWrite(url, title, " ".join(texts), fetched_at,
+                                       [(i, t, v.tobytes()) for i, (t, v) in enumerate(zip(texts, vecs))]))
+    ids = db.replace_documents(writes)
+    return dict(zip((url.rsplit("/", 1)[1] for url, _, _ in DOCS), ids))
+
+
+def _subset(docs, **kw):
+    inv = {v: k for k, v in docs.items()}
+    return {inv[i] for i in resolve_filter(make_filter(**kw)).tolist()}
+
+
+def test_section_as_path_or_url(docs):
+    assert _subset(docs, section="/cases/") == {"magnit", "lamoda"}
+    assert _subset(docs, section="https://eora.ru/cases/") == {"magnit", "lamoda"}
+
+
+def test_section_url_is_normalized_like_ingest(docs):
+    assert _subset(docs, section="HTTPS://EORA.ru:443/cases/") == {"magnit", "lamoda"}
+    assert _subset(docs, section="https://Eora.ru/cases") == {"magnit", "lamoda", "qiwi"}
+
+
+def test_fetched_after_project_and_ids(docs):
+    assert _subset(docs, fetched_after="2025-02-15") == {"lamoda", "post"}
+    assert _subset(docs, project="Магнит") == {"magnit"}
+    assert _subset(docs, section="/cases/", document_ids=[docs["lamoda"], docs["post"]]) == {"lamoda"}
+    assert _subset(docs, section="/cases/", fetched_after="2025-02-15") == {"lamoda"}
+    assert make_filter() is None
+
+
+def test_search_only_returns_chunks_of_the_subset(docs):
+    allowed = resolve_filter(make_filter(section="/cases/"))
+    query = np.asarray(EMBEDDER.embed_query_many(["Блог часть 1"])[0], dtype="float32")
+    chunk_ids, _ = get_retriever().search(query, 4, doc_ids=allowed)
+    marks = ",".join("?" * len(chunk_ids))
+    found = {d for (d,) in db.get_conn().execute(
+        f"SELECT DISTINCT document_id FROM chunks WHERE id IN ({marks})", [int(c) for c in chunk_ids])}
+    assert len(chunk_ids) == 4 and found <= set(allowed.tolist())
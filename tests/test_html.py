@@ -0,0 +1,39 @@
+"""html_to_text on saved pages: no network, so it runs anywhere (selectolax parity only where it is installed)."""
+from pathlib import Path
+
+import pytest
+
+from app import utils
+from app.utils import LexborHTMLParser, html_to_text
+
+PAGES = sorted((Path(__file__).parent / "fixtures" / "html").glob("*.html"))
+
+
+@pytest.mark.parametrize("page", PAGES, ids=lambda p: p.name)
+@pytest.mark.skipif(LexborHTMLParser is None, reason="selectolax не установлен")
+def test_selectolax_matches_bs4(page):
+    html = page.read_text(encoding="utf-8")
+    assert html_to_text(html, "selectolax") == html_to_text(html, "bs4")
+
+
+def test_noise_is_stripped():
+    title, text = html_to_text((Path(__file__).parent / "fixtures" / "html" / "case.html").read_text(encoding="utf-8"))
+    assert title == "Кейс: HR-бот для Магнит — EORA"
+    assert text.splitlines() == [
+        "Кейс: HR-бот для Магнит — EORA",
+        "HR-бот для Магнит",
+        "Мы сделали бота, который отвечает кандидатам на вопросы о вакансиях и записывает их на собеседование.",
+        "Задача",
+        "Сократить нагрузку на рекрутеров — большая часть вопросов повторялась.",
+        "Ответы на типовые вопросы",
+        "Запись на собеседование",
+    ]
+
+
+def test_missing_selectolax_falls_back_with_one_warning(monkeypatch, capsys):
+    monkeypatch.setattr(utils, "LexborHTMLParser", None)
+    monkeypatch.setattr(utils, "_warned_fallback", False)
+    html = PAGES[0].read_text(encoding="utf-8")
+    assert html_to_text(html, "selectolax") == html_to_text(html, "bs4")
+    html_to_text(html, "selectolax")
+    assert capsys.readouterr().out.count("[WARN] HTML_BACKEND=selectolax") == 1
@@ -0,0 +1,106 @@
+"""VectorIndex against brute-force cosine over the same vectors."""
+import numpy as np
+import pytest
+
+from app.index import VectorIndex, _normalize_rows
+from app.segment import OriginalsFile, write_segments
+
+DIM = 32
+
+
+def _corpus(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((30, DIM)).astype("float32")
+    mat = centers[rng.integers(0, len(centers), n)] + 0.4 * rng.standard_normal((n, DIM)).astype("float32")
+    cids = np.arange(1, n + 1, dtype="int64")
+    dids = (cids - 1) // 10 + 1  # 10 chunks per document
+    queries = mat[rng.integers(0, n, 20)] + 0.5 * rng.standard_normal((20, DIM)).astype("float32")
+    return cids, dids, _normalize_rows(mat).astype("float32"), queries
+
+
+def _brute(mat, cids, q, k, keep=None):
+    scores = mat @ (q / np.linalg.norm(q))
+    if keep is not None:
+        scores = np.where(keep, scores, -np.inf)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return cids[order], scores[order]
+
+
+@pytest.fixture
+def corpus():
+    return _corpus()
+
+
+def _index(corpus, **kw):
+    cids, dids, mat, _ = corpus
+    index = VectorIndex(**kw)
+    # two batches, like two ingest transactions
+    index.add_groups({DIM: (cids[:1000], dids[:1000], mat[:1000])})
+    index.add_groups({DIM: (cids[1000:], dids[1000:], mat[1000:])})
+    return index
+
+
+def test_top_k_matches_brute_force(corpus):
+    cids, _, mat, queries = corpus
+    index = _index(corpus)
+    for q in queries:
+        ids, scores = index.search(q, 8)
+        want_ids, want_scores = _brute(mat, cids, q, 8)
+        assert set(ids.tolist()) == set(want_ids.tolist())
+        np.testing.assert_allclose(scores, want_scores, rtol=1e-5, atol=1e-6)
+
+
+def test_search_many_and_document_filter(corpus):
+    cids, dids, mat, queries = corpus
+    index = _index(corpus)
+    allowed = np.arange(5, 300, 7, dtype="int64")
+    keep = np.isin(dids, allowed)
+    for q, (ids, _) in zip(queries, index.search_many(list(queries), 8, allowed)):
+        assert set(ids.tolist()) == set(_brute(mat, cids, q, 8, keep)[0].tolist())
+        assert np.isin(dids[ids - 1], allowed).all()
+
+
+def test_removed_chunks_are_not_returned(corpus):
+    cids, _, mat, queries = corpus
+    index = _index(corpus)
+    gone = np.concatenate([index.search(q, 3)[0] for q in queries])
+    index.remove(gone.tolist())
+    assert len(index) == len(cids) - len(np.unique(gone))
+    keep = ~np.isin(cids, gone)
+    for q in queries:
+        ids, _ = index.search(q, 8)
+        assert set(ids.tolist()) == set(_brute(mat, cids, q, 8, keep)[0].tolist())
+
+
+def test_query_of_another_dimension_finds_nothing(corpus):
+    ids, scores = _index(corpus).search(np.ones(DIM + 1, dtype="float32"), 5)
+    assert len(ids) == 0 and len(scores) == 0
+
+
+@pytest.mark.parametrize("storage, min_recall", [("float16", 0.99), ("int8", 0.9)])
+def test_quantized_recall_with_dequantized_rescoring(corpus, storage, min_recall):
+    cids, _, mat, queries = corpus
+    index = _index(corpus, storage=storage, rescore=4)
+    hits = [len(set(index.search(q, 8)[0].tolist()) & set(_brute(mat, cids, q, 8)[0].tolist())) / 8
+            for q in queries]
+    assert np.mean(hits) >= min_recall
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_rescoring_on_originals_is_exact(tmp_path, corpus, storage):
+    cids, dids, mat, queries = corpus
+    db_path = tmp_path / "rag.db"
+    # half of the originals in the sidecar: the rest falls back to dequantized rows
+    write_segments([(DIM, (cids[::2], dids[::2], mat[::2]))], db_path, kind="orig")
+    originals = OriginalsFile(lambda: db_path)
+    found = originals(DIM, cids[:4])
+    assert sorted(found) == [1, 3]
+    np.testing.assert_array_equal(found[3], mat[2])
+
+    write_segments([(DIM, (cids, dids, mat))], db_path, kind="orig")
+    index = _index(corpus, storage=storage, rescore=4, originals=originals)
+    for q in queries:
+        ids, scores = index.search(q, 8)
+        want_ids, want_scores = _brute(mat, cids, q, 8)
+        assert ids.tolist() == want_ids.tolist()
+        np.testing.assert_allclose(scores, want_scores, rtol=1e-5, atol=1e-6)
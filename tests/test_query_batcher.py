@@ -0,0 +1,37 @@
+"""QueryBatcher: coalescing, result order and what callers see when the job never runs."""
+import asyncio
+
+import numpy as np
+
+from app.embeddings import QueryBatcher
+from benchmarks.corpus import FakeEmbedder
+
+
+def test_concurrent_queries_share_one_batch_in_order():
+    embedder = FakeEmbedder(dim=64)
+    texts = ["кейс магнит", "доставка", "реклама в сети", "кейс магнит"]
+
+    async def main():
+        batcher = QueryBatcher(embedder, window_ms=20, max_items=16)
+        vectors = await asyncio.gather(*(batcher.submit(t) for t in texts))
+        return batcher.stats, vectors
+
+    stats, vectors = asyncio.run(main())
+    assert stats == {"batches": 1, "items": 4}
+    for text, vec in zip(texts, vectors):
+        np.testing.assert_allclose(vec, embedder.embed_query_many([text])[0], rtol=1e-6)
+
+
+def test_cancelled_job_cancels_every_waiting_caller():
+    async def main():
+        loop = asyncio.get_running_loop()
+        job = loop.create_future()
+        futures = [loop.create_future() for _ in range(3)]
+        futures[1].set_result("already answered")
+        job.cancel()
+        QueryBatcher._resolve([("q", None, f, ()) for f in futures], job)
+        return futures
+
+    futures = asyncio.run(main())
+    assert [f.cancelled() for f in futures] == [True, False, True]
+    assert futures[1].result() == "already answered"
@@ -0,0 +1,117 @@
+"""rag: LLM concurrency slots, the answer cache and answer_batch (extractive mode, hashing embeddings, temp DB)."""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app import db, rag
+from app.embeddings import get_embedder, query_cache
+
+PAGES = {
+    "https://eora.ru/cases/magnit": ("Магнит", "Чат-бот для сотрудников Магнита отвечает на вопросы по кадрам."),
+    "https://eora.ru/cases/lamoda": ("Lamoda", "Рекомендательная система для Lamoda подбирает одежду по фото."),
+    "https://eora.ru/cases/dodo": ("Dodo Pizza", "Голосовой ассистент Dodo Pizza принимает заказы по телефону."),
+}
+
+
+def _ingest(cfg, pages):
+    embedder = get_embedder(cfg)
+    writes = []
+    for url, (title, text) in pages.items():
+        vec = np.asarray(embedder.embed_many([text])[0], dtype="float32")
+        writes.append(db.DocumentWrite(url, title, text, "2025-01-01T00:00:00", [(0, text, vec.tobytes())],
+                                       embedder=embedder.vector_key))
+    db.replace_documents(writes)
+
+
+@pytest.fixture
+def cfg(temp_db, monkeypatch):
+    cfg = rag.settings.model_copy(update={
+        "embedding_backend": "hashing", "query_batch_window_ms": 0, "answer_cache_persist": True})
+    rag.answer_cache.clear()
+    query_cache.clear()
+    monkeypatch.setattr(rag, "_persisted_version", -1)
+    _ingest(cfg, PAGES)
+    return cfg
+
+
+@pytest.fixture
+def retrievals(monkeypatch):
+    """Questions that actually went to retrieval, i.e. were not answered from the cache."""
+    seen = []
+    retrieve, retrieve_all = rag._retrieve, rag._retrieve_all
+
+    def counted(question, *args, **kw):
+        seen.append(question)
+        return retrieve(question, *args, **kw)
+
+    def counted_all(questions, *args, **kw):
+        seen.extend(questions)
+        return retrieve_all(questions, *args, **kw)
+
+    monkeypatch.setattr(rag, "_retrieve", counted)
+    monkeypatch.setattr(rag, "_retrieve_all", counted_all)
+    return seen
+
+
+def test_llm_slots_survive_separate_event_loops(monkeypatch):
+    monkeypatch.setattr(rag.settings, "llm_concurrency", 1)
+
+    async def main():
+        limit = rag._llm_limit()
+        assert rag._llm_limit() is limit
+        # a second waiter makes the semaphore bind to this loop
+        async with limit:
+            waiter = asyncio.create_task(asyncio.wait_for(limit.acquire(), 1))
+            await asyncio.sleep(0)
+        await waiter
+        limit.release()
+        return limit
+
+    first = asyncio.run(main())
+    second = asyncio.run(main())
+    assert first is not second
+
+
+def test_answer_cache_is_invalidated_by_index_version(cfg, retrievals):
+    question = "Что вы делали для Магнита?"
+    first = rag.answer(question, mode="extractive", cfg=cfg)
+    assert "https://eora.ru/cases/magnit" in first[1]
+    assert rag.answer(question, mode="extractive", cfg=cfg) == first
+    assert asyncio.run(rag.answer_async(question, mode="extractive", cfg=cfg)) == first
+    # the persisted copy serves a process whose in-memory cache is empty
+    rag.answer_cache.clear()
+    hits = rag.answer_cache_stats["persistent_hits"]
+    assert rag.answer(question, mode="extractive", cfg=cfg) == first
+    assert rag.answer_cache_stats["persistent_hits"] == hits + 1
+    assert retrievals == [question]
+
+    version = db.get_index_version()
+    _ingest(cfg, {"https://eora.ru/cases/magnit-2": ("Магнит 2", "Прогноз спроса для магазинов Магнит.")})
+    assert db.get_index_version() > version
+    second = rag.answer(question, mode="extractive", cfg=cfg)
+    assert retrievals == [question, question]
+    assert "https://eora.ru/cases/magnit-2" in second[1]
+    # answers stored for the old version were pruned when the new one was written
+    assert db.get_conn().execute(
+        "SELECT COUNT(*) FROM answer_cache WHERE index_version <> ?", (db.get_index_version(),)).fetchone()[0] == 0
+
+
+def test_answer_batch_keeps_order_and_uses_cached_answers(cfg, retrievals):
+    questions = ["Что вы делали для Lamoda?", "Что вы делали для Магнита?", "Есть ли кейс с Dodo Pizza?"]
+    cached = rag.answer(questions[1], mode="extractive", cfg=cfg)
+    results = asyncio.run(rag.answer_batch(questions, mode="extractive", cfg=cfg, concurrency=2))
+
+    assert [r["question"] for r in results] == questions
+    assert [r["cached"] for r in results] == [False, True, False]
+    assert (results[1]["answer"], results[1]["sources"]) == cached
+    assert results[0]["sources"][0] == "https://eora.ru/cases/lamoda"
+    assert results[2]["sources"][0] == "https://eora.ru/cases/dodo"
+    assert sorted(retrievals) == sorted([questions[1], questions[0], questions[2]])
+    assert all(set(r["timings"]) == {"retrieval", "generation", "total"} for r in results)
+
+    # the whole batch is now cached, in the same order
+    again = asyncio.run(rag.answer_batch(questions, mode="extractive", cfg=cfg))
+    assert [r["cached"] for r in again] == [True] * 3
+    assert [r["answer"] for r in again] == [r["answer"] for r in results]
+    assert len(retrievals) == 3
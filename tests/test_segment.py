@@ -0,0 +1,95 @@
+"""Memory-mapped embedding segment (EMBEDDING_SEGMENT): attach, tail, removals and the out-of-sync fallback."""
+import numpy as np
+import pytest
+
+from app import db
+from app.config import settings
+from app.index import _normalize_rows
+from app.segment import segment_paths
+
+DIM = 16
+
+
+@pytest.fixture
+def segment_db(temp_db, monkeypatch):
+    monkeypatch.setattr(settings, "embedding_segment", True)
+    return temp_db
+
+
+def _write(url, vecs):
+    rows = [(i, f"{url} часть {i}", np.asarray(v, dtype="float32").tobytes()) for i, v in enumerate(vecs)]
+    return db.replace_documents([db.DocumentWrite(url, url, "", "2025-01-01T00:00:00", rows)])[0]
+
+
+def _live():
+    """chunk id -> vector straight from SQLite, i.e. what any index must agree with."""
+    rows = db.get_conn().execute("SELECT id, document_id, embedding, embedding_dtype, embedding_scale FROM chunks")
+    ((cids, _, mat),) = db.group_blobs(rows).values()
+    return cids, mat
+
+
+def _check_against_sqlite(queries):
+    cids, mat = _live()
+    index = db.get_index()
+    assert len(index) == len(cids)
+    for q in _normalize_rows(np.asarray(queries, dtype="float32")):
+        ids, scores = index.search(q, 5)
+        order = np.argsort(-(mat @ q), kind="stable")[:5]
+        assert set(ids.tolist()) == set(cids[order].tolist())
+        np.testing.assert_allclose(np.sort(scores), np.sort((mat @ q)[order]), rtol=1e-5, atol=1e-6)
+
+
+def _reopen():
+    """What a fresh process sees: the index is rebuilt from the segment files plus SQLite."""
+    db._index.clear()
+    return db.get_index()._segments[DIM]
+
+
+def test_attached_segment_stays_consistent_with_sqlite(segment_db):
+    rng = np.random.default_rng(0)
+    vecs = _normalize_rows(rng.standard_normal((300, DIM))).astype("float32")
+    queries = vecs[::29] + 0.1
+    for d in range(30):
+        _write(f"https://eora.ru/cases/{d}", vecs[d * 10:(d + 1) * 10])
+    vec_path, ids_path = segment_paths(DIM, segment_db)
+    assert vec_path.stat().st_size == 300 * DIM * 4 and ids_path.stat().st_size == 300 * 16
+
+    seg = _reopen()
+    assert isinstance(seg.base[2], np.memmap) and seg.size == 0
+    _check_against_sqlite(queries)
+
+    # a re-ingested document removes base rows and appends tail rows; a new one only appends
+    _write("https://eora.ru/cases/3", vecs[:5] * -1)
+    _write("https://eora.ru/cases/new", vecs[100:104][::-1])
+    seg = db.get_index()._segments[DIM]
+    assert int((~seg.base_alive).sum()) == 10 and seg.size == 9
+    _check_against_sqlite(queries)
+
+    # the appended files are just as good for the next process
+    seg = _reopen()
+    assert len(seg.base[0]) == 309 and int(seg.base_alive.sum()) == 299 and seg.size == 0
+    _check_against_sqlite(queries)
+
+
+def test_out_of_sync_segment_falls_back_to_sqlite(segment_db, monkeypatch, capsys):
+    rng = np.random.default_rng(1)
+    vecs = _normalize_rows(rng.standard_normal((100, DIM))).astype("float32")
+    # the first chunks were committed without an append (e.g. while EMBEDDING_SEGMENT was off),
+    # so the files have a gap; rows after the segment's last id would just be loaded as the tail
+    monkeypatch.setattr(settings, "embedding_segment", False)
+    for d in range(5):
+        _write(f"https://eora.ru/cases/{d}", vecs[d * 10:(d + 1) * 10])
+    monkeypatch.setattr(settings, "embedding_segment", True)
+    for d in range(5, 10):
+        _write(f"https://eora.ru/cases/{d}", vecs[d * 10:(d + 1) * 10])
+
+    seg = _reopen()
+    assert "out of sync" in capsys.readouterr().out
+    assert seg.base is None and seg.size == 100
+    _check_against_sqlite(vecs[::13])
+
+    assert db.rebuild_segment() == {DIM: 100}
+    seg = _reopen()
+    assert "out of sync" not in capsys.readouterr().out
+    assert len(seg.base[0]) == 100 and seg.size == 0
+    _check_against_sqlite(vecs[::13])
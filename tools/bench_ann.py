@@ -0,0 +1,77 @@
+"""Recall@k and latency of the IVF retriever against exact search.
+
+    python tools/bench_ann.py                   # vectors from SQLITE_PATH
+    python tools/bench_ann.py --synthetic 100000 --dim 384
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.db import get_index  # noqa: E402
+from app.index import _Segment, _normalize_rows  # noqa: E402
+from app.retriever import IVFRetriever, kmeans, _IVFList  # noqa: E402
+
+
+def synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(8, n // 500), dim)).astype("float32")
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    return _normalize_rows(x).astype("float32")
+
+
+def load_vectors() -> np.ndarray:
+    index = get_index()
+    if not index.dims():
+        raise SystemExit("[ERR] индекс пуст: сначала `python cli.py ingest` или используйте --synthetic")
+    dim = max(index.dims(), key=lambda d: len(index.export(d)[0]))
+    return index.export(dim)[2]
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--synthetic", type=int, default=0, help="Number of synthetic vectors (0 = use the DB)")
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("-k", type=int, default=6)
+    p.add_argument("--nlist", type=int, default=0)
+    p.add_argument("--nprobe", type=int, nargs="*", default=[1, 2, 4, 8, 16, 32, 64])
+    args = p.parse_args()
+
+    x = synthetic(args.synthetic, args.dim) if args.synthetic else load_vectors()
+    n, dim = x.shape
+    rng = np.random.default_rng(1)
+    queries = _normalize_rows(x[rng.choice(n, args.queries)] + 0.1 * rng.standard_normal((args.queries, dim)).astype("float32"))
+    ids = np.arange(1, n + 1, dtype="int64")
+
+    exact = _Segment(dim, capacity=n)
+    exact.add(ids, ids, x)
+    t = time.perf_counter()
+    truth = [set(exact.search(q, args.k)[0].tolist()) for q in queries]
+    exact_ms = (time.perf_counter() - t) * 1000 / len(queries)
+
+    nlist = min(IVFRetriever(nlist=args.nlist)._nlist_for(n), n)
+    t = time.perf_counter()
+    sample = x if n <= 32 * nlist else x[rng.choice(n, 32 * nlist, replace=False)]
+    ivf = _IVFList(dim, kmeans(sample, nlist))
+    ivf.add((ids, ids, x))
+    build_s = time.perf_counter() - t
+
+    print(f"n={n} dim={dim} k={args.k} nlist={nlist} build={build_s:.1f}s")
+    print(f"{'exact':>10}  recall@{args.k}=1.000  {exact_ms:7.3f} ms/query")
+    for nprobe in args.nprobe:
+        if nprobe > nlist:
+            break
+        t = time.perf_counter()
+        found = [ivf.search(q, args.k, nprobe)[0].tolist() for q in queries]
+        ms = (time.perf_counter() - t) * 1000 / len(queries)
+        recall = np.mean([len(truth[i].intersection(f)) / len(truth[i]) for i, f in enumerate(found)])
+        print(f"nprobe={nprobe:<3}  recall@{args.k}={recall:.3f}  {ms:7.3f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
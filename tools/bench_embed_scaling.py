@@ -0,0 +1,58 @@
+"""Bulk ingest encoding throughput vs LOCAL_EMBED_PROCESSES.
+
+Encodes --texts synthetic chunks with LocalEmbeddings.embed_bulk once per
+process count in --processes (0 = in the calling process), with
+--concurrency batches of --batch texts in flight, the way the ingest embed
+stage drives it. Pool start-up and model loading are excluded (one warm-up
+batch per setting); speedup is relative to the first setting.
+
+    python tools/bench_embed_scaling.py --processes 0 1 2 4 8 16 32 --texts 8192 --batch 512
+"""
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config import settings  # noqa: E402
+from app.embeddings import LocalEmbeddings, close_encode_pool  # noqa: E402
+from benchmarks.corpus import make_text  # noqa: E402
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--processes", type=int, nargs="+", default=[0, 1, 2, 4, 8])
+    ap.add_argument("--threads", type=int, default=0, help="LOCAL_EMBED_THREADS (0 = cores / processes)")
+    ap.add_argument("--texts", type=int, default=4096)
+    ap.add_argument("--batch", type=int, default=256)
+    ap.add_argument("--concurrency", type=int, default=0, help="batches in flight (0 = max(1, processes))")
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    texts = [make_text(rng, 120) for _ in range(args.texts)]
+    batches = [texts[i:i + args.batch] for i in range(0, len(texts), args.batch)]
+    embedder = LocalEmbeddings(settings.local_embedding_model)
+    settings.local_embed_threads = args.threads
+    base = None
+    print(f"{'processes':>9}  {'texts/s':>9}  {'speedup':>7}")
+    for n in args.processes:
+        settings.local_embed_processes = n
+        close_encode_pool()
+        embedder.embed_bulk(batches[0])  # spawn workers and load their models
+        t = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency or max(1, n)) as ex:
+            dims = {m.shape[1] for m in ex.map(embedder.embed_bulk, batches)}
+        rate = len(texts) / (time.perf_counter() - t)
+        base = base or rate
+        print(f"{n:>9}  {rate:>9.0f}  {rate / base:>6.2f}x  dim={dims.pop()}")
+    close_encode_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Per-worker memory and throughput: a model in every worker vs one shared app.embed_server.
+
+Starts --workers processes that each embed their share of --texts synthetic
+chunks (in batches of --batch) plus --queries single-question calls, first
+with LocalEmbeddings in every process, then through RemoteEmbeddings
+against a server started on a temporary Unix socket. RSS is VmRSS read from
+/proc (Linux) once the work is done.
+
+    python tools/bench_embed_server.py --workers 4 --texts 2000
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app.config import settings  # noqa: E402
+
+
+def rss_mb(pid: int | str = "self") -> float:
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def worker(args) -> dict:
+    mode, address, texts, questions, batch = args
+    sys.path.insert(0, str(ROOT))
+    from app.embeddings import LocalEmbeddings, RemoteEmbeddings
+
+    t = time.perf_counter()
+    embedder = LocalEmbeddings(settings.local_embedding_model) if mode == "inproc" else \
+        RemoteEmbeddings(address, settings.local_embedding_model)
+    if mode == "inproc":
+        embedder.embed_one("прогрев")  # model load is part of the cold start either way
+    init_s = time.perf_counter() - t
+    t = time.perf_counter()
+    for i in range(0, len(texts), batch):
+        embedder.embed_many(texts[i:i + batch])
+    for q in questions:
+        embedder.embed_query_many([q])
+    return {"init_s": init_s, "work_s": time.perf_counter() - t, "rss_mb": rss_mb(),
+            "fallback": getattr(embedder, "stats", {}).get("fallback", 0)}
+
+
+def run(mode: str, address: str, args, texts, questions) -> dict:
+    n = args.workers
+    jobs = [(mode, address, texts[i::n], questions[i::n], args.batch) for i in range(n)]
+    ctx = multiprocessing.get_context("spawn")
+    t = time.perf_counter()
+    with ctx.Pool(n) as pool:
+        res = pool.map(worker, jobs)
+    wall = time.perf_counter() - t
+    return {
+        "wall_s": wall,
+        "texts_per_s": (len(texts) + len(questions)) / wall,
+        "init_s": max(r["init_s"] for r in res),
+        "worker_rss_mb": sum(r["rss_mb"] for r in res) / n,
+        "fallback": sum(r["fallback"] for r in res),
+    }
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--workers", type=int, default=4)
+    p.add_argument("--texts", type=int, default=2000)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("--batch", type=int, default=32)
+    args = p.parse_args()
+
+    import numpy as np
+    from benchmarks.corpus import make_questions, make_text
+
+    rng = np.random.default_rng(0)
+    texts = [make_text(rng, 60) for _ in range(args.texts)]
+    questions = make_questions(args.queries)
+
+    rows = {"inproc": run("inproc", "", args, texts, questions)}
+
+    sock = os.path.join(tempfile.mkdtemp(), "embed.sock")
+    server = subprocess.Popen([sys.executable, "-m", "app.embed_server", "--uds", sock], cwd=ROOT)
+    try:
+        client = httpx.Client(transport=httpx.HTTPTransport(uds=sock), base_url="http://embed-server")
+        for _ in range(600):
+            try:
+                if client.get("/health").json()["status"] == "ok":
+                    break
+            except (httpx.HTTPError, ValueError):
+                pass
+            time.sleep(0.2)
+        else:
+            raise SystemExit("[ERR] embedding server did not start")
+        rows["server"] = run("server", f"unix:{sock}", args, texts, questions)
+        rows["server"]["server_rss_mb"] = rss_mb(server.pid)
+        rows["server"]["batches"] = client.get("/health").json()["batches"]
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(f"workers={args.workers} texts={args.texts} queries={args.queries} batch={args.batch}")
+    print(f"{'layout':>7} {'wall s':>7} {'texts/s':>8} {'cold s':>7} {'RSS/worker MB':>14} {'server MB':>10} {'total MB':>9}")
+    for name, r in rows.items():
+        server_mb = r.get("server_rss_mb", 0.0)
+        total = r["worker_rss_mb"] * args.workers + server_mb
+        print(f"{name:>7} {r['wall_s']:>7.1f} {r['texts_per_s']:>8.0f} {r['init_s']:>7.2f} "
+              f"{r['worker_rss_mb']:>14.0f} {server_mb:>10.0f} {total:>9.0f}")
+    if rows["server"]["fallback"]:
+        print(f"[WARN] {rows['server']['fallback']} texts fell back to in-process embedding")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Quality and latency of the embedding backends on the indexed corpus: hashing vs local (MiniLM).
+
+Every chunk in SQLITE_PATH is re-embedded in memory with each backend (the
+DB is not modified), then one question per brand in rag._PROJECT_KEYWORDS
+is scored against them: a hit is a top-k chunk whose URL or title mentions
+the brand. Init time includes imports and model loading; RSS is the growth
+of the process peak.
+
+    python tools/bench_embeddings.py
+    python tools/bench_embeddings.py --backends hashing -k 6
+"""
+import argparse
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.db import get_conn, init_db  # noqa: E402
+from app.embeddings import HashingEmbeddings, LocalEmbeddings  # noqa: E402
+from app.rag import _PROJECT_KEYWORDS  # noqa: E402
+
+
+def make_embedder(name: str):
+    if name == "hashing":
+        return HashingEmbeddings(dim=settings.hashing_dim)
+    return LocalEmbeddings(settings.local_embedding_model)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--backends", nargs="*", choices=["hashing", "local"], default=["hashing", "local"])
+    p.add_argument("-k", type=int, default=settings.top_k)
+    p.add_argument("--batch", type=int, default=64)
+    args = p.parse_args()
+
+    init_db()
+    rows = get_conn().execute(
+        "SELECT c.text, d.url, COALESCE(d.title, '') FROM chunks c JOIN documents d ON d.id = c.document_id ORDER BY c.id"
+    ).fetchall()
+    if not rows:
+        raise SystemExit("[ERR] в базе нет чанков: сначала `python cli.py ingest`")
+    texts = [t for t, _, _ in rows]
+    labels = [(u + " " + title).lower() for _, u, title in rows]
+    cases = [(key, f"Что вы делали для {canon}?") for key, canon in _PROJECT_KEYWORDS]
+    cases = [(key, q) for key, q in cases if any(key in lab for lab in labels)]
+
+    print(f"chunks={len(texts)} questions={len(cases)} k={args.k}")
+    print(f"{'backend':>8} {'init s':>7} {'+RSS MB':>8} {'chunks/s':>9} {'query ms':>9} {'hit@k':>6} {'MRR':>6}")
+    for name in args.backends:
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t = time.perf_counter()
+        try:
+            embedder = make_embedder(name)
+        except Exception as e:
+            print(f"{name:>8} [WARN] unavailable: {e}")
+            continue
+        init_s = time.perf_counter() - t
+        if isinstance(embedder, HashingEmbeddings):
+            df, n = embedder.document_frequencies(texts[i:i + 5000] for i in range(0, len(texts), 5000))
+            embedder.set_idf(df, n, version=1)
+
+        t = time.perf_counter()
+        mat = np.vstack([np.asarray(v, dtype="float32")
+                         for i in range(0, len(texts), args.batch)
+                         for v in embedder.embed_many(texts[i:i + args.batch])])
+        rate = len(texts) / (time.perf_counter() - t)
+        rss_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0) / 1024
+
+        lat, hits, rr = [], 0, []
+        for key, q in cases:
+            t = time.perf_counter()
+            qv = np.asarray(embedder.embed_query_many([q])[0], dtype="float32")
+            lat.append((time.perf_counter() - t) * 1000)
+            ranked = np.argsort(-(mat @ qv))
+            first = next((r for r, i in enumerate(ranked[:100], start=1) if key in labels[i]), None)
+            hits += first is not None and first <= args.k
+            rr.append(1.0 / first if first else 0.0)
+        n_q = max(1, len(cases))
+        print(f"{name:>8} {init_s:>7.2f} {rss_mb:>8.0f} {rate:>9.0f} {statistics.median(lat) if lat else 0:>9.2f} "
+              f"{hits / n_q:>6.2f} {sum(rr) / n_q:>6.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""Parity and throughput of the HTML extraction backends (bs4 vs selectolax).
+
+Pages from links.txt are downloaded once into --cache and reused on later runs.
+
+    python tools/bench_html.py                    # links.txt, cache in .html_cache/
+    python tools/bench_html.py --repeat 5 --workers 4
+"""
+import argparse
+import hashlib
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import httpx
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.links import load_links_from_file  # noqa: E402
+from app.utils import LexborHTMLParser, html_to_text  # noqa: E402
+
+
+def load_pages(links: str, cache: Path) -> list[tuple[str, str]]:
+    cache.mkdir(parents=True, exist_ok=True)
+    pages = []
+    with httpx.Client(follow_redirects=True, headers={"User-Agent": settings.user_agent},
+                      timeout=settings.timeout_seconds) as client:
+        for url in load_links_from_file(links):
+            path = cache / (hashlib.sha1(url.encode()).hexdigest() + ".html")
+            if not path.exists():
+                try:
+                    r = client.get(url)
+                    r.raise_for_status()
+                except httpx.HTTPError as e:
+                    print(f"[WARN] skip {url}: {e}")
+                    continue
+                path.write_text(r.text, encoding="utf-8")
+            pages.append((url, path.read_text(encoding="utf-8")))
+    return pages
+
+
+def parity(pages: list[tuple[str, str]]) -> int:
+    bad = 0
+    for url, html in pages:
+        if html_to_text(html, "bs4") != html_to_text(html, "selectolax"):
+            bad += 1
+            print(f"[DIFF] {url}")
+    print(f"parity: {len(pages) - bad}/{len(pages)} pages identical")
+    return bad
+
+
+def _extract_all(backend: str, pages: list[str]) -> None:
+    for html in pages:
+        html_to_text(html, backend)
+
+
+def throughput(backend: str, pages: list[str], repeat: int, workers: int) -> float:
+    work = pages * repeat
+    t = time.perf_counter()
+    if workers <= 1:
+        _extract_all(backend, work)
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            list(pool.map(html_to_text, work, [backend] * len(work), chunksize=8))
+    return len(work) / (time.perf_counter() - t)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--links", default="links.txt")
+    p.add_argument("--cache", default=".html_cache")
+    p.add_argument("--repeat", type=int, default=3)
+    p.add_argument("--workers", type=int, nargs="*", default=[1, settings.ingest_parse_workers])
+    args = p.parse_args()
+
+    pages = load_pages(args.links, Path(args.cache))
+    if not pages:
+        raise SystemExit("[ERR] нет страниц для замера")
+    backends = ["bs4"]
+    if LexborHTMLParser is None:
+        print("[INFO] selectolax не установлен — parity пропущен, замер только для bs4")
+    else:
+        backends.append("selectolax")
+        parity(pages)
+
+    html = [h for _, h in pages]
+    mb = sum(len(h) for h in html) / 1e6
+    print(f"pages={len(html)} size={mb:.1f} MB repeat={args.repeat}")
+    for backend in backends:
+        for workers in args.workers:
+            rate = throughput(backend, html, args.repeat, workers)
+            print(f"{backend:>10}  workers={workers:<2}  {rate:8.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Dense-only vs hybrid (FTS5 + dense, RRF) vs FTS-prefiltered dense retrieval on brand questions.
+
+For every project in rag._PROJECT_KEYWORDS the question "Что вы делали для <brand>?"
+counts as a hit when one of the top-k chunks comes from a page whose URL or
+title mentions the brand. Query embeddings are computed once up front, so
+latency is retrieval only.
+
+    python tools/bench_hybrid.py -k 6 --repeat 20
+"""
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.db import fetch_top_k_by_embedding, get_index, init_db  # noqa: E402
+from app.embeddings import get_embedder  # noqa: E402
+from app.rag import _PROJECT_KEYWORDS  # noqa: E402
+from app.retriever import ExactRetriever, HybridRetriever  # noqa: E402
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-k", type=int, default=settings.top_k)
+    p.add_argument("--repeat", type=int, default=20)
+    p.add_argument("--candidates", type=int, default=settings.hybrid_candidates)
+    args = p.parse_args()
+
+    init_db()
+    if not len(get_index()):
+        raise SystemExit("[ERR] индекс пуст: сначала `python cli.py ingest`")
+    cases = [(key, f"Что вы делали для {canon}?") for key, canon in _PROJECT_KEYWORDS]
+    embedder = get_embedder()
+    vectors = [embedder.embed_one(q) for _, q in cases]
+
+    hybrid = HybridRetriever(ExactRetriever(), candidates=args.candidates, rrf_k=settings.rrf_k)
+    prefilter = HybridRetriever(ExactRetriever(), prefilter=True, candidates=args.candidates, rrf_k=settings.rrf_k)
+    methods = {
+        "dense": lambda v, q: fetch_top_k_by_embedding(v, args.k),
+        "hybrid": lambda v, q: hybrid.retrieve(v, args.k, q),
+        "prefilter": lambda v, q: prefilter.retrieve(v, args.k, q),
+    }
+
+    print(f"chunks={len(get_index())} questions={len(cases)} k={args.k} candidates={args.candidates}")
+    print(f"{'method':>10} {'hit@k':>7} {'mean ms':>8} {'p95 ms':>8}")
+    for name, fn in methods.items():
+        hits = 0
+        for (key, q), v in zip(cases, vectors):
+            rows = fn(v, q)
+            hits += any(key in (url + " " + (title or "")).lower() for _, _, _, url, title in rows)
+        lat = []
+        for _ in range(args.repeat):
+            for (_, q), v in zip(cases, vectors):
+                t = time.perf_counter()
+                fn(v, q)
+                lat.append((time.perf_counter() - t) * 1000)
+        p95 = statistics.quantiles(lat, n=20)[18] if len(lat) > 1 else lat[0]
+        print(f"{name:>10} {hits / len(cases):>7.2f} {statistics.mean(lat):>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
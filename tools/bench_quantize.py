@@ -0,0 +1,108 @@
+"""Recall@k, latency and disk size of float16/int8 storage against exact float32 search.
+
+    python tools/bench_quantize.py
+    python tools/bench_quantize.py --n 100000 --dim 384 -k 6 --rescore 4
+
+Each configuration builds its own SQLite database through replace_documents
+(the ingest write path) and searches it through get_index(), so the
+quantized scan, the rescore and, with EMBEDDING_ORIGINALS, the sidecar
+lookup are what the server runs. The baseline is brute-force cosine over
+the float32 vectors that were written.
+"""
+import argparse
+import datetime as dt
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import db  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.index import VectorIndex, _normalize_rows, _top_k  # noqa: E402
+from benchmarks.corpus import CHUNK_WORDS, CHUNKS_PER_DOC, make_text, use_db  # noqa: E402
+
+
+def synthetic(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(8, n // 500), dim)).astype("float32")
+    x = centers[rng.integers(0, len(centers), n)] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    return _normalize_rows(x).astype("float32")
+
+
+def configure(storage: str, originals: bool, rescore: int) -> None:
+    """Point app.db at one storage mode; settings are read once at import, so the index is rebuilt here."""
+    settings.embedding_storage = storage
+    db._keep_originals = originals and storage != "float32"
+    db._index = VectorIndex(storage=storage, rescore=rescore, originals=db._originals if db._keep_originals else None)
+
+
+def build(path: Path, x: np.ndarray, seed: int) -> None:
+    rng = np.random.default_rng(seed)
+    fetched_at = dt.datetime(2025, 1, 1).isoformat()
+    docs = []
+    for d, first in enumerate(range(0, len(x), CHUNKS_PER_DOC)):
+        vecs = x[first:first + CHUNKS_PER_DOC]
+        rows = [(i, make_text(rng, CHUNK_WORDS), v.tobytes()) for i, v in enumerate(vecs)]
+        docs.append(db.DocumentWrite(f"https://bench.local/cases/{d}", f"Кейс {d}", "", fetched_at, rows))
+        if len(docs) == 500:
+            db.replace_documents(docs)
+            docs = []
+    if docs:
+        db.replace_documents(docs)
+    db.get_conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def sizes(path: Path) -> tuple:
+    (emb,) = db.get_conn().execute("SELECT COALESCE(SUM(LENGTH(embedding)), 0) FROM chunks").fetchone()
+    sidecar = sum(p.stat().st_size for p in path.parent.glob(f"{path.name}.orig*"))
+    return path.stat().st_size, emb, sidecar
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--n", type=int, default=50000, help="Number of chunks")
+    p.add_argument("--dim", type=int, default=384)
+    p.add_argument("--queries", type=int, default=200)
+    p.add_argument("-k", type=int, default=6)
+    p.add_argument("--rescore", type=int, default=4, help="RESCORE_FACTOR")
+    p.add_argument("--seed", type=int, default=0)
+    args = p.parse_args()
+
+    x = synthetic(args.n, args.dim, args.seed)
+    rng = np.random.default_rng(args.seed + 1)
+    picks = rng.integers(0, args.n, args.queries)
+    queries = _normalize_rows(x[picks] + 0.5 * rng.standard_normal((args.queries, args.dim)).astype("float32"))
+
+    print(f"[INFO] {args.n} x {args.dim}, {args.queries} queries, recall@{args.k} vs float32 brute force")
+    print(f"{'storage':8s} {'rescore on':12s} {'recall':>7s} {'p50 ms':>7s} {'rag.db MB':>9s} "
+          f"{'embeddings MB':>13s} {'sidecar MB':>10s}")
+    runs = [("float32", False), ("float16", False), ("float16", True), ("int8", False), ("int8", True)]
+    with tempfile.TemporaryDirectory() as tmp:
+        for storage, originals in runs:
+            configure(storage, originals, args.rescore)
+            path = Path(tmp) / f"{storage}-{int(originals)}.db"
+            with use_db(path):
+                build(path, x, args.seed)
+                # chunk ids are 1-based in insertion order, so row i of x is chunk i + 1
+                truth = [set((_top_k(x @ q, args.k) + 1).tolist()) for q in queries]
+                index = db.get_index()
+                found, samples = [], []
+                for q in queries:
+                    t = time.perf_counter()
+                    ids, _ = index.search(q, args.k)
+                    samples.append((time.perf_counter() - t) * 1000)
+                    found.append(set(ids.tolist()))
+                recall = np.mean([len(t & f) / args.k for t, f in zip(truth, found)])
+                total, emb, sidecar = sizes(path)
+            label = "-" if storage == "float32" else ("originals" if originals else "dequantized")
+            print(f"{storage:8s} {label:12s} {recall:7.4f} {statistics.median(samples):7.3f} {total / 1e6:9.1f} "
+                  f"{emb / 1e6:13.1f} {sidecar / 1e6:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Latency vs throughput of query micro-batching (embedding + retrieval) at several window sizes.
+
+Closed-loop clients each send a question, wait for the answer's chunks and
+send the next. Window 0 is the unbatched path (one embed_one + one search per
+question on the same executor). Uses the configured embedder and the indexed DB.
+
+    python tools/bench_query_batch.py -c 1 8 32 --windows 0 2 5 10
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.embeddings import QueryBatcher, get_embedder  # noqa: E402
+from app.rag import _get_executor, _retrieve, _retrieve_batch  # noqa: E402
+
+QUESTIONS = [
+    "Что вы можете сделать для ритейлеров?",
+    "Какие у вас есть кейсы с голосовыми ассистентами?",
+    "Делали ли вы проекты с компьютерным зрением?",
+    "Какие чат-боты вы разрабатывали?",
+    "Есть ли опыт в промышленности?",
+    "Что вы делали для Dodo Pizza?",
+]
+
+
+async def run(window_ms: float, clients: int, per_client: int, k: int) -> tuple[float, list[float], float]:
+    executor = _get_executor()
+    batcher = QueryBatcher(get_embedder(), window_ms=window_ms, executor=executor, then=_retrieve_batch)
+    loop = asyncio.get_running_loop()
+    latencies: list[float] = []
+
+    async def client(c: int) -> None:
+        for i in range(per_client):
+            q = QUESTIONS[(c + i) % len(QUESTIONS)]
+            t = time.perf_counter()
+            if window_ms > 0:
+                await batcher.submit(q, (q, k, None))
+            else:
+                await loop.run_in_executor(executor, _retrieve, q, k, settings)
+            latencies.append(time.perf_counter() - t)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(c) for c in range(clients)))
+    elapsed = time.perf_counter() - t0
+    avg_batch = batcher.stats["items"] / batcher.stats["batches"] if batcher.stats["batches"] else 1.0
+    return len(latencies) / elapsed, latencies, avg_batch
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("-c", "--clients", type=int, nargs="*", default=[1, 8, 32])
+    p.add_argument("--windows", type=float, nargs="*", default=[0, 2, 5, 10])
+    p.add_argument("-n", type=int, default=20, help="Questions per client")
+    p.add_argument("-k", type=int, default=settings.top_k)
+    args = p.parse_args()
+
+    get_embedder().embed_one("warm-up")
+    print(f"{'clients':>7} {'window':>7} {'q/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    for clients in args.clients:
+        for window in args.windows:
+            qps, lat, avg_batch = asyncio.run(run(window, clients, args.n, args.k))
+            q = statistics.quantiles(lat, n=100) if len(lat) > 1 else lat * 99
+            print(f"{clients:>7} {window:>7g} {qps:>8.1f} {q[49] * 1000:>8.1f} {q[98] * 1000:>8.1f} {avg_batch:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
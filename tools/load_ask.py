@@ -0,0 +1,60 @@
+"""Fire concurrent questions at POST /ask and report throughput and latency percentiles.
+
+    python tools/load_ask.py --url http://127.0.0.1:8000 -n 200 -c 50 --mode inline
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+QUESTIONS = [
+    "Что вы можете сделать для ритейлеров?",
+    "Какие у вас есть кейсы с голосовыми ассистентами?",
+    "Делали ли вы проекты с компьютерным зрением?",
+    "Какие чат-боты вы разрабатывали?",
+]
+
+
+async def run(url: str, n: int, concurrency: int, mode: str) -> None:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: list[float] = []
+    errors = 0
+
+    async def one(i: int, client: httpx.AsyncClient) -> None:
+        nonlocal errors
+        async with sem:
+            t = time.perf_counter()
+            try:
+                r = await client.post(f"{url}/ask", json={"question": QUESTIONS[i % len(QUESTIONS)], "mode": mode})
+                r.raise_for_status()
+                latencies.append(time.perf_counter() - t)
+            except httpx.HTTPError:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i, client) for i in range(n)))
+        elapsed = time.perf_counter() - t0
+
+    print(f"requests={n} concurrency={concurrency} mode={mode} errors={errors} elapsed={elapsed:.2f}s "
+          f"throughput={len(latencies) / elapsed:.1f} req/s")
+    if latencies:
+        q = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        print(f"latency p50={q[49] * 1000:.0f} ms  p95={q[94] * 1000:.0f} ms  max={max(latencies) * 1000:.0f} ms")
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--url", default="http://127.0.0.1:8000")
+    p.add_argument("-n", type=int, default=200)
+    p.add_argument("-c", "--concurrency", type=int, default=50)
+    p.add_argument("--mode", choices=["simple", "sources", "inline", "extractive"], default="inline")
+    args = p.parse_args()
+    asyncio.run(run(args.url.rstrip("/"), args.n, args.concurrency, args.mode))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Minimal stand-in for the OpenAI chat-completions and embeddings API, for load tests.
+
+    python tools/stub_openai.py --port 9000 --latency 0.8
+    OPENAI_BASE_URL=http://127.0.0.1:9000/v1 OPENAI_API_KEY=stub uvicorn app.main:app
+"""
+import argparse
+import asyncio
+import hashlib
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+
+app = FastAPI()
+LATENCY = 0.5
+DIM = 384
+
+
+@app.post("/v1/chat/completions")
+async def chat(request: Request):
+    body = await request.json()
+    await asyncio.sleep(LATENCY)
+    question = body["messages"][-1]["content"].splitlines()[1] if body.get("messages") else ""
+    return {
+        "id": "chatcmpl-stub",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "stub"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": f"Заглушка: ответ на «{question[:80]}» [1]."},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    texts = body["input"] if isinstance(body["input"], list) else [body["input"]]
+    data = []
+    for i, t in enumerate(texts):
+        seed = hashlib.sha256(str(t).encode("utf-8")).digest()
+        vec = [(seed[j % len(seed)] - 128) / 128 for j in range(DIM)]
+        data.append({"object": "embedding", "index": i, "embedding": vec})
+    return {"object": "list", "data": data, "model": body.get("model", "stub"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}}
+
+
+def main():
+    global LATENCY
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--port", type=int, default=9000)
+    p.add_argument("--latency", type=float, default=LATENCY, help="Seconds per chat completion")
+    args = p.parse_args()
+    LATENCY = args.latency
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()